@@ -12,6 +12,8 @@ import libmozdata.socorro as socorro
 import libmozdata.utils as utils
 from libmozdata.redash import Redash
 from libmozdata.connection import Query
+from . import versioncatalog
+from . import transport
 
 
 def __crash_handler(throttle, json, data):
@@ -54,7 +56,7 @@ def get(channel, date, versions=None, product='Firefox', duration=1):
     """
     channel = channel.lower()
     cycle = duration <= 0
-    versions_info = socorro.ProductVersions.get_version_info(versions, channel=channel, product=product)
+    versions_info = versioncatalog.get_version_info(versions, channel=channel, product=product)
 
     versions = versions_info.keys()
     throttle = set(map(lambda p: p[1], versions_info.values()))
@@ -204,6 +206,7 @@ def get(channel, date, versions=None, product='Firefox', duration=1):
 
 
 if __name__ == "__main__":
+    transport.install()
     parser = argparse.ArgumentParser(description='Track')
     parser.add_argument('-c', '--channel', action='store', default='release', help='release channel')
     parser.add_argument('-s', '--startdate', action='store', default='', help='the end date')
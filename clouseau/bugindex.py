@@ -0,0 +1,127 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import math
+import time
+import libmozdata.socorro as socorro
+from libmozdata.bugzilla import Bugzilla
+from . import config
+from .store import Store
+
+
+__signatures_store = None
+__bugs_store = None
+LAST_SYNC = 'last_sync'
+
+
+def get_stores():
+    """Get the stores containing the index
+
+    Returns:
+        (Store, Store): signature -> bug ids and bug id -> signatures
+    """
+    global __signatures_store
+    global __bugs_store
+    if __signatures_store is None:
+        __signatures_store = Store('signature_bugs')
+        __bugs_store = Store('bug_signatures')
+    return __signatures_store, __bugs_store
+
+
+def set_stores(signatures_store, bugs_store):
+    global __signatures_store
+    global __bugs_store
+    __signatures_store = signatures_store
+    __bugs_store = bugs_store
+
+
+def get_ttl():
+    return config.get('Cache', 'signature_bugs_ttl', 86400, type=int)
+
+
+def parse_signatures(crash_signature):
+    """Get the signatures from a cf_crash_signature field
+
+    Args:
+        crash_signature (str): the field value
+
+    Returns:
+        List[str]: the signatures
+    """
+    signatures = map(lambda s: s.strip(' \t\r\n'), crash_signature.split('[@'))
+    signatures = map(lambda s: s.strip(' \t\r\n')[:-1].strip(' \t\r\n'), filter(None, signatures))
+    return list(filter(None, signatures))
+
+
+def __sync(signatures_store, bugs_store, ttl):
+    # Remove the entries of the signatures in the bugs which changed their crash signatures since the last sync
+    # (the entries older than ttl are retrieved again, so the changes older than ttl don't matter)
+    now = time.time()
+    last_sync = bugs_store.get(LAST_SYNC, default=0)
+    if last_sync:
+        hours = int(math.ceil(min(now - last_sync, ttl) / 3600.)) + 1
+
+        def bug_handler(bug, data):
+            data[str(bug['id'])] = parse_signatures(bug.get('cf_crash_signature', ''))
+
+        changed = {}
+        Bugzilla({'chfield': 'cf_crash_signature',
+                  'chfieldfrom': '-%dh' % hours,
+                  'chfieldto': 'Now'},
+                 include_fields=['id', 'cf_crash_signature'],
+                 bughandler=bug_handler,
+                 bugdata=changed).wait()
+
+        if changed:
+            to_delete = set()
+            for bugid, sgns in bugs_store.get_many(list(changed.keys())).items():
+                to_delete.update(sgns)
+            for sgns in changed.values():
+                to_delete.update(sgns)
+            signatures_store.delete_many(list(to_delete))
+
+    bugs_store.put(LAST_SYNC, now)
+
+
+def __add(bugs_store, bugs_by_signature):
+    signatures_by_bug = {}
+    for signature, bugids in bugs_by_signature.items():
+        for bugid in bugids:
+            signatures_by_bug.setdefault(str(bugid), set()).add(signature)
+
+    for bugid, sgns in bugs_store.get_many(list(signatures_by_bug.keys())).items():
+        signatures_by_bug[bugid].update(sgns)
+
+    bugs_store.put_many({bugid: list(sgns) for bugid, sgns in signatures_by_bug.items()})
+
+
+def get_bugs(signatures):
+    """Get the bugs for each signature (same as socorro.Bugs.get_bugs)
+
+    The signatures which are not in the local index (or which are too old) are
+    retrieved from Socorro and the index is refreshed with the bugs whose crash
+    signatures changed since the last call.
+
+    Args:
+        signatures (List[str]): the signatures
+
+    Returns:
+        dict: the bugs for each signature
+    """
+    signatures_store, bugs_store = get_stores()
+    if not signatures_store.is_enabled():
+        return socorro.Bugs.get_bugs(signatures)
+
+    ttl = get_ttl()
+    __sync(signatures_store, bugs_store, ttl)
+
+    bugs_by_signature = signatures_store.get_many(signatures, max_age=ttl)
+    missing = [s for s in signatures if s not in bugs_by_signature]
+    if missing:
+        fetched = socorro.Bugs.get_bugs(missing)
+        signatures_store.put_many(fetched)
+        __add(bugs_store, fetched)
+        bugs_by_signature.update(fetched)
+
+    return {s: list(bugs_by_signature[s]) for s in signatures}
@@ -0,0 +1,112 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+from libmozdata import socorro
+from libmozdata.connection import (Connection, Query)
+from . import config
+from .store import Store
+
+
+__store = None
+BATCH_SIZE = 128
+FRAME_FIELDS = ('function', 'file', 'line', 'module')
+MODULE_FIELDS = ('filename', 'version', 'debug_id')
+
+
+def get_store():
+    """Get the store containing the processed crashes
+
+    A processed crash never changes, so the entries are only removed when the store is full.
+
+    Returns:
+        Store: the store
+    """
+    global __store
+    if __store is None:
+        max_size = config.get('Cache', 'crashes_size', 2048, type=int)
+        __store = Store('processed_crashes', max_size=max_size * 1024 * 1024)
+    return __store
+
+
+def set_store(store):
+    global __store
+    __store = store
+
+
+def project(json):
+    """Keep only the useful data from a processed crash
+
+    Args:
+        json (dict): the processed crash
+
+    Returns:
+        dict: the uuid, the frames of the crashed thread, the modules of the
+              frames in the crashing thread, the modules and the addons
+    """
+    if json.get('projected', False):
+        return json
+
+    jd = json.get('json_dump', {})
+    frames = None
+    thread_nb = json.get('crashedThread', None)
+    if thread_nb is not None and 'threads' in jd:
+        frames = [{k: frame[k] for k in FRAME_FIELDS if k in frame} for frame in jd['threads'][thread_nb]['frames']]
+
+    crashing_thread = None
+    if 'crashing_thread' in jd:
+        crashing_thread = [frame.get('module', '') for frame in jd['crashing_thread']['frames']]
+
+    modules = [{k: m.get(k, '') for k in MODULE_FIELDS} for m in jd.get('modules', [])]
+
+    return {'projected': True,
+            'uuid': json['uuid'],
+            'frames': frames,
+            'crashing_thread': crashing_thread,
+            'modules': modules,
+            'addons': json.get('addons', [])}
+
+
+def __call_handler(query, json):
+    if query.handlerdata is not None:
+        query.handler(json, query.handlerdata)
+    else:
+        query.handler(json)
+
+
+def __get_handler(store, query):
+    def handler(json):
+        if 'uuid' not in json:
+            # an error payload (e.g. the crash isn't processed): nothing to store or to handle
+            logging.warning('No processed crash for %s: %s' % (query.params['crash_id'], json))
+            return
+        json = project(json)
+        store.put(json['uuid'], json)
+        __call_handler(query, json)
+
+    return handler
+
+
+def get_processed_crashes(queries):
+    """Apply the handlers on the projected processed crashes (see project):
+    the ones in the store are directly handled and the other ones are retrieved
+    from Socorro and stored.
+
+    Args:
+        queries (List[Query]): the ProcessedCrash queries (with a crash_id param)
+    """
+    store = get_store()
+    uuids = [query.params['crash_id'] for query in queries]
+    cached = store.get_many(uuids)
+    to_query = []
+    for uuid, query in zip(uuids, queries):
+        if uuid in cached:
+            __call_handler(query, project(cached[uuid]))
+        else:
+            to_query.append(Query(query.url, params=query.params, handler=__get_handler(store, query)))
+
+    # the responses are kept until the end of the connection, so the queries
+    # are made by batches to avoid to have all the raw crashes in memory
+    for chunk in Connection.chunks(to_query, BATCH_SIZE):
+        socorro.ProcessedCrash(queries=chunk).wait()
@@ -7,7 +7,9 @@ import libmozdata.utils as utils
 import argparse
 import libmozdata.socorro as socorro
 from libmozdata.connection import Query
-import libmozdata.versions
+from . import crashcache
+from . import versioncatalog
+from . import transport
 
 
 def get(signature, matching_mode, module, addon, product='Firefox', channel=['all'], versions=[], start_date='', limit=0, check_bt=False, verbose=False, ratio=1.):
@@ -22,8 +24,8 @@ def get(signature, matching_mode, module, addon, product='Firefox', channel=['al
         channel = [c.lower() for c in channel]
 
     if not versions:
-        base_versions = libmozdata.versions.get(base=True)
-        versions_by_channel = socorro.ProductVersions.get_info_from_major(base_versions, product=product)
+        base_versions = versioncatalog.get_base_versions()
+        versions_by_channel = versioncatalog.get_info_from_major(base_versions, product=product)
         versions = []
         for v1 in versions_by_channel.values():
             for v2 in v1:
@@ -84,7 +86,7 @@ def get(signature, matching_mode, module, addon, product='Firefox', channel=['al
 
         addon_version = ''
         if addon:
-            for a in json.get('addons', []):
+            for a in json['addons']:
                 addon_id = a[0].lower()
                 if len(a) == 2 and addon_id in addon:
                     versions = data['versions']
@@ -97,8 +99,7 @@ def get(signature, matching_mode, module, addon, product='Firefox', channel=['al
 
         if module:
             dll_version = ''
-            json_dump = json['json_dump']
-            for m in json_dump.get('modules', []):
+            for m in json['modules']:
                 filename = m['filename'].lower()
                 if filename in module:
                     versions = data['versions']
@@ -111,11 +112,10 @@ def get(signature, matching_mode, module, addon, product='Firefox', channel=['al
             # if addon_version and dll_version and (addon_version == dll_version):
             #     data['match'].append(json['uuid'])
 
-            if check_bt and 'crashing_thread' in json_dump:
-                crashing_thread = json_dump['crashing_thread']
+            if check_bt and json['crashing_thread'] is not None:
                 in_bt = False
-                for frame in crashing_thread['frames']:
-                    if frame['module'].lower() in module:
+                for frame_module in json['crashing_thread']:
+                    if frame_module.lower() in module:
                         in_bt = True
                         break
                 if not in_bt:
@@ -134,12 +134,13 @@ def get(signature, matching_mode, module, addon, product='Firefox', channel=['al
     for uuid in uuids:
         queries.append(Query(socorro.ProcessedCrash.URL, params={'crash_id': uuid}, handler=handler_pc, handlerdata=info))
 
-    socorro.ProcessedCrash(queries=queries).wait()
+    crashcache.get_processed_crashes(queries)
 
     return info
 
 
 if __name__ == "__main__":
+    transport.install()
     parser = argparse.ArgumentParser(description='Update status flags in Bugzilla')
     parser.add_argument('-p', '--product', action='store', default='Firefox', help='the product')
     parser.add_argument('-c', '--channel', action='store', nargs='+', default=['all'], help='the channels')
@@ -0,0 +1,178 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import libmozdata.utils as utils
+from libmozdata.bugzilla import Bugzilla
+from . import config
+from .store import Store
+
+
+__store = None
+
+
+def get_store():
+    """Get the store containing the dup edges of the resolved bugs
+
+    Returns:
+        Store: the store
+    """
+    global __store
+    if __store is None:
+        __store = Store('dup_graph')
+    return __store
+
+
+def set_store(store):
+    global __store
+    __store = store
+
+
+class DupGraph(object):
+    """The graph of the duplicated bugs
+
+    Each bug points to the bug it's a dup of (or None).
+    The edges of the bugs which are resolved and which haven't been touched recently
+    are stored, so only the open or recently touched bugs are retrieved again
+    from Bugzilla on the next runs.
+    """
+
+    def __init__(self, store=None):
+        """Constructor
+
+        Args:
+            store (Optional[Store]): the store for the edges, by default the one from get_store
+        """
+        self.store = get_store() if store is None else store
+        self.ttl = config.get('Cache', 'dup_graph_ttl', 7 * 86400, type=int)
+        self.recent_days = config.get('Cache', 'dup_graph_recent_days', 30, type=int)
+        self.dupe_of = {}
+        self.finals = {}
+        self.fetched = 0
+
+    def load(self, bugids):
+        """Load the dup chains of the bugs
+
+        Args:
+            bugids (List[int]): the bug ids
+        """
+        bugids = {int(b) for b in bugids if int(b) not in self.dupe_of}
+        if not bugids:
+            return
+
+        if not self.store.is_enabled():
+            self.__load_from_chains(bugids)
+            return
+
+        today = utils.get_date_ymd('today')
+
+        def bug_handler(bug, data):
+            bugid = bug['id']
+            resolution = bug.get('resolution', '')
+            dupe_of = bug['dupe_of'] if resolution == 'DUPLICATE' else None
+            last_change = utils.get_date_ymd(bug['last_change_time'])
+            data[bugid] = {'dupe_of': dupe_of,
+                           'stable': resolution != '' and (today - last_change).days >= self.recent_days}
+
+        while bugids:
+            edges = self.store.get_many([str(b) for b in bugids], max_age=self.ttl)
+            for bugid, edge in edges.items():
+                if edge['stable']:
+                    self.dupe_of[int(bugid)] = edge['dupe_of']
+
+            to_fetch = [b for b in bugids if b not in self.dupe_of]
+            if to_fetch:
+                fetched = {}
+                Bugzilla(bugids=to_fetch, include_fields=['id', 'resolution', 'dupe_of', 'last_change_time'], bughandler=bug_handler, bugdata=fetched).wait()
+                self.store.put_many({str(bugid): edge for bugid, edge in fetched.items()})
+                self.fetched += len(to_fetch)
+                for bugid in to_fetch:
+                    # the private bugs aren't retrieved
+                    edge = fetched.get(bugid)
+                    self.dupe_of[bugid] = edge['dupe_of'] if edge else None
+
+            bugids = {self.dupe_of[b] for b in bugids}
+            bugids = {b for b in bugids if b is not None and b not in self.dupe_of}
+
+    def __load_from_chains(self, bugids):
+        # without store, follow_dup does the job
+        for bugid, chain in Bugzilla.follow_dup(bugids, only_final=False).items():
+            bugid = int(bugid)
+            for b in (chain or []):
+                if b == 'cycle':
+                    break
+                b = int(b)
+                self.dupe_of[bugid] = b
+                bugid = b
+            self.dupe_of.setdefault(bugid, None)
+
+    def get_chain(self, bugid):
+        """Get the dup chain of a bug
+
+        Args:
+            bugid (int): the bug id
+
+        Returns:
+            List[int]: the bugs from the one bugid is a dup of to the final one
+        """
+        chain = []
+        seen = {bugid}
+        bugid = self.dupe_of.get(bugid)
+        while bugid is not None and bugid not in seen:
+            chain.append(bugid)
+            seen.add(bugid)
+            bugid = self.dupe_of.get(bugid)
+        return chain
+
+    def find(self, bugid):
+        """Get the final bug in the dup chain of a bug (with path compression)
+
+        Args:
+            bugid (int): the bug id
+
+        Returns:
+            int: the final bug (bugid itself if it isn't a dup)
+        """
+        path = []
+        seen = set()
+        while bugid not in self.finals and bugid not in seen:
+            seen.add(bugid)
+            path.append(bugid)
+            dupe_of = self.dupe_of.get(bugid)
+            if dupe_of is None:
+                break
+            bugid = dupe_of
+
+        final = self.finals.get(bugid, bugid)
+        for b in path:
+            self.finals[b] = final
+
+        return final
+
+    def reduce(self, bugids):
+        """Remove the bugs which are a dup (directly or not) of another bug in the set
+
+        Args:
+            bugids (List[int]): the bug ids (must have been loaded)
+
+        Returns:
+            set: the remaining bugs
+        """
+        groups = {}
+        for bugid in bugids:
+            groups.setdefault(self.find(bugid), []).append(bugid)
+
+        res = set()
+        for final, group in groups.items():
+            if final in group:
+                # all the other bugs are dups of the final one
+                res.add(final)
+            elif len(group) == 1:
+                res.add(group[0])
+            else:
+                group = set(group)
+                for bugid in group:
+                    if not any(b in group for b in self.get_chain(bugid)):
+                        res.add(bugid)
+
+        return res
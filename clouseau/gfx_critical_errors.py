@@ -5,16 +5,16 @@
 
 import argparse
 import re
-import requests
 from pprint import pprint
 import libmozdata.utils as utils
-import libmozdata.versions
 import libmozdata.socorro as socorro
 from libmozdata.connection import Query
+from . import transport
+from . import versioncatalog
 
 
 def query_dxr(q):
-    r = requests.get('https://dxr.mozilla.org/mozilla-central/search', params={
+    r = transport.get_transport().get('https://dxr.mozilla.org/mozilla-central/search', params={
         'q': q,
         'limit': 1000
     }, headers={
@@ -50,8 +50,8 @@ def analyze_gfx_critical_errors(signature='', product='Firefox', channel=['all']
         channel = [c.lower() for c in channel]
 
     if not versions:
-        base_versions = libmozdata.versions.get(base=True)
-        versions_by_channel = socorro.ProductVersions.get_info_from_major(base_versions, product=product)
+        base_versions = versioncatalog.get_base_versions()
+        versions_by_channel = versioncatalog.get_info_from_major(base_versions, product=product)
         versions = []
         for v1 in versions_by_channel.values():
             for v2 in v1:
@@ -91,6 +91,7 @@ def analyze_gfx_critical_errors(signature='', product='Firefox', channel=['all']
 
 
 if __name__ == "__main__":
+    transport.install()
     parser = argparse.ArgumentParser(description='Update status flags in Bugzilla')
     parser.add_argument('-p', '--product', action='store', default='Firefox', help='the product')
     parser.add_argument('-c', '--channel', action='store', nargs='+', default=['all'], help='the channels')
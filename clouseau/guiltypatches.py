@@ -3,27 +3,35 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import argparse
-import fasteners
-import tempfile
 import logging
+import time
 from datetime import (datetime, timedelta)
 import re
 import copy
 import pytz
 import os.path
-from os import listdir
-import json
-from collections import defaultdict
-from libmozdata.FileStats import FileStats
+from collections import (defaultdict, OrderedDict)
+from concurrent.futures import ThreadPoolExecutor
 from libmozdata import socorro
 from libmozdata import utils
 from libmozdata.connection import (Connection, Query)
 from libmozdata.hgmozilla import Mercurial
 from . import config
+from . import crashcache
+from . import lazy
+from . import patchesstore
+from . import pushlog
+from .store import Store
+from . import transport
 
 
+# libmozdata.FileStats pulls bugzilla and icalendar and is only used for the backtraces
+FileStats = lazy.load('libmozdata.FileStats')
 hg_pattern = re.compile('hg:hg.mozilla.org[^:]*:([^:]*):([a-z0-9]+)')
 forbidden_dirs = {'obj-firefox'}
+# max delay in seconds between a push and its pushdate
+PUSH_DELAY = 3600
+__patches_store = None
 
 
 def __warn(str, verbose=True):
@@ -71,19 +79,16 @@ def get_bt(info, cache=None, verbose=False):
 
     def handler(json, data):
         uuid = json['uuid']
-        jd = json['json_dump']
-        if 'threads' in jd and 'crashedThread' in json:
-            thread_nb = json['crashedThread']
-            if thread_nb is not None:
-                frames = jd['threads'][thread_nb]['frames']
-                functions = tuple(frame['function'] for frame in frames if 'function' in frame)
-                files = tuple(frame.get('file', None) for frame in frames if 'function' in frame)
-                lines = tuple(frame.get('line', 0) for frame in frames if 'function' in frame)
-                if functions in data[0]:
-                    data[0][functions]['uuids'].append(uuid)
-                    data[0][functions]['count'] += data[1]['count']
-                else:
-                    data[0][functions] = {'count': data[1]['count'], 'uuids': [uuid], 'files': files, 'lines': lines, 'processed': False}
+        frames = json['frames']
+        if frames is not None:
+            functions = tuple(frame['function'] for frame in frames if 'function' in frame)
+            files = tuple(frame.get('file', None) for frame in frames if 'function' in frame)
+            lines = tuple(frame.get('line', 0) for frame in frames if 'function' in frame)
+            if functions in data[0]:
+                data[0][functions]['uuids'].append(uuid)
+                data[0][functions]['count'] += data[1]['count']
+            else:
+                data[0][functions] = {'count': data[1]['count'], 'uuids': [uuid], 'files': files, 'lines': lines, 'processed': False}
 
     data = {}
     queries = []
@@ -100,8 +105,7 @@ def get_bt(info, cache=None, verbose=False):
             else:
                 __warn('Old UUID: %s' % uuid, verbose)
 
-    if queries:
-        socorro.ProcessedCrash(queries=queries).wait()
+    crashcache.get_processed_crashes(queries)
 
     if cache:
         cached_bt_info = cache['bt_info']
@@ -115,12 +119,134 @@ def get_bt(info, cache=None, verbose=False):
     return data
 
 
-def walk_on_the_bt(channel, ts, max_days, info, sgn=None, verbose=False):
+def get_patches_store():
+    """Get the store containing the last patches of the files
+
+    Returns:
+        Store: the store
+    """
+    global __patches_store
+    if __patches_store is None:
+        max_size = config.get('Cache', 'patches_size', 256, type=int)
+        __patches_store = Store('file_patches', max_size=max_size * 1024 * 1024)
+    return __patches_store
+
+
+def set_patches_store(store):
+    global __patches_store
+    __patches_store = store
+
+
+def get_workers():
+    return config.get('GuiltyPatches', 'workers', 8, type=int)
+
+
+def get_files(bt_info):
+    """Get the files to look up in unprocessed backtraces
+
+    Args:
+        bt_info (dict): bt -> {'count', 'uuids', 'files', 'processed'}
+
+    Returns:
+        List[(str, str)]: the (filename, node) in frame order
+    """
+    files = []
+    treated = set()
+    for i in bt_info.values():
+        if i['processed']:
+            continue
+        for f in i['files']:
+            if f and f not in treated:
+                treated.add(f)
+                filename, node = get_path_node(f)
+                if node and is_allowed(filename):
+                    files.append((filename, node))
+    return files
+
+
+def get_last_patches(channel, ts, max_days, filename, node):
+    """Get the last patches which touched a file
+
+    Args:
+        channel (str): the channel
+        ts (int): the timestamp
+        max_days (int): the number of days before ts
+        filename (str): the file path
+        node (str): the revision
+
+    Returns:
+        List[dict]: the patches ({'node', 'pushdate'}) from the most recent one
+    """
+    # use the local pushlog index when there's one which knows node
+    index = pushlog.get_index(channel)
+    res = index.get_last_patches(filename, node, ts, max_days) if index else None
+    if res is None:
+        fs = FileStats.FileStats(path=filename, channel=channel, node=node, utc_ts=ts, max_days=max_days)
+        res = fs.get_last_patches()
+    if res:
+        l = [(r['node'], r['pushdate'][0]) for r in res]
+        l = sorted(l, key=lambda p: p[1], reverse=True)
+        return [{'node': p, 'pushdate': str(utils.get_date_from_timestamp(q))} for p, q in l]
+    return []
+
+
+def get_all_patches(channel, ts, max_days, files, verbose=False):
+    """Get the last patches for several files with a pool of workers
+
+    Args:
+        channel (str): the channel
+        ts (int): the timestamp
+        max_days (int): the number of days before ts
+        files (List[(str, str)]): the (filename, node)
+        verbose (Optional[bool]): verbose mode
+
+    Returns:
+        dict: (filename, node) -> patches
+    """
+    files = list(OrderedDict.fromkeys(files))
+    if not files:
+        return {}
+
+    # the window [ts - max_days, ts] is closed when no more pushes can be in it
+    now = time.time()
+    closed = now - ts > PUSH_DELAY
+    ttl = config.get('Cache', 'patches_ttl', 3600, type=int)
+    store = get_patches_store()
+    keys = {f: '%s|%s|%s|%d|%d' % (channel, f[1], f[0], ts, max_days) for f in files}
+    cached = store.get_many(list(keys.values()))
+
+    res = {}
+    to_lookup = []
+    for f in files:
+        entry = cached.get(keys[f])
+        if entry and (entry['closed'] or now - entry['time'] < ttl):
+            res[f] = entry['patches']
+        else:
+            to_lookup.append(f)
+
+    def lookup(filename, node):
+        __warn('file %s' % filename, verbose)
+        return get_last_patches(channel, ts, max_days, filename, node)
+
+    if to_lookup:
+        with ThreadPoolExecutor(max_workers=max(1, get_workers())) as executor:
+            futures = [executor.submit(lookup, filename, node) for filename, node in to_lookup]
+            looked_up = {f: future.result() for f, future in zip(to_lookup, futures)}
+        store.put_many({keys[f]: {'patches': patches, 'time': now, 'closed': closed} for f, patches in looked_up.items()})
+        res.update(looked_up)
+
+    return res
+
+
+def walk_on_the_bt(channel, ts, max_days, info, sgn=None, verbose=False, patches=None):
     files_info = {}
     treated = set()
     if sgn:
         __warn('Walk on the bt for signature %s' % sgn, verbose)
 
+    if patches is None:
+        patches = get_all_patches(channel, ts, max_days, get_files(info), verbose=verbose)
+
     # info is: bt->{'count', 'uuids', 'files', 'processed'}
     for i in info.values():
         if i['processed']:
@@ -133,15 +259,7 @@ def walk_on_the_bt(channel, ts, max_days, info, sgn=None, verbose=False):
                 filename, node = get_path_node(f)
                 files_info[f] = {'filename': filename, 'node': node, 'line': lines[count], 'patches': []}
                 if node and is_allowed(filename):
-                    if sgn:
-                        __warn('file %s' % filename, verbose)
-                    fs = FileStats(path=filename, channel=channel, node=node, utc_ts=ts, max_days=max_days)
-                    res = fs.get_last_patches()
-                    if res:
-                        l = [(r['node'], r['pushdate'][0]) for r in res]
-                        l = sorted(l, key=lambda p: p[1], reverse=True)
-                        l = [{'node': p, 'pushdate': str(utils.get_date_from_timestamp(q))} for p, q in l]
-                        files_info[f]['patches'] = l
+                    files_info[f]['patches'] = copy.deepcopy(patches[(filename, node)])
             count += 1
 
     if sgn:
@@ -250,9 +368,13 @@ def analyze(channel, data, date='today', max_days=3, cache=None, verbose=False):
         ts = utils.get_timestamp(date)
         date = utils.get_date_ymd(date)
 
+        # the files are looked up once for all the signatures
+        files = [f for info1 in bt_info.values() for f in get_files(info1)]
+        patches = get_all_patches(channel, ts, max_days, files, verbose=verbose)
+
         for sgn, info1 in bt_info.items():
             res = []
-            info = walk_on_the_bt(channel, ts, max_days, info1, sgn=sgn, verbose=verbose)
+            info = walk_on_the_bt(channel, ts, max_days, info1, sgn=sgn, verbose=verbose, patches=patches)
             for bt, info2 in info1.items():
                 if not info2['processed']:
                     l = []
@@ -272,81 +394,42 @@ def analyze(channel, data, date='today', max_days=3, cache=None, verbose=False):
     return results
 
 
-def get_filename(date, output_dir):
+def get_date(date):
     try:
-        if date:
-            date = utils.get_date_str(utils.get_date_ymd(date))
-        else:
-            dates = getdates(output_dir)
-            if dates['dates']:
-                date = dates['dates'][-1]
-            else:
-                return None
-        return os.path.join(output_dir, date + '.json')
+        return utils.get_date_str(utils.get_date_ymd(date))
     except:
         return None
 
 
-def get_lock_name():
-    name = config.get('GuiltyPatches', 'lockname', '$TMPDIR/clouseau_lock')
-    name = name.replace('$TMPDIR', tempfile.gettempdir())
-    name = os.path.expanduser(name)
-    return name
-
-
-def get_data(date, output_dir):
-    if output_dir:
-        filename = get_filename(date, output_dir)
-        if filename and os.path.isfile(filename):
-            with fasteners.InterProcessLock(get_lock_name()):
-                with open(filename, 'r') as In:
-                    data = json.load(In)
-                    return data
-
-    return None
-
-
 def get_cache(channel, product, date, output_dir):
-    data = get_data(date, output_dir)
-    if data:
-        # get the uuids and the bt info
-        uuids = []
-        bt_info = defaultdict(lambda: dict())
-        if product in data and channel in data[product]:
-            for sgn, results in data[product][channel].items():
+    date = get_date(date)
+    if output_dir and date:
+        store = patchesstore.get_store(output_dir)
+        if store.has_run(date, product, channel):
+            # get the uuids and the bt info
+            uuids = []
+            bt_info = defaultdict(lambda: dict())
+            rows = store.get(date, product, channel)
+            for sgn, results in rows.items():
                 for result in results:
                     uuids.extend(result['uuids'])
                     bt = tuple(e[0] for e in result['bt'])
                     bt_info[sgn][bt] = result
-            return {'uuids': set(uuids), 'bt_info': bt_info, 'data': data}
-        else:
-            return {'uuids': set(), 'bt_info': None, 'data': data}
+            return {'uuids': set(uuids), 'bt_info': bt_info, 'rows': rows}
     return None
 
 
 def put_cache(channel, product, date, output_dir, cache, results):
     if output_dir:
-        if cache:
-            if product in cache['data']:
-                if channel in cache['data'][product]:
-                    data = cache['data'][product][channel]
-                    for sgn, res in results.items():
-                        if sgn in data:
-                            data[sgn].extend(res)
-                        else:
-                            data[sgn] = res
-                else:
-                    cache['data'][product][channel] = results
+        # the counts of the cached results may have been updated
+        rows = cache['rows'] if cache else {}
+        for sgn, res in results.items():
+            if sgn in rows:
+                rows[sgn].extend(res)
             else:
-                cache['data'][product] = {channel: results}
-            data = cache['data']
-        else:
-            data = {product: {channel: results}}
+                rows[sgn] = res
 
-        filename = get_filename(date, output_dir)
-        with fasteners.InterProcessLock(get_lock_name()):
-            with open(filename, 'w') as Out:
-                json.dump(data, Out, sort_keys=True)
+        patchesstore.get_store(output_dir).put(get_date(date), product, channel, rows)
 
 
 def get_output_dir():
@@ -372,14 +455,22 @@ def getdates(output_dir=''):
     if not output_dir:
         output_dir = get_output_dir()
 
-    pat = re.compile('([0-9]{4}-[0-9]{2}-[0-9]{2})\.json$')
-    dates = []
-    for f in listdir(output_dir):
-        if os.path.isfile(os.path.join(output_dir, f)):
-            m = pat.match(f)
-            if m:
-                dates.append(m.group(1))
-    return dates
+    return patchesstore.get_store(output_dir).get_dates()
+
+
+def get_generation(output_dir=''):
+    """Get the generation of the results (it changes each time some results are put)
+
+    Args:
+        output_dir (Optional[str]): the directory containing the results
+
+    Returns:
+        int: the generation
+    """
+    if not output_dir:
+        output_dir = get_output_dir()
+
+    return patchesstore.get_store(output_dir).get_generation()
 
 
 def getinfos():
@@ -401,24 +492,92 @@ def check_args(channel, product, date):
     product = p.get(product.lower(), 'Firefox')
 
     # check date
-    if not re.match('^[0-9]{4}-[0-9]{2}-[0-9]{2}$', date):
+    if not date or not re.match('^[0-9]{4}-[0-9]{2}-[0-9]{2}$', date):
         date = None
 
     return channel, product, date
 
 
+def get_store_date(store, date):
+    # without a valid date, the last one with results is used
+    if date:
+        return date
+    dates = store.get_dates()
+    return dates[-1] if dates else None
+
+
 def get(channel, product, date, output_dir=''):
     channel, product, date = check_args(channel, product, date)
     if not output_dir:
         output_dir = get_output_dir()
 
-    data = get_data(date, output_dir)
-    if data and product in data and channel in data[product]:
-        return data[product][channel]
+    store = patchesstore.get_store(output_dir)
+    date = get_store_date(store, date)
+    if date:
+        return store.get(date, product, channel)
     return {}
 
 
+def get_page(channel, product, date, offset=0, limit=None, min_count=0, full=False, output_dir=''):
+    """Get a page of the signatures ordered by decreasing count
+
+    Args:
+        channel (str): the channel
+        product (str): the product
+        date (str): the date (YYYY-MM-DD)
+        offset (Optional[int]): the number of signatures to skip
+        limit (Optional[int]): the max number of signatures, by default all
+        min_count (Optional[int]): the min count of the signatures
+        full (Optional[bool]): if True, the backtraces are in the summaries
+        output_dir (Optional[str]): the directory containing the results
+
+    Returns:
+        dict: {'total': number of signatures, 'signatures': the summaries}
+    """
+    channel, product, date = check_args(channel, product, date)
+    if not output_dir:
+        output_dir = get_output_dir()
+
+    store = patchesstore.get_store(output_dir)
+    date = get_store_date(store, date)
+    if not date:
+        return {'total': 0, 'signatures': []}
+
+    total, summaries = store.get_summaries(date, product, channel, offset=max(0, offset), limit=limit, min_count=min_count)
+    if full:
+        results = store.get(date, product, channel, signatures=[s['signature'] for s in summaries])
+        for summary in summaries:
+            summary['bts'] = results.get(summary['signature'], [])
+
+    return {'total': total, 'signatures': summaries}
+
+
+def get_signature(channel, product, date, signature, output_dir=''):
+    """Get the backtraces of a signature
+
+    Args:
+        channel (str): the channel
+        product (str): the product
+        date (str): the date (YYYY-MM-DD)
+        signature (str): the signature
+        output_dir (Optional[str]): the directory containing the results
+
+    Returns:
+        List[dict]: the backtraces with their patches
+    """
+    channel, product, date = check_args(channel, product, date)
+    if not output_dir:
+        output_dir = get_output_dir()
+
+    store = patchesstore.get_store(output_dir)
+    date = get_store_date(store, date)
+    if date:
+        return store.get(date, product, channel, signatures=[signature]).get(signature, [])
+    return []
+
+
 if __name__ == '__main__':
+    transport.install()
     parser = argparse.ArgumentParser(description='Find out the guilty patches')
     parser.add_argument('-d', '--date', action='store', nargs='+', default=['today'], help='the date')
     parser.add_argument('-o', '--output', action='store', default='', help='the output directory')
@@ -428,6 +587,7 @@ if __name__ == '__main__':
     parser.add_argument('-t', '--threshold', action='store', type=int, default=1, help='the threshold')
     parser.add_argument('-v', '--verbose', action='store_true', help='verbose mode')
     parser.add_argument('-l', '--localhost', action='store_true', help='to use Mercurial http://localhost:8000')
+    parser.add_argument('-r', '--repository', action='store', default='', help='local clone of the repository to use to find the patches')
     parser.add_argument('-L', '--log', action='store', default='/tmp/guiltypatches.log', help='file where to put log')
 
     args = parser.parse_args()
@@ -440,6 +600,14 @@ if __name__ == '__main__':
         Mercurial.HG_URL = 'http://localhost:8000'
         Mercurial.remote = False
 
+    if args.repository:
+        pushlog.set_repository(args.channel, args.repository)
+
+    index = pushlog.get_index(args.channel)
+    if index:
+        # get the new pushes since the last run
+        index.update()
+
     for product in args.product:
         for date in args.date:
             generate(channel=args.channel, product=product, date=date, max_days=args.max, threshold=args.threshold, output_dir=args.output, verbose=args.verbose)
@@ -0,0 +1,51 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import importlib
+
+
+class LazyModule(object):
+    """A module which is imported on the first access to one of its attributes
+
+    It's used for the heavy dependencies (e.g. scipy and matplotlib through
+    libmozdata.dataanalysis) which are only needed by some code paths.
+    """
+
+    def __init__(self, name):
+        """Constructor
+
+        Args:
+            name (str): the module name
+        """
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+
+    def _load(self):
+        module = object.__getattribute__(self, '_module')
+        if module is None:
+            # the import lock makes it safe with several threads
+            module = importlib.import_module(object.__getattribute__(self, '_name'))
+            object.__setattr__(self, '_module', module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        return '<lazy module %s>' % object.__getattribute__(self, '_name')
+
+
+def load(name):
+    """Get a module which will be imported on its first use
+
+    Args:
+        name (str): the module name
+
+    Returns:
+        LazyModule: the module
+    """
+    return LazyModule(name)
@@ -0,0 +1,100 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from collections import defaultdict, deque
+import math
+import threading
+import time
+
+
+# number of latencies kept by endpoint to compute the percentiles
+WINDOW = 4096
+
+
+def percentile(values, p):
+    """Get a percentile (nearest rank) of some sorted values
+
+    Args:
+        values (List[float]): the sorted values
+        p (float): the percentile in [0, 100]
+
+    Returns:
+        float: the percentile or None if there are no values
+    """
+    if not values:
+        return None
+    rank = int(math.ceil(p / 100. * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+class Metrics(object):
+    """The metrics of the server: request latencies by endpoint and cache hits
+
+    The metrics are by process: with several workers, each one has its own.
+    """
+
+    def __init__(self, window=WINDOW):
+        """Constructor
+
+        Args:
+            window (Optional[int]): the number of latencies kept by endpoint
+        """
+        self.lock = threading.Lock()
+        self.window = window
+        self.start = time.time()
+        self.latencies = defaultdict(lambda: deque(maxlen=self.window))
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.cache = defaultdict(int)
+
+    def add_request(self, endpoint, latency, status=200):
+        """Record a request
+
+        Args:
+            endpoint (str): the endpoint
+            latency (float): the latency in seconds
+            status (Optional[int]): the http status
+        """
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            self.requests[endpoint] += 1
+            if status >= 500:
+                self.errors[endpoint] += 1
+
+    def add_cache(self, kind):
+        """Record a cache access
+
+        Args:
+            kind (str): hit (in memory), shared (in the shared cache) or miss
+        """
+        with self.lock:
+            self.cache[kind] += 1
+
+    def get(self):
+        """Get the metrics
+
+        Returns:
+            dict: the uptime, the cache accesses and the latencies percentiles (in ms) by endpoint
+        """
+        with self.lock:
+            latencies = {e: sorted(v) for e, v in self.latencies.items()}
+            requests = dict(self.requests)
+            errors = dict(self.errors)
+            cache = dict(self.cache)
+
+        endpoints = {}
+        for endpoint, values in latencies.items():
+            stats = {'requests': requests[endpoint], 'errors': errors.get(endpoint, 0)}
+            for p in [50, 90, 99]:
+                stats['p%d' % p] = round(percentile(values, p) * 1000., 3)
+            stats['max'] = round(values[-1] * 1000., 3)
+            endpoints[endpoint] = stats
+
+        hits = cache.get('hit', 0) + cache.get('shared', 0)
+        total = hits + cache.get('miss', 0)
+        cache['hit_rate'] = float(hits) / total if total else None
+
+        return {'uptime': round(time.time() - self.start, 3),
+                'endpoints': endpoints,
+                'cache': cache}
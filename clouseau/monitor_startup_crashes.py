@@ -3,34 +3,105 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import argparse
-import json
 import datetime
 import os
 import functools
+import logging
 import requests
 from collections import (defaultdict, OrderedDict)
-from jinja2 import Environment, FileSystemLoader
+from concurrent.futures import ThreadPoolExecutor
 import libmozdata.socorro as socorro
 import libmozdata.utils as utils
-import libmozdata.spikeanalysis as spikeanalysis
-import libmozdata.gmail as gmail
 from libmozdata.bugzilla import Bugzilla
 from . import config
-import inflect
+from . import bugindex
+from . import lazy
+from . import spikes
+from . import startuphistory
+from .store import Store
+from . import transport
+from . import versioncatalog
+
+
+# only needed to analyze the data or to send the email
+jinja2 = lazy.load('jinja2')
+spikeanalysis = lazy.load('libmozdata.spikeanalysis')
+gmail = lazy.load('libmozdata.gmail')
+inflect = lazy.load('inflect')
 
 
 products = config.get('MonitorStartupCrashes', 'products', ['Firefox', 'FennecAndroid'], type=list)
 channels = config.get('MonitorStartupCrashes', 'channels', ['release', 'beta', 'aurora', 'nightly'], type=list)
+CRASH_ANALYSIS_URL = 'https://crash-analysis.mozilla.com/release-mgmt'
+__crashanalysis_store = None
+
+
+def get_crashanalysis_store():
+    """Get the store containing the local copies of the crash-analysis files
+
+    Returns:
+        Store: the store
+    """
+    global __crashanalysis_store
+    if __crashanalysis_store is None:
+        __crashanalysis_store = Store('crash_analysis')
+    return __crashanalysis_store
+
+
+def set_crashanalysis_store(store):
+    global __crashanalysis_store
+    __crashanalysis_store = store
+
+
+def get_crashanalysis_file(tr, jsonfile, store):
+    """Get a crash-analysis file
+
+    The request is conditional when there's a local copy, so the file is downloaded
+    only when it has been modified. The local copy is used too when the server is down.
+
+    Args:
+        tr (transport.Transport): the transport
+        jsonfile (str): the file name
+        store (Store): the store containing the local copies
+
+    Returns:
+        dict: the data
+    """
+    copy = store.get(jsonfile)
+    headers = {}
+    if copy:
+        if copy['etag']:
+            headers['If-None-Match'] = copy['etag']
+        if copy['last_modified']:
+            headers['If-Modified-Since'] = copy['last_modified']
+
+    try:
+        r = tr.get(CRASH_ANALYSIS_URL + '/' + jsonfile, headers=headers)
+        if copy and r.status_code == 304:
+            return copy['data']
+        r.raise_for_status()
+    except requests.exceptions.RequestException:
+        if copy:
+            logging.warning('Cannot get %s: use the local copy' % jsonfile)
+            return copy['data']
+        raise
+
+    data = r.json()
+    store.put(jsonfile, {'etag': r.headers.get('ETag', ''),
+                         'last_modified': r.headers.get('Last-Modified', ''),
+                         'data': data})
+    return data
 
 
 def get_crashanalysis_data():
-    data = {}
-    url = 'https://crash-analysis.mozilla.com/release-mgmt'
-    for product in products:
-        for chan in channels:
-            jsonfile = '%s-%s-crashes-categories.json' % (product, chan)
-            data[jsonfile] = requests.get(url + '/' + jsonfile).json()
-    return data
+    jsonfiles = ['%s-%s-crashes-categories.json' % (product, chan) for product in products for chan in channels]
+    store = get_crashanalysis_store()
+    workers = min(len(jsonfiles), 8)
+    # the connections are pooled and the requests are limited by the transport
+    tr = transport.get_transport()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {f: executor.submit(get_crashanalysis_file, tr, f, store) for f in jsonfiles}
+        return {f: future.result() for f, future in futures.items()}
 
 
 def convert(data):
@@ -64,7 +135,6 @@ def get_most_signifiant_increases(data):
     # Get the differences between signatures numbers
     # data = {product -> {channel -> {date -> {signature -> count...
     interesting_sgns = defaultdict(lambda: defaultdict(lambda: {}))
-    infinity = float('+Inf')
     empty = []
     for p, i1 in data.items():
         for c, i2 in i1.items():
@@ -72,24 +142,7 @@ def get_most_signifiant_increases(data):
                 empty.append((p, c))
                 continue
 
-            # add signature -> 0 for signature which have no crash
-            signatures = set(s for sgns in i2.values() for s in sgns.keys())
-            for sgns in i2.values():
-                for s in signatures:
-                    if s not in sgns:
-                        sgns[s] = 0
-
-            diffs = {}
-            for d, sgns in sorted(i2.items(), key=lambda p: p[0], reverse=True):
-                for sgn, n in sgns.items():
-                    if sgn in diffs:
-                        if diffs[sgn][0] > n:
-                            rate = int(round(100. * float(diffs[sgn][0] - n) / float(n))) if n != 0 else infinity
-                            diffs[sgn] = (diffs[sgn][0] - n, diffs[sgn][0], n, rate)
-                        else:
-                            del diffs[sgn]
-                    else:
-                        diffs[sgn] = (n, n, 0, infinity)
+            diffs = spikes.get_increases(i2)
             # we've all the diffs for a product and a channel
             s = sorted(diffs.items(), key=lambda p: p[0])
             x = [float(n[0]) for _, n in s]
@@ -108,7 +161,7 @@ def get_bugs(data):
     for p, i1 in data.items():
         for c, i2 in i1.items():
             signatures = signatures.union(set(i2.keys()))
-    bugs_by_signature = socorro.Bugs.get_bugs(list(signatures))
+    bugs_by_signature = bugindex.get_bugs(list(signatures))
     bugs = set()
     for b in bugs_by_signature.values():
         bugs = bugs.union(set(b))
@@ -150,13 +203,75 @@ def get_bugs(data):
     return bugs_by_signature
 
 
+def get_series(product, channel, numbers, history, end_date):
+    """Get the totals of startup crashes up to a date
+
+    Args:
+        product (str): the product
+        channel (str): the channel
+        numbers (dict): date -> numbers, the days which may not be in the history
+        history (StartupHistory): the history (can be None)
+        end_date (datetime.datetime): the last date
+
+    Returns:
+        (List[str], List[float]): the sorted dates and their totals
+    """
+    totals = {}
+    if history:
+        days = config.get('MonitorStartupCrashes', 'history_days', 0, type=int)
+        totals.update(history.get_totals(product, channel, utils.get_date_str(end_date), days=days))
+    for date, n in numbers.items():
+        totals[date] = n['total']
+
+    # the dates are YYYY-MM-DD, so they can be compared as strings
+    end_date = utils.get_date_str(end_date)
+    dates = [d for d in sorted(totals.keys()) if d <= end_date]
+    return dates, [float(totals[d]) for d in dates]
+
+
+def get_totals(product, channel, numbers, history, end_date):
+    return get_series(product, channel, numbers, history, end_date)[1]
+
+
+def get_delays():
+    return {'release': config.get('MonitorStartupCrashes', 'delay_release', 12, type=int),
+            'beta': config.get('MonitorStartupCrashes', 'delay_beta', 4, type=int),
+            'aurora': config.get('MonitorStartupCrashes', 'delay_aurora', 9, type=int),
+            'nightly': config.get('MonitorStartupCrashes', 'delay_nightly', 9, type=int)}
+
+
+def get_versions(versions, start_date, end_date, delay_by_channel):
+    """Get the versions (not beta builds) released in the delay before the dates
+
+    Args:
+        versions (dict): the versions of a product from ProductVersions.get_all_versions
+        start_date (datetime.datetime): the first date
+        end_date (datetime.datetime): the last date
+        delay_by_channel (dict): channel -> delay in weeks
+
+    Returns:
+        dict: channel -> versions
+    """
+    res = {}
+    for chan in channels:
+        info = versions[chan]
+        last_ver_major = max(info.keys())
+        _start_date = start_date - datetime.timedelta(weeks=delay_by_channel[chan])
+        res[chan] = []
+        for major in range(last_ver_major, last_ver_major - 4, -1):
+            for v, d in info[major]['versions'].items():
+                if not v.endswith('b') and _start_date <= d <= end_date:
+                    res[chan].append(v)
+    return res
+
+
 def monitor(emails=[], date='yesterday', path='', data=None, verbose=False, writejson=False):
+    history = None
     if not data:
-        try:
-            with open(path, 'r') as In:
-                data = json.load(In)
-        except IOError:
-            data = {p: {c: {} for c in channels} for p in products}
+        # data will only contain the new days
+        if path:
+            history = startuphistory.get_history(path)
+        data = {p: {c: {} for c in channels} for p in products}
 
     searches = []
     start_date = utils.get_date_ymd(date)
@@ -196,27 +311,18 @@ def monitor(emails=[], date='yesterday', path='', data=None, verbose=False, writ
     else:
         dates = [date]
 
-    delay_by_channel = {'release': config.get('MonitorStartupCrashes', 'delay_release', 12, type=int),
-                        'beta': config.get('MonitorStartupCrashes', 'delay_beta', 4, type=int),
-                        'aurora': config.get('MonitorStartupCrashes', 'delay_aurora', 9, type=int),
-                        'nightly': config.get('MonitorStartupCrashes', 'delay_nightly', 9, type=int)}
+    delay_by_channel = get_delays()
 
     for data_date in dates:
         data_date = utils.get_date_ymd(data_date)
         next_data_date = data_date + datetime.timedelta(days=1)
         search_data_date = socorro.SuperSearch.get_search_date(data_date, next_data_date)
         for product in products:
-            versions = socorro.ProductVersions.get_all_versions(product)
+            versions = versioncatalog.get_all_versions(product)
             all_versions[product] = []
-            for chan in channels:
-                info = versions[chan]
-                last_ver_major = max(info.keys())
-                _start_date = data_date - datetime.timedelta(weeks=delay_by_channel[chan])
-                for major in range(last_ver_major, last_ver_major - 4, -1):
-                    for v, d in info[major]['versions'].items():
-                        if not v.endswith('b') and _start_date <= d <= data_date:
-                            all_versions[product].append(v)
-                            versions_pc[product][chan].append(v)
+            for chan, vers in get_versions(versions, data_date, data_date, delay_by_channel).items():
+                all_versions[product].extend(vers)
+                versions_pc[product][chan].extend(vers)
             searches.append(socorro.SuperSearch(params={'product': product,
                                                         'date': search_data_date,
                                                         'release_channel': channels,
@@ -230,9 +336,8 @@ def monitor(emails=[], date='yesterday', path='', data=None, verbose=False, writ
     for s in searches:
         s.wait()
 
-    if writejson and path:
-        with open(path, 'w') as Out:
-            json.dump(data, Out, sort_keys=True)
+    if writejson and history:
+        history.put(data)
 
     new_start_date = start_date - datetime.timedelta(days=1)
     new_search_date = socorro.SuperSearch.get_search_date(new_start_date, end_date)
@@ -252,23 +357,20 @@ def monitor(emails=[], date='yesterday', path='', data=None, verbose=False, writ
     spikers_info = defaultdict(lambda: defaultdict(lambda: dict()))
 
     searches = []
-    for product, i1 in data.items():
-        for chan, i2 in i1.items():
-            _data = [float(i[1]['total']) for i in sorted(i2.items(), key=lambda p: utils.get_date_ymd(p[0])) if utils.get_date_ymd(i[0]) <= start_date]
-            # print(product, chan)
-            issp = spikeanalysis.is_spiking_ma(_data, alpha=2.5, win=7, method='mean', plot=False) == 'up'
-            # spikeanalysis.get_spikes_ma(_data, alpha=2.5, win=7, method='mean', plot=True)
-            if issp:
-                # spikeanalysis.is_spiking_ma(_data, alpha=2.5, win=7, method='mean', plot=True)
-                searches.append(socorro.SuperSearch(params={'product': product,
-                                                            'date': new_search_date,
-                                                            'release_channel': chan,
-                                                            'version': all_versions[product],
-                                                            'uptime': '<60',
-                                                            '_results_number': 0,
-                                                            '_histogram.date': 'signature',
-                                                            '_facets_size': 100},
-                                                    handler=handler_ss_spikers, handlerdata=spikers_info[product][chan]))
+    # all the series are checked in one pass
+    series = [(product, chan, get_totals(product, chan, i2, history, start_date)) for product, i1 in data.items() for chan, i2 in i1.items()]
+    spiking = spikes.is_spiking_ma([s[2] for s in series], alpha=2.5, win=7, method='mean')
+    for (product, chan, _), issp in zip(series, spiking):
+        if issp == 'up':
+            searches.append(socorro.SuperSearch(params={'product': product,
+                                                        'date': new_search_date,
+                                                        'release_channel': chan,
+                                                        'version': all_versions[product],
+                                                        'uptime': '<60',
+                                                        '_results_number': 0,
+                                                        '_histogram.date': 'signature',
+                                                        '_facets_size': 100},
+                                                handler=handler_ss_spikers, handlerdata=spikers_info[product][chan]))
 
     for s in searches:
         s.wait()
@@ -315,7 +417,7 @@ def monitor(emails=[], date='yesterday', path='', data=None, verbose=False, writ
         for s in searches:
             s.wait()
 
-        env = Environment(loader=FileSystemLoader('templates'))
+        env = jinja2.Environment(loader=jinja2.FileSystemLoader('templates'))
         env.filters['inflect'] = inflect
         template = env.get_template('startup_crashes_email')
         _is = OrderedDict()
@@ -345,12 +447,127 @@ def monitor(emails=[], date='yesterday', path='', data=None, verbose=False, writ
     return None
 
 
+def get_startup_histograms(start_date, end_date):
+    """Get the numbers of startup crashes by day with one query by product
+
+    The query is done on the versions released in [start_date - delay, end_date]
+    (see get_versions) whereas monitor uses the ones released in [date - delay, date]
+    for each day: the numbers of the last days of a long range can include the
+    crashes of some versions older than the delay. The difference is small since
+    the old versions have few crashes, and a version can't be attributed to a day
+    without a query by day (a release version can also be on the beta channel).
+
+    Args:
+        start_date (datetime.datetime): the first date
+        end_date (datetime.datetime): the last date
+
+    Returns:
+        dict: product -> channel -> date -> {'total': number}
+    """
+    delay_by_channel = get_delays()
+    data = {p: {c: {} for c in channels} for p in products}
+
+    def handler(product, json, data):
+        if not json['errors']:
+            for facets in json['facets']['histogram_date']:
+                date = utils.get_date_str(utils.get_date_ymd(facets['term']))
+                for info in facets['facets']['release_channel']:
+                    chan = info['term']
+                    if chan in data:
+                        throttle = 10 if product == 'Firefox' and chan == 'release' else 1
+                        data[chan][date] = {'total': info['count'] * throttle}
+
+    searches = []
+    search_date = socorro.SuperSearch.get_search_date(start_date, end_date + datetime.timedelta(days=1))
+    for product in products:
+        versions = versioncatalog.get_all_versions(product)
+        versions = get_versions(versions, start_date, end_date, delay_by_channel)
+        searches.append(socorro.SuperSearch(params={'product': product,
+                                                    'date': search_date,
+                                                    'release_channel': channels,
+                                                    'version': sorted(set(v for vers in versions.values() for v in vers)),
+                                                    'uptime': '<60',
+                                                    '_results_number': 0,
+                                                    '_histogram.date': 'release_channel',
+                                                    '_facets_size': 100},
+                                            handler=functools.partial(handler, product), handlerdata=data[product]))
+
+    for s in searches:
+        s.wait()
+
+    return data
+
+
+def backfill(start_date, end_date, path='', data=None, fetch=True, alpha=2.5, win=7, method='mean'):
+    """Replay the spike detection over a range of dates
+
+    Args:
+        start_date (str): the first date
+        end_date (str): the last date
+        path (Optional[str]): the path of the crashes history
+        data (Optional[dict]): product -> channel -> date -> numbers, used instead of the history
+        fetch (Optional[bool]): if True, the numbers in the range are retrieved from Socorro
+        alpha (Optional[float]): the signifiance level
+        win (Optional[int]): the size of the window
+        method (Optional[str]): 'median' or 'mean'
+
+    Returns:
+        List[dict]: the alerts ({'date', 'product', 'channel', 'total'}) sorted by date
+    """
+    start_date = utils.get_date_ymd(start_date)
+    end_date = utils.get_date_ymd(end_date)
+    history = startuphistory.get_history(path) if path and not data else None
+    if data:
+        data = {p: {c: dict(i2) for c, i2 in i1.items()} for p, i1 in data.items()}
+    else:
+        data = {p: {c: {} for c in channels} for p in products}
+    if fetch:
+        for product, i1 in get_startup_histograms(start_date, end_date).items():
+            for chan, i2 in i1.items():
+                data.setdefault(product, {}).setdefault(chan, {}).update(i2)
+
+    first = utils.get_date_str(start_date)
+    keys = []
+    series = []
+    for product, i1 in data.items():
+        for chan, i2 in i1.items():
+            dates, totals = get_series(product, chan, i2, history, end_date)
+            # a series for each day in the range: all the detections are done in one pass
+            for i, date in enumerate(dates):
+                if date >= first:
+                    keys.append((date, product, chan, totals[i]))
+                    series.append(totals[:i + 1])
+
+    alerts = []
+    for (date, product, chan, total), spike in zip(keys, spikes.is_spiking_ma(series, alpha=alpha, win=win, method=method)):
+        if spike == 'up':
+            alerts.append({'date': date, 'product': product, 'channel': chan, 'total': int(total)})
+
+    return sorted(alerts, key=lambda a: (a['date'], a['product'], a['channel']))
+
+
 if __name__ == '__main__':
+    transport.install()
     parser = argparse.ArgumentParser(description='Monitor spikes in startup crashes')
-    parser.add_argument('-p', '--path', action='store', default='', help='the path of the crashes history')
+    parser.add_argument('-p', '--path', action='store', default='', help='the path of the crashes history (sqlite)')
+    parser.add_argument('-m', '--migrate', action='store_true', help='import the old json history in the path and exit')
     parser.add_argument('-e', '--email', dest='emails', action='store', nargs='+', default=[], help='emails')
     parser.add_argument('-d', '--date', dest='date', action='store', default='yesterday', help='date')
     parser.add_argument('-v', '--verbose', action='store_true', help='verbose mode')
+    parser.add_argument('-b', '--backfill', action='store', nargs=2, default=[], metavar=('START', 'END'),
+                        help='replay the spike detection between two dates (no email is sent)')
+    parser.add_argument('-a', '--alpha', action='store', type=float, default=2.5, help='the signifiance level (with --backfill)')
+    parser.add_argument('-w', '--win', action='store', type=int, default=7, help='the size of the window (with --backfill)')
     args = parser.parse_args()
 
-    monitor(path=os.path.expanduser(os.path.expandvars(args.path)), emails=args.emails, date=args.date, verbose=args.verbose, writejson=True)
+    path = os.path.expanduser(os.path.expandvars(args.path))
+    if args.migrate:
+        if startuphistory.migrate(path):
+            print('%s imported (the json history is kept in %s.bak)' % (path, path))
+        else:
+            print('%s isn\'t a json history' % path)
+    elif args.backfill:
+        for alert in backfill(args.backfill[0], args.backfill[1], path=path, alpha=args.alpha, win=args.win):
+            print('%s: spike in %s %s (%d crashes)' % (alert['date'], alert['product'], alert['channel'], alert['total']))
+    else:
+        monitor(path=path, emails=args.emails, date=args.date, verbose=args.verbose, writejson=True)
@@ -0,0 +1,220 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import re
+import sqlite3
+import threading
+
+
+__stores = {}
+__stores_lock = threading.Lock()
+json_pattern = re.compile(r'([0-9]{4}-[0-9]{2}-[0-9]{2})\.json$')
+
+
+def get_summary(results):
+    """Get the total count and the number of backtraces of the results of a signature
+
+    Args:
+        results (List[dict]): the backtraces
+
+    Returns:
+        (int, int): the total count and the number of backtraces
+    """
+    return sum(r.get('count', 0) for r in results), len(results)
+
+
+def get_store(output_dir):
+    """Get the store of the guilty patches results in a directory
+
+    Args:
+        output_dir (str): the directory
+
+    Returns:
+        PatchesStore: the store
+    """
+    output_dir = os.path.abspath(output_dir)
+    path = os.path.join(output_dir, 'patches.sqlite')
+    with __stores_lock:
+        if path not in __stores:
+            store = PatchesStore(path)
+            store.import_json(output_dir)
+            __stores[path] = store
+        return __stores[path]
+
+
+class PatchesStore(object):
+    """The results of guiltypatches stored by (date, product, channel, signature)
+
+    Each row contains the list of the backtraces with patches for a signature.
+    The database is in WAL mode, so the readers aren't blocked by a writer.
+    """
+
+    def __init__(self, path):
+        """Constructor
+
+        Args:
+            path (str): the database path
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS results (date TEXT, product TEXT, channel TEXT, signature TEXT, data TEXT, '
+                          'count INTEGER DEFAULT 0, backtraces INTEGER DEFAULT 0, '
+                          'PRIMARY KEY (date, product, channel, signature))')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS runs (date TEXT, product TEXT, channel TEXT, PRIMARY KEY (date, product, channel))')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS imported (filename TEXT PRIMARY KEY, mtime REAL)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS generation (id INTEGER PRIMARY KEY, value INTEGER)')
+        self.conn.execute('INSERT OR IGNORE INTO generation VALUES (0, 0)')
+        self.__add_summary_columns()
+        # the pages of summaries are sorted by count (the old databases get the column count above)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS results_count ON results (date, product, channel, count DESC, signature)')
+
+    def __add_summary_columns(self):
+        # the databases created before the summaries have no columns count and backtraces
+        columns = {r[1] for r in self.conn.execute('PRAGMA table_info(results)')}
+        if 'count' in columns:
+            return
+
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.execute('ALTER TABLE results ADD COLUMN count INTEGER DEFAULT 0')
+            self.conn.execute('ALTER TABLE results ADD COLUMN backtraces INTEGER DEFAULT 0')
+            rows = self.conn.execute('SELECT rowid, data FROM results').fetchall()
+            rows = [get_summary(json.loads(data)) + (rowid, ) for rowid, data in rows]
+            self.conn.executemany('UPDATE results SET count = ?, backtraces = ? WHERE rowid = ?', rows)
+            self.conn.execute('COMMIT')
+
+    def import_json(self, output_dir):
+        """Import the results from the old <date>.json files if they're new or modified
+
+        Args:
+            output_dir (str): the directory containing the files
+        """
+        with self.lock:
+            imported = dict(self.conn.execute('SELECT filename, mtime FROM imported').fetchall())
+
+        for f in sorted(os.listdir(output_dir)):
+            m = json_pattern.match(f)
+            path = os.path.join(output_dir, f)
+            if not m or not os.path.isfile(path):
+                continue
+            mtime = os.path.getmtime(path)
+            if imported.get(f) == mtime:
+                continue
+
+            date = m.group(1)
+            with open(path, 'r') as In:
+                data = json.load(In)
+            for product, i in data.items():
+                for channel, results in i.items():
+                    self.put(date, product, channel, results)
+
+            with self.lock:
+                self.conn.execute('INSERT OR REPLACE INTO imported VALUES (?, ?)', (f, mtime))
+
+    def get_dates(self):
+        """Get the dates with results (even empty)
+
+        Returns:
+            List[str]: the sorted dates
+        """
+        with self.lock:
+            return [r[0] for r in self.conn.execute('SELECT DISTINCT date FROM runs ORDER BY date')]
+
+    def get(self, date, product, channel, signatures=None):
+        """Get the results
+
+        Args:
+            date (str): the date (YYYY-MM-DD)
+            product (str): the product
+            channel (str): the channel
+            signatures (Optional[List[str]]): the signatures to get, by default all
+
+        Returns:
+            dict: signature -> results
+        """
+        query = 'SELECT signature, data FROM results WHERE date = ? AND product = ? AND channel = ?'
+        params = [date, product, channel]
+        if signatures is not None:
+            signatures = list(signatures)
+            if not signatures:
+                return {}
+            query += ' AND signature IN (%s)' % ','.join('?' * len(signatures))
+            params += signatures
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+
+        return {sgn: json.loads(data) for sgn, data in rows}
+
+    def get_summaries(self, date, product, channel, offset=0, limit=None, min_count=0):
+        """Get the summaries of the results ordered by decreasing count
+
+        Args:
+            date (str): the date (YYYY-MM-DD)
+            product (str): the product
+            channel (str): the channel
+            offset (Optional[int]): the number of signatures to skip
+            limit (Optional[int]): the max number of signatures, by default all
+            min_count (Optional[int]): the min count of the signatures
+
+        Returns:
+            (int, List[dict]): the number of signatures with a count >= min_count
+                               and the summaries ({'signature', 'count', 'backtraces'})
+        """
+        where = ' FROM results WHERE date = ? AND product = ? AND channel = ? AND count >= ?'
+        params = [date, product, channel, min_count]
+        query = 'SELECT signature, count, backtraces' + where + ' ORDER BY count DESC, signature LIMIT ? OFFSET ?'
+        # -1 means no limit for sqlite
+        limit = -1 if limit is None else limit
+
+        with self.lock:
+            total = self.conn.execute('SELECT COUNT(*)' + where, params).fetchone()[0]
+            rows = self.conn.execute(query, params + [limit, offset]).fetchall()
+
+        return total, [{'signature': sgn, 'count': count, 'backtraces': bts} for sgn, count, bts in rows]
+
+    def put(self, date, product, channel, results):
+        """Put (insert or replace) the results
+
+        Args:
+            date (str): the date (YYYY-MM-DD)
+            product (str): the product
+            channel (str): the channel
+            results (dict): signature -> results
+        """
+        rows = [(date, product, channel, sgn, json.dumps(res, sort_keys=True)) + get_summary(res) for sgn, res in results.items()]
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.execute('INSERT OR IGNORE INTO runs VALUES (?, ?, ?)', (date, product, channel))
+            self.conn.execute('UPDATE generation SET value = value + 1 WHERE id = 0')
+            self.conn.executemany('INSERT OR REPLACE INTO results (date, product, channel, signature, data, count, backtraces) '
+                                  'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self.conn.execute('COMMIT')
+
+    def get_generation(self):
+        """Get the generation of the data: it's incremented each time some results are put
+
+        Returns:
+            int: the generation
+        """
+        with self.lock:
+            return self.conn.execute('SELECT value FROM generation WHERE id = 0').fetchone()[0]
+
+    def has_run(self, date, product, channel):
+        """Check if there are results (even empty)
+
+        Args:
+            date (str): the date (YYYY-MM-DD)
+            product (str): the product
+            channel (str): the channel
+
+        Returns:
+            bool: True if the results have been put
+        """
+        with self.lock:
+            return self.conn.execute('SELECT 1 FROM runs WHERE date = ? AND product = ? AND channel = ?', (date, product, channel)).fetchone() is not None
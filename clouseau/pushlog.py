@@ -0,0 +1,183 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+import logging
+import os
+import sqlite3
+import subprocess
+import threading
+from . import config
+
+
+__repositories = {}
+__indices = {}
+__indices_lock = threading.Lock()
+
+
+def get_repository(channel):
+    """Get the path of the local clone used for a channel
+
+    Args:
+        channel (str): the channel
+
+    Returns:
+        str: the path or '' if there's no local clone
+    """
+    path = config.get('GuiltyPatches', 'repository_' + channel, '')
+    return os.path.expanduser(path) if path else ''
+
+
+def set_repository(channel, path):
+    # used to bypass the config
+    __repositories[channel] = path
+
+
+def get_index(channel):
+    """Get the pushlog index of the local clone for a channel
+
+    Args:
+        channel (str): the channel
+
+    Returns:
+        PushlogIndex: the index or None if there's no local clone
+    """
+    path = __repositories.get(channel) or get_repository(channel)
+    if not path:
+        return None
+
+    with __indices_lock:
+        if path not in __indices:
+            __indices[path] = PushlogIndex(path)
+        return __indices[path]
+
+
+class PushlogIndex(object):
+    """An index path -> (node, pushdate) built from a local Mercurial clone
+
+    The pushes come from the pushlog database (.hg/pushlog2.db) and the touched
+    files from hg log. The index is updated incrementally with the new pushes.
+    """
+
+    def __init__(self, repository, path=None, hg='hg'):
+        """Constructor
+
+        Args:
+            repository (str): the path of the local clone
+            path (Optional[str]): the path of the index, by default it's in the .hg directory
+            hg (Optional[str]): the hg command
+        """
+        self.repository = repository
+        self.path = path if path else os.path.join(repository, '.hg', 'clouseau_pushlog.sqlite')
+        self.hg = hg
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS pushes (id INTEGER PRIMARY KEY, date INTEGER)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS changesets (rev INTEGER PRIMARY KEY, node TEXT, pushid INTEGER)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS files (path TEXT, rev INTEGER)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS changesets_node ON changesets (node)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS files_path ON files (path, rev)')
+
+    def get_last_push(self):
+        return self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM pushes').fetchone()[0]
+
+    def add(self, pushes, changesets, files):
+        """Add data in the index
+
+        Args:
+            pushes (List[(int, int)]): the pushes (id, date)
+            changesets (List[(int, str, int)]): the changesets (rev, node, pushid)
+            files (List[(str, int)]): the touched files (path, rev)
+        """
+        with self.lock:
+            self.conn.execute('BEGIN')
+            self.conn.executemany('INSERT OR REPLACE INTO pushes VALUES (?, ?)', pushes)
+            self.conn.executemany('INSERT OR REPLACE INTO changesets VALUES (?, ?, ?)', changesets)
+            self.conn.executemany('INSERT INTO files VALUES (?, ?)', files)
+            self.conn.execute('COMMIT')
+
+    def get_files(self, first_rev, last_rev):
+        """Get the files touched by the changesets from hg log
+
+        Args:
+            first_rev (int): the first revision
+            last_rev (int): the last revision
+
+        Returns:
+            List[(str, int)]: the touched files (path, rev)
+        """
+        out = subprocess.check_output([self.hg, 'log', '-R', self.repository,
+                                       '-r', '%d:%d' % (first_rev, last_rev),
+                                       '--template', '{rev}\\t{join(files, "\\t")}\\n'])
+        files = []
+        for line in out.decode('utf-8').split('\n'):
+            if line:
+                line = line.split('\t')
+                rev = int(line[0])
+                files.extend((f, rev) for f in line[1:] if f)
+        return files
+
+    def update(self):
+        """Add the pushes which aren't in the index yet (to call after hg pull)
+
+        Returns:
+            int: the number of new pushes
+        """
+        last_push = self.get_last_push()
+        pushlog = sqlite3.connect(os.path.join(self.repository, '.hg', 'pushlog2.db'))
+        try:
+            pushes = pushlog.execute('SELECT id, date FROM pushlog WHERE id > ?', (last_push, )).fetchall()
+            changesets = pushlog.execute('SELECT rev, node, pushid FROM changesets WHERE pushid > ?', (last_push, )).fetchall()
+        finally:
+            pushlog.close()
+
+        files = []
+        if changesets:
+            revs = [c[0] for c in changesets]
+            files = self.get_files(min(revs), max(revs))
+            known = set(revs)
+            files = [f for f in files if f[1] in known]
+
+        self.add(pushes, changesets, files)
+        logging.debug('Pushlog index %s: %d new pushes' % (self.path, len(pushes)))
+
+        return len(pushes)
+
+    def get_last_patches(self, path, node, utc_ts, max_days):
+        """Get the patches which touched a file and were pushed in [utc_ts - max_days, utc_ts]
+        before the push of node (same result as FileStats.get_last_patches)
+
+        Args:
+            path (str): the file path
+            node (str): the revision (can be a short node)
+            utc_ts (int): the timestamp
+            max_days (int): the number of days
+
+        Returns:
+            List[dict]: the patches ({'node', 'pushdate'}) or None if node isn't in the index
+        """
+        with self.lock:
+            # the nodes are in hexadecimal so all the nodes beginning with node are in [node, node + 'g')
+            row = self.conn.execute('SELECT pushid FROM changesets WHERE node >= ? AND node < ? LIMIT 1', (node, node + 'g')).fetchone()
+            if row is None:
+                return None
+
+            rows = self.conn.execute('SELECT c.node, p.date FROM files f '
+                                     'JOIN changesets c ON c.rev = f.rev '
+                                     'JOIN pushes p ON p.id = c.pushid '
+                                     'WHERE f.path = ? AND c.pushid <= ? AND p.date >= ? AND p.date <= ? '
+                                     'ORDER BY c.rev DESC',
+                                     (path, row[0], utc_ts - max_days * 86400, utc_ts)).fetchall()
+
+        return [{'node': n, 'pushdate': [date, 0]} for n, date in rows]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Update the pushlog index of a local Mercurial clone')
+    parser.add_argument('-r', '--repository', action='store', required=True, help='the path of the local clone')
+    parser.add_argument('-o', '--output', action='store', default='', help='the index path')
+    args = parser.parse_args()
+
+    index = PushlogIndex(args.repository, path=args.output)
+    print('%d new pushes' % index.update())
@@ -0,0 +1,138 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import math
+from collections import OrderedDict
+import libmozdata.socorro as socorro
+from libmozdata.connection import Query
+from . import config
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+
+# the default number of terms in a Socorro facet
+DEFAULT_FACETS_SIZE = 50
+# the chunk size used before to have a planner
+NAIVE_CHUNK_SIZE = 10
+
+
+def get_max_url_length():
+    return config.get('SuperSearch', 'max_url_length', 6000, type=int)
+
+
+def get_max_signatures():
+    return config.get('SuperSearch', 'max_signatures', 200, type=int)
+
+
+class QueryPlanner(object):
+    """Plan the SuperSearch queries on lists of signatures
+
+    The queries sharing the same parameters and the same handler are merged and
+    the signatures are split in chunks as large as possible according to the max
+    url length and to the max number of signatures in a query.
+    """
+
+    def __init__(self, url=socorro.SuperSearch.URL, max_url_length=None, max_signatures=None):
+        """Constructor
+
+        Args:
+            url (Optional[str]): the url to query
+            max_url_length (Optional[int]): the max length for the url of a query
+            max_signatures (Optional[int]): the max number of signatures in a query
+        """
+        self.url = url
+        self.max_url_length = get_max_url_length() if max_url_length is None else max_url_length
+        self.max_signatures = get_max_signatures() if max_signatures is None else max_signatures
+        self.plans = OrderedDict()
+        self.naive_count = 0
+        self.count = 0
+
+    @staticmethod
+    def __get_key(params):
+        items = []
+        for k, v in sorted(params.items()):
+            if isinstance(v, list):
+                v = tuple(v)
+            items.append((k, v))
+        return tuple(items)
+
+    def add(self, signatures, params, handler, handlerdata=None):
+        """Add a query on signatures
+
+        Args:
+            signatures (List[str]): the signatures to search
+            params (dict): the other parameters of the query
+            handler (function): handler to use with the result of the query
+            handlerdata (Optional): data used in second argument of the handler
+        """
+        self.naive_count += int(math.ceil(float(len(signatures)) / float(NAIVE_CHUNK_SIZE)))
+        plans = self.plans.setdefault(QueryPlanner.__get_key(params), [])
+        for plan in plans:
+            if plan['handler'] == handler and plan['handlerdata'] is handlerdata:
+                known = plan['known']
+                for s in signatures:
+                    if s not in known:
+                        known.add(s)
+                        plan['signatures'].append(s)
+                return
+
+        plans.append({'signatures': list(signatures),
+                      'known': set(signatures),
+                      'params': params,
+                      'handler': handler,
+                      'handlerdata': handlerdata})
+
+    def chunks(self, signatures, params):
+        """Split the signatures in chunks
+
+        Args:
+            signatures (List[str]): the signatures
+            params (dict): the other parameters of the query
+
+        Yields:
+            a chunk of signatures
+        """
+        length = len(self.url) + 1 + len(urlencode(params, doseq=True))
+        chunk = []
+        chunk_length = length
+        for s in signatures:
+            s_length = len(urlencode({'signature': '=' + s})) + 1
+            if chunk and (chunk_length + s_length > self.max_url_length or len(chunk) == self.max_signatures):
+                yield chunk
+                chunk = []
+                chunk_length = length
+            chunk.append(s)
+            chunk_length += s_length
+        if chunk:
+            yield chunk
+
+    def get_queries(self):
+        """Get the queries
+
+        Returns:
+            List[Query]: the queries
+        """
+        queries = []
+        for plan in (plan for plans in self.plans.values() for plan in plans):
+            params = plan['params']
+            for chunk in self.chunks(plan['signatures'], params):
+                cparams = params.copy()
+                cparams['signature'] = ['=' + s for s in chunk]
+                if len(chunk) > cparams.get('_facets_size', DEFAULT_FACETS_SIZE):
+                    # we need to have all the signatures in the facets
+                    cparams['_facets_size'] = len(chunk)
+                queries.append(Query(self.url, cparams, handler=plan['handler'], handlerdata=plan['handlerdata']))
+        self.count = len(queries)
+
+        return queries
+
+    def get_saved(self):
+        """Get the number of saved queries compared to chunks of 10 signatures
+
+        Returns:
+            int: the number of saved queries
+        """
+        return self.naive_count - self.count
@@ -2,38 +2,324 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
-from flask import Flask, jsonify, render_template
+from collections import OrderedDict
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+from flask import Flask, Response, g, render_template, request
 from flask_restful import Resource, Api, reqparse
+from . import config
 from . import guiltypatches
+from .metrics import Metrics
+from . import transport
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 
 app = Flask(__name__, template_folder='../templates', static_folder='../html', static_url_path='')
 api = Api(app)
 
 
+def serialize(data):
+    """Serialize the data of a response
+
+    Args:
+        data: the data to put in json
+
+    Returns:
+        dict: the ETag, the buffer containing the json body and the compressed
+              bodies and the parts of the buffer by encoding
+    """
+    body = json.dumps(data, sort_keys=True).encode('utf-8')
+    etag = hashlib.sha1(body).hexdigest()
+    bodies = [('identity', body), ('gzip', gzip_compress(body))]
+    if brotli is not None:
+        bodies.append(('br', brotli.compress(body)))
+
+    parts = {}
+    start = 0
+    for encoding, b in bodies:
+        parts[encoding] = (start, start + len(b))
+        start += len(b)
+
+    return {'etag': etag, 'data': b''.join(b for _, b in bodies), 'parts': parts}
+
+
+def gzip_compress(body):
+    # mtime=0 to have the same bytes for the same body
+    out = io.BytesIO()
+    with gzip.GzipFile(fileobj=out, mode='wb', mtime=0) as f:
+        f.write(body)
+    return out.getvalue()
+
+
+class ResponseCache(object):
+    """The serialized responses of the patches API
+
+    The results change once a day, so the responses are kept until the generation
+    of the results changes. The keys come from the query string (pages, signatures),
+    so only the `size` last used responses are kept.
+    When a path is given, the shared responses (the ones with a bounded set of keys:
+    the infos, the full days and their summaries) are written in files which are
+    memory-mapped, so the workers of the server share them (through the page cache)
+    and a response is serialized by only one of them.
+    """
+
+    def __init__(self, path='', size=256):
+        """Constructor
+
+        Args:
+            path (Optional[str]): the directory of the shared responses
+            size (Optional[int]): the max number of responses kept in memory
+        """
+        self.lock = threading.Lock()
+        self.generation = None
+        self.responses = OrderedDict()
+        self.path = path
+        self.size = size
+
+    def get(self, key, function, shared=False):
+        """Get the serialized response
+
+        Args:
+            key (tuple): the key
+            function (function): the function to call to get the data to serialize
+            shared (Optional[bool]): True to share the response with the other workers
+
+        Returns:
+            dict: the serialized response (see serialize)
+        """
+        generation = guiltypatches.get_generation()
+        with self.lock:
+            if generation != self.generation:
+                self.responses.clear()
+                self.generation = generation
+                self.__clean_shared(generation)
+            response = self.responses.pop(key, None)
+            if response is not None:
+                # most recently used at the end
+                self.responses[key] = response
+
+        if response is not None:
+            metrics.add_cache('hit')
+            return response
+
+        response = self.__get_shared(generation, key) if shared else None
+        if response is not None:
+            metrics.add_cache('shared')
+        else:
+            metrics.add_cache('miss')
+            response = serialize(function())
+            if shared:
+                self.__put_shared(generation, key, response)
+
+        with self.lock:
+            if generation == self.generation:
+                self.responses[key] = response
+                while len(self.responses) > self.size:
+                    self.responses.popitem(last=False)
+
+        return response
+
+    def __get_filename(self, generation, key):
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.path, '%s-%s.bin' % (generation, name))
+
+    def __get_shared(self, generation, key):
+        if not self.path:
+            return None
+
+        try:
+            with open(self.__get_filename(generation, key), 'rb') as In:
+                data = mmap.mmap(In.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):
+            return None
+
+        # the file is: a json header on one line followed by the bodies
+        end = data.find(b'\n')
+        header = json.loads(data[:end].decode('utf-8'))
+        parts = {e: (start + end + 1, stop + end + 1) for e, (start, stop) in header['parts'].items()}
+
+        return {'etag': header['etag'], 'data': data, 'parts': parts}
+
+    def __put_shared(self, generation, key, response):
+        if not self.path:
+            return
+
+        header = json.dumps({'etag': response['etag'], 'parts': response['parts']}).encode('utf-8')
+        # write in a temporary file and rename it to not have partial files
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, 'wb') as Out:
+                Out.write(header + b'\n')
+                Out.write(response['data'])
+            os.rename(tmp, self.__get_filename(generation, key))
+        except (IOError, OSError):
+            logging.debug('Cannot write the shared response in %s' % self.path)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def __clean_shared(self, generation):
+        # the files mapped by the other workers stay valid after their removal
+        if not self.path:
+            return
+
+        prefix = '%s-' % generation
+        for f in os.listdir(self.path):
+            if f.endswith('.bin') and not f.startswith(prefix):
+                try:
+                    os.remove(os.path.join(self.path, f))
+                except OSError:
+                    pass
+
+
+metrics = Metrics()
+response_cache = ResponseCache(os.path.expanduser(config.get('Rest', 'shared_cache', '')),
+                               size=config.get('Rest', 'cache_size', 256, type=int))
+
+
+def make_response(response):
+    """Make the http response according to the request headers
+
+    A 304 is returned when the client already has the data and the body is
+    compressed when the client accepts it.
+
+    Args:
+        response (dict): the serialized response (see serialize)
+
+    Returns:
+        Response: the response
+    """
+    etag = response['etag']
+    parts = response['parts']
+    encoding = None
+    for enc in ['br', 'gzip']:
+        if enc in parts and enc in request.accept_encodings:
+            encoding = enc
+            break
+
+    # each representation has its own strong ETag
+    tagged = etag + '-' + encoding if encoding else etag
+    if request.if_none_match.contains(tagged):
+        res = Response(status=304)
+    else:
+        start, stop = parts[encoding if encoding else 'identity']
+        res = Response(response['data'][start:stop], mimetype='application/json')
+        if encoding:
+            res.headers['Content-Encoding'] = encoding
+
+    res.set_etag(tagged)
+    res.headers['Vary'] = 'Accept-Encoding'
+    res.headers['Cache-Control'] = 'no-cache'
+
+    return res
+
+
+@app.before_request
+def start_timer():
+    g.start = time.time()
+
+
+@app.after_request
+def record_request(response):
+    start = getattr(g, 'start', None)
+    if start is not None:
+        metrics.add_request(request.endpoint or 'unknown', time.time() - start, response.status_code)
+    return response
+
+
 class Patches(Resource):
+    """The results for a day
+
+    Without offset, limit, min_count or fields, it returns signature -> backtraces
+    for all the signatures. Else it returns the page {'total', 'signatures'} where
+    the signatures are ordered by decreasing count and with fields=summary the
+    backtraces aren't included.
+    """
 
     def get(self):
         parser = reqparse.RequestParser()
-        parser.add_argument('channel', type=str, default='')
-        parser.add_argument('product', type=str, default='')
-        parser.add_argument('date', type=str, default='')
+        parser.add_argument('channel', type=str, default='', location='args')
+        parser.add_argument('product', type=str, default='', location='args')
+        parser.add_argument('date', type=str, default='', location='args')
+        parser.add_argument('offset', type=int, default=None, location='args')
+        parser.add_argument('limit', type=int, default=None, location='args')
+        parser.add_argument('min_count', type=int, default=None, location='args')
+        parser.add_argument('fields', type=str, default='', choices=('', 'summary', 'full'), location='args')
         args = parser.parse_args()
         if not (args.channel and args.product and args.date):
-            return jsonify(guiltypatches.getinfos())
-        else:
-            return jsonify(guiltypatches.get(args.channel, args.product, args.date))
+            response = response_cache.get(('infos', ), guiltypatches.getinfos, shared=True)
+            return make_response(response)
+
+        channel, product, date = guiltypatches.check_args(args.channel, args.product, args.date)
+        if args.offset is None and args.limit is None and args.min_count is None and not args.fields:
+            response = response_cache.get((channel, product, date), lambda: guiltypatches.get(channel, product, date),
+                                          shared=True)
+            return make_response(response)
+
+        offset = max(0, args.offset or 0)
+        limit = args.limit if args.limit is not None and args.limit >= 0 else None
+        min_count = args.min_count or 0
+        full = args.fields != 'summary'
+        key = (channel, product, date, offset, limit, min_count, full)
+        # only the summary of a whole day is shared: the other pages depend on the client
+        shared = offset == 0 and limit is None and min_count == 0 and not full
+        response = response_cache.get(key, lambda: guiltypatches.get_page(channel, product, date,
+                                                                          offset=offset, limit=limit,
+                                                                          min_count=min_count, full=full),
+                                      shared=shared)
+        return make_response(response)
+
+
+class Signature(Resource):
+    """The backtraces of one signature for a day"""
+
+    def get(self):
+        parser = reqparse.RequestParser()
+        parser.add_argument('channel', type=str, default='', location='args')
+        parser.add_argument('product', type=str, default='', location='args')
+        parser.add_argument('date', type=str, default='', location='args')
+        parser.add_argument('signature', type=str, required=True, location='args')
+        args = parser.parse_args()
+        channel, product, date = guiltypatches.check_args(args.channel, args.product, args.date)
+        signature = args.signature
+        response = response_cache.get(('signature', channel, product, date, signature),
+                                      lambda: guiltypatches.get_signature(channel, product, date, signature))
+        return make_response(response)
+
+
+class Health(Resource):
+    """The health and the metrics of the server process"""
+
+    def get(self):
+        data = metrics.get()
+        data['transport'] = transport.get_transport().get_stats()
+        data['status'] = 'ok'
+        data['pid'] = os.getpid()
+        data['generation'] = guiltypatches.get_generation()
+        return data
 
 
 api.add_resource(Patches, '/rest/patches', endpoint='patches')
+api.add_resource(Signature, '/rest/patches/signature', endpoint='signature')
+api.add_resource(Health, '/rest/health', endpoint='health')
 
 
 @app.route('/patches')
 def patches_html():
     parser = reqparse.RequestParser()
-    parser.add_argument('channel', type=str, default='nightly')
-    parser.add_argument('product', type=str, default='Firefox')
-    parser.add_argument('date', type=str, default='')
+    parser.add_argument('channel', type=str, default='nightly', location='args')
+    parser.add_argument('product', type=str, default='Firefox', location='args')
+    parser.add_argument('date', type=str, default='', location='args')
     args = parser.parse_args()
 
     channel, product, date = guiltypatches.check_args(args.channel, args.product, args.date)
@@ -45,4 +331,5 @@ def patches_html():
 
 
 if __name__ == '__main__':
+    transport.install()
     app.run()
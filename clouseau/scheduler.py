@@ -0,0 +1,83 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import (ThreadPoolExecutor, wait, FIRST_COMPLETED)
+
+
+class Scheduler(object):
+    """Run phases as soon as the phases they depend on are finished
+
+    Each phase is a function which takes the results of its dependencies as arguments.
+    The independent phases are run concurrently.
+    """
+
+    def __init__(self, max_workers=8, verbose=False):
+        """Constructor
+
+        Args:
+            max_workers (Optional[int]): the max number of phases running at the same time
+            verbose (Optional[bool]): if True the timings are printed
+        """
+        self.max_workers = max_workers
+        self.verbose = verbose
+        self.phases = OrderedDict()
+        self.timings = OrderedDict()
+
+    def add(self, name, function, deps=[]):
+        """Add a phase
+
+        Args:
+            name (str): the phase name
+            function (function): the function to call with the results of deps
+            deps (Optional[List[str]]): the phases to wait for
+        """
+        for dep in deps:
+            if dep not in self.phases:
+                raise Exception('Unknown phase %s (must be added before %s)' % (dep, name))
+        self.phases[name] = (function, list(deps))
+
+    def __log(self, msg):
+        if self.verbose:
+            print(msg)
+        logging.debug(msg)
+
+    def __run_phase(self, name, function, args):
+        start = time.time()
+        self.__log('Phase %s: started' % name)
+        result = function(*args)
+        self.timings[name] = time.time() - start
+        self.__log('Phase %s: finished in %.2fs' % (name, self.timings[name]))
+        return result
+
+    def run(self):
+        """Run all the phases
+
+        Returns:
+            dict: phase name -> result
+        """
+        results = {}
+        pending = OrderedDict(self.phases)
+        running = {}
+        start = time.time()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name, (function, deps) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        del pending[name]
+                        args = [results[dep] for dep in deps]
+                        running[executor.submit(self.__run_phase, name, function, args)] = name
+
+                done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    # re-raise the exception if any
+                    results[name] = future.result()
+
+        self.__log('All phases finished in %.2fs' % (time.time() - start))
+
+        return results
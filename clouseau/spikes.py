@@ -0,0 +1,173 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import warnings
+import numpy as np
+from . import lazy
+
+
+spikeanalysis = lazy.load('libmozdata.spikeanalysis')
+
+
+NONE = -(2 ** 62)
+
+
+def align(series):
+    """Put some series in an array: the series begin at index 0 and are padded with NaN
+
+    Args:
+        series (List[List[float]]): the series
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): the array and the lengths of the series
+    """
+    lengths = np.array([len(s) for s in series], dtype=np.int64)
+    data = np.full((len(series), max(lengths) if len(series) else 0), np.nan, dtype=np.float64)
+    for i, s in enumerate(series):
+        data[i, :len(s)] = s
+
+    return data, lengths
+
+
+def __get_noise(data, lengths, win):
+    # the same moving averages as in spikeanalysis (so the same floating point values)
+    # the series shorter than the window can't be spiking (and spikeanalysis.ma fails on them)
+    noise = np.full(data.shape, np.nan, dtype=np.float64)
+    for i, n in enumerate(lengths):
+        if n >= win:
+            x = data[i, :n]
+            noise[i, :n] = spikeanalysis.ma(x - spikeanalysis.ma(x, win), win)
+    return noise
+
+
+def __get_stats(ax, method):
+    with warnings.catch_warnings():
+        # a row can contain only NaN: the stats are NaN and the test is false as in spikeanalysis
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        if method == 'median':
+            m = np.nanmedian(ax, axis=1)
+            e = np.nanmedian(np.abs(ax - m[:, None]), axis=1)
+        else:
+            m = np.nanmean(ax, axis=1)
+            e = np.nanstd(ax, axis=1)
+    return m, e
+
+
+def is_spiking_ma(series, alpha=2.5, win=7, method='mean'):
+    """Check if the last values of some series are spiking (same as spikeanalysis.is_spiking_ma for each series)
+
+    The series are processed together: the loop over the time is done once and
+    the tests are done on all the series at each step.
+
+    Args:
+        series (List[List[float]]): the series
+        alpha (float): the signifiance level
+        win (int): the size of the window to use to compute the parameters
+        method (str): 'median' or 'mean'
+
+    Returns:
+        List[str]: 'up', 'down' or 'none' for each series
+    """
+    if not series:
+        return []
+
+    data, lengths = align(series)
+    noise = __get_noise(data, lengths, win)
+    S, T = data.shape
+    last_up = np.full(S, NONE, dtype=np.int64)
+    last_down = np.full(S, NONE, dtype=np.int64)
+
+    for i in range(win, T + 1):
+        j = i - 1
+        active = lengths >= i
+        if not active.any():
+            break
+
+        if i >= 2:
+            # a spike continues while the noise increases (or decreases)
+            up = active & (last_up == i - 2) & (noise[:, i - 2] < noise[:, j])
+            down = active & ~up & (last_down == i - 2) & (noise[:, i - 2] > noise[:, j])
+            last_up[up] = j
+            last_down[down] = j
+            noise[up | down, j] = np.nan
+            active &= ~(up | down)
+
+        rows = np.flatnonzero(active)
+        if not rows.size:
+            continue
+
+        x = noise[rows, :i]
+        ax = np.abs(x)
+        m, e = __get_stats(ax, method)
+        last = x[:, -1]
+        with np.errstate(invalid='ignore'):
+            spiking = np.abs(ax[:, -1] - m) > alpha * e
+        last_up[rows[spiking & (last > 0)]] = j
+        last_down[rows[spiking & (last < 0)]] = j
+        # in spikeanalysis, the loop marking the previous values is always stopped
+        # at its first iteration (the last value has just been set to NaN)
+        ended = ~spiking & ((last_up[rows] == i - 2) | (last_down[rows] == i - 2))
+        noise[rows[(spiking & (last != 0)) | ended], j] = np.nan
+
+    res = []
+    for s in range(S):
+        n = lengths[s]
+        x = data[s, :n]
+        if n >= 2 and last_up[s] == n - 1 and x[-1] > x[-2] and np.max(x[-win:]) == x[-1]:
+            res.append('up')
+        elif n >= 2 and last_down[s] == n - 1 and x[-1] < x[-2] and np.min(x[-win:]) == x[-1]:
+            res.append('down')
+        else:
+            res.append('none')
+
+    return res
+
+
+def get_increases(counts):
+    """Get the increases of the numbers of crashes by signature between consecutive days
+
+    For each signature, the result is (increase, last count, previous count, rate in %)
+    when the count increased from the previous day and (count, count, 0, inf) when
+    there's only one day. The signatures whose count didn't increase aren't in the result.
+
+    Args:
+        counts (dict): date -> signature -> count
+
+    Returns:
+        dict: signature -> (increase, last count, previous count, rate)
+    """
+    signatures = sorted(set(s for sgns in counts.values() for s in sgns.keys()))
+    if not signatures:
+        return {}
+
+    index = {s: i for i, s in enumerate(signatures)}
+    dates = sorted(counts.keys(), reverse=True)
+    numbers = np.zeros((len(dates), len(signatures)), dtype=np.int64)
+    for d, date in enumerate(dates):
+        for sgn, n in counts[date].items():
+            numbers[d, index[sgn]] = n
+
+    # from the last day to the first one
+    present = np.ones(len(signatures), dtype=bool)
+    diff = numbers[0].copy()
+    last = numbers[0].copy()
+    previous = np.zeros(len(signatures), dtype=np.int64)
+    for n in numbers[1:]:
+        increased = present & (diff > n)
+        new = ~present
+        last[increased] = diff[increased]
+        previous[increased] = n[increased]
+        diff[increased] -= n[increased]
+        diff[new] = last[new] = n[new]
+        previous[new] = 0
+        present = increased | new
+
+    infinity = float('+Inf')
+    res = {}
+    for i in np.flatnonzero(present):
+        d, n, p = int(diff[i]), int(last[i]), int(previous[i])
+        rate = int(round(100. * float(d) / float(p))) if p != 0 else infinity
+        res[signatures[i]] = (d, n, p, rate)
+
+    return res
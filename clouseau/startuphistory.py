@@ -0,0 +1,123 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import sqlite3
+import threading
+
+
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+
+def is_sqlite(path):
+    with open(path, 'rb') as In:
+        return In.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+
+def migrate(path):
+    """Import an old history in json (product -> channel -> date -> numbers)
+
+    The json file is kept in <path>.bak and replaced by the database.
+
+    Args:
+        path (str): the history path
+
+    Returns:
+        bool: True if the history has been imported
+    """
+    if not os.path.isfile(path) or is_sqlite(path):
+        return False
+
+    with open(path, 'r') as In:
+        data = json.load(In)
+    os.rename(path, path + '.bak')
+    StartupHistory(path).put(data)
+
+    return True
+
+
+def get_history(path):
+    """Get the history of the startup crashes
+
+    Args:
+        path (str): the database path
+
+    Returns:
+        StartupHistory: the history
+    """
+    if os.path.isfile(path) and not is_sqlite(path):
+        raise Exception('%s is an old history in json: import it with migrate (--migrate in monitor_startup_crashes)' % path)
+
+    return StartupHistory(path)
+
+
+class StartupHistory(object):
+    """The numbers of startup crashes by (product, channel, date)
+
+    Only the new days are written and the totals can be read without the details.
+    """
+
+    def __init__(self, path):
+        """Constructor
+
+        Args:
+            path (str): the database path
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS history (product TEXT, channel TEXT, date TEXT, total INTEGER, numbers TEXT, '
+                          'PRIMARY KEY (product, channel, date))')
+
+    def put(self, data):
+        """Put (insert or replace) some days
+
+        Args:
+            data (dict): product -> channel -> date (YYYY-MM-DD) -> numbers (with a total)
+        """
+        rows = [(product, chan, date, numbers['total'], json.dumps(numbers, sort_keys=True))
+                for product, i1 in data.items() for chan, i2 in i1.items() for date, numbers in i2.items()]
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany('INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?)', rows)
+            self.conn.execute('COMMIT')
+
+    def get(self, product, channel):
+        """Get the numbers for a product and a channel
+
+        Args:
+            product (str): the product
+            channel (str): the channel
+
+        Returns:
+            dict: date -> numbers
+        """
+        with self.lock:
+            rows = self.conn.execute('SELECT date, numbers FROM history WHERE product = ? AND channel = ?', (product, channel)).fetchall()
+        return {date: json.loads(numbers) for date, numbers in rows}
+
+    def get_totals(self, product, channel, end_date, days=0):
+        """Get the totals up to a date
+
+        Args:
+            product (str): the product
+            channel (str): the channel
+            end_date (str): the last date (YYYY-MM-DD)
+            days (Optional[int]): the max number of days (the last ones), 0 means all
+
+        Returns:
+            List[(str, int)]: the dates and the totals sorted by date
+        """
+        query = 'SELECT date, total FROM history WHERE product = ? AND channel = ? AND date <= ? ORDER BY date DESC'
+        params = (product, channel, end_date)
+        if days > 0:
+            query += ' LIMIT ?'
+            params += (days, )
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        rows.reverse()
+
+        return rows
@@ -10,6 +10,8 @@ import json
 import libmozdata.socorro as socorro
 import libmozdata.utils as utils
 from pprint import pprint
+from . import versioncatalog
+from . import transport
 
 
 def __super_search_handler(json, data):
@@ -48,9 +50,9 @@ def __rate(n, adi):
 def get(channel, versions=None, product='Firefox', start_date=None, end_date='today', duration=30, platforms=None):
     if not isinstance(versions, list):
         if isinstance(versions, numbers.Number):
-            versions = socorro.ProductVersions.get_active(vnumber=versions, product=product)
+            versions = versioncatalog.get_active(vnumber=versions, product=product)
         else:
-            versions = socorro.ProductVersions.get_active(product=product)
+            versions = versioncatalog.get_active(product=product)
         versions = versions[channel.lower()]
 
     if start_date:
@@ -107,6 +109,7 @@ def tojson(filename, channel, versions=None, product='Firefox', start_date=None,
 
 
 if __name__ == '__main__':
+    transport.install()
     parser = argparse.ArgumentParser(description='Crash Stats')
     parser.add_argument('-f', '--format', action='store', default='csv', help='format')
     parser.add_argument('-o', '--output', action='store', help='output file (csv)')
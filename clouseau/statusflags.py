@@ -5,21 +5,30 @@
 
 import argparse
 import re
+import copy
 import functools
+import numpy as np
 import logging
-from collections import defaultdict
-from tabulate import (tabulate, TableFormat, DataRow)
+import threading
+from datetime import datetime
+from collections import (defaultdict, OrderedDict)
 from dateutil.relativedelta import relativedelta
 from pprint import pprint
 import libmozdata.socorro as socorro
 import libmozdata.utils as utils
 from libmozdata.hgmozilla import Revision
 from libmozdata.bugzilla import Bugzilla
-import libmozdata.versions
-import libmozdata.dataanalysis as dataanalysis
 from libmozdata.connection import (Connection, Query)
-import libmozdata.gmail
 from . import config
+from .store import Store
+from .queryplanner import QueryPlanner
+from .scheduler import Scheduler
+from . import bugindex
+from . import lazy
+from .dupgraph import DupGraph
+from .trends import Trends
+from . import versioncatalog
+from . import transport
 
 
 channel_order = {'nightly': 0, 'aurora': 1, 'beta': 2, 'release': 3, 'esr': 4}
@@ -33,103 +42,197 @@ dll_pattern = re.compile('([^@]+)@0x[a-fA-F0-9]+')
 extra_pattern = re.compile('[0-9]+|\.|-')
 jsbugmon_pattern = re.compile('The first bad revision is:\nchangeset:[ \t]*([^\n]*)\nuser:[ \t]*[^\n]*\ndate:[ \t]*[^\n]*\nsummary:[ \t]*[^\n]*')
 hg_rev_pattern = re.compile('://hg.mozilla.org/(?:releases/)?mozilla-([^/]+)/rev/([0-9a-z]+)')
+ignored_frames = {'@0x0', 'F1398665248_____________________________', 'unknown', 'OOM', 'hang', 'small', '_purecall', 'je_free', 'large'}
 
 
-global_tablefmt = TableFormat(lineabove=None, linebelowheader=None,
-                              linebetweenrows=None, linebelow=None,
-                              headerrow=DataRow(' ', ' ', ''),
-                              datarow=DataRow(' ', ' ', ''),
-                              padding=0, with_header_hide=None)
-byweek_tablefmt = TableFormat(lineabove=None, linebelowheader=None,
-                              linebetweenrows=None, linebelow=None,
-                              headerrow=DataRow(' ', '', ''),
-                              datarow=DataRow(' ', '', ''),
-                              padding=0, with_header_hide=None)
-rank_tablefmt = TableFormat(lineabove=None, linebelowheader=None,
-                            linebetweenrows=None, linebelow=None,
-                            headerrow=DataRow(' ', ' ', ''),
-                            datarow=DataRow(' ', ' ', ''),
-                            padding=0, with_header_hide=None)
+# scipy, matplotlib and the google api client are only needed by some code paths
+dataanalysis = lazy.load('libmozdata.dataanalysis')
+gmail = lazy.load('libmozdata.gmail')
+tabulate = lazy.load('tabulate')
+# the horizontal and vertical separators of the volume tables
+TABLE_SEPARATORS = {'global': (' ', ' ', ''),
+                    'byweek': (' ', '', ''),
+                    'rank': (' ', ' ', '')}
+__tablefmts = {}
 
 
-__all_versions = None
+__history_store = None
+bots = {'automation@bmo.tld', 'release-mgmt-account-bot@mozilla.tld'}
+__simplified_signatures = OrderedDict()
+__simplified_lock = threading.Lock()
+SIMPLIFIED_CACHE_SIZE = 65536
+
+
+def __get_tablefmt(ty):
+    fmt = __tablefmts.get(ty)
+    if fmt is None:
+        row = tabulate.DataRow(*TABLE_SEPARATORS[ty])
+        fmt = tabulate.TableFormat(lineabove=None, linebelowheader=None,
+                                   linebetweenrows=None, linebelow=None,
+                                   headerrow=row, datarow=row,
+                                   padding=0, with_header_hide=None)
+        __tablefmts[ty] = fmt
+    return fmt
 
 
 def __mk_volume_table(table, ty, headers=(), **kwargs):
-    if ty == 'global':
-        return tabulate(table, headers=headers, tablefmt=global_tablefmt, **kwargs)
-    elif ty == 'byweek':
-        return tabulate(table, headers=headers, tablefmt=byweek_tablefmt, **kwargs)
-    elif ty == 'rank':
-        return tabulate(table, headers=headers, tablefmt=rank_tablefmt, **kwargs)
+    if ty in TABLE_SEPARATORS:
+        return tabulate.tabulate(table, headers=headers, tablefmt=__get_tablefmt(ty), **kwargs)
+
+
+def get_history_store():
+    global __history_store
+    if __history_store is None:
+        __history_store = Store('statusflags_history')
+    return __history_store
+
+
+def fold_history(summary, history):
+    """Update a bug summary with new entries of its history
+
+    Args:
+        summary (dict): the summary to update (None for a new one)
+        history (List[dict]): the history entries (chronologically ordered)
+
+    Returns:
+        dict: the updated summary
+    """
+    if summary is None:
+        summary = {'resolved': False,
+                   'incomplete': False,
+                   'fixed': False,
+                   'patched': False,
+                   'assigned': False,
+                   'last_change': None,
+                   'last_entry': None,
+                   'fixed_dates': [],
+                   'no_change_fields': set()}
+    else:
+        summary = copy.deepcopy(summary)
+
+    for changes in history:
+        when = utils.get_date_ymd(changes['when'])
+        summary['last_entry'] = when
+        if changes['who'] not in bots:
+            summary['last_change'] = when
+        for change in changes['changes']:
+            field_name = change.get('field_name', None)
+            if field_name == 'status':
+                if change.get('added', None) == 'RESOLVED':
+                    summary['resolved'] = True
+                elif change.get('removed', None) == 'RESOLVED':
+                    summary['resolved'] = False
+            elif field_name == 'resolution':
+                added = change.get('added', None)
+                removed = change.get('removed', None)
+                if added == 'FIXED':
+                    summary['fixed_dates'].append(when)
+                    summary['fixed'] = True
+                elif added == 'INCOMPLETE':
+                    summary['incomplete'] = True
+                if removed == 'FIXED':
+                    summary['fixed'] = False
+                elif removed == 'INCOMPLETE':
+                    summary['incomplete'] = False
+            elif field_name == 'flagtypes.name':
+                if not summary['patched'] and 'attachment_id' in change and 'added' in change:
+                    added = change['added']
+                    if added.startswith('review'):
+                        summary['patched'] = True
+            elif field_name == 'assigned_to':
+                summary['assigned'] = change.get('added', None) != 'nobody@mozilla.org'
+            elif field_name and field_name.startswith('cf_status_'):
+                if change.get('added', None) in ['unaffected', '---'] and change.get('removed', None) in ['affected', '?', '---']:
+                    summary['no_change_fields'].add(field_name)
+
+    return summary
+
+
+def get_bug_info(summary, status_flags):
+    """Get the bug info from a bug summary
+
+    Args:
+        summary (dict): the summary (see fold_history)
+        status_flags (dict): channel -> status flag
+
+    Returns:
+        dict: the bug info
+    """
+    last_change_date = summary['last_change']
+    if last_change_date is None:
+        last_change_date = summary['last_entry']
+
+    chan_to_not_change = set(chan for chan, flag in status_flags.items() if flag in summary['no_change_fields'])
+
+    return {'resolved': summary['resolved'],
+            'incomplete': summary['incomplete'],
+            'fixed': summary['fixed'],
+            'patched': summary['patched'],
+            'assigned': summary['assigned'],
+            'last_change': last_change_date,
+            'fixed_dates': list(summary['fixed_dates']),
+            'no_change': chan_to_not_change}
 
 
 def get_bugs_info(bugids, status_flags):
+    """Get info about the bugs from their history
+
+    If the history store is enabled, the summaries of the histories are stored
+    and only the history entries newer than the last run are retrieved.
+
+    Args:
+        bugids (List[str]): the bug ids
+        status_flags (dict): channel -> status flag
+
+    Returns:
+        dict: bug id -> bug info
+    """
     def history_handler(_history, data):
-        bots = {'automation@bmo.tld', 'release-mgmt-account-bot@mozilla.tld'}
         bugid = str(_history['id'])
         history = _history['history']
         if history:
-            last_change_date = utils.get_guttenberg_death()
-            has_patch = False
-            has_assignee = False
-            is_fixed = False
-            resolved = False
-            incomplete = False
-            fixed_dates = []
-            chan_to_not_change = set()
-            for changes in history:
-                if changes['who'] not in bots:
-                    last_change_date = utils.get_date_ymd(changes['when'])
-                for change in changes['changes']:
-                    field_name = change.get('field_name', None)
-                    if field_name == 'status':
-                        if change.get('added', None) == 'RESOLVED':
-                            resolved = True
-                        elif change.get('removed', None) == 'RESOLVED':
-                            resolved = False
-                    elif field_name == 'resolution':
-                        added = change.get('added', None)
-                        removed = change.get('removed', None)
-                        if added == 'FIXED':
-                            fixed_dates.append(utils.get_date_ymd(changes['when']))
-                            is_fixed = True
-                        elif added == 'INCOMPLETE':
-                            incomplete = True
-                        if removed == 'FIXED':
-                            is_fixed = False
-                        elif removed == 'INCOMPLETE':
-                            incomplete = False
-                    elif field_name == 'flagtypes.name':
-                        if not has_patch and 'attachment_id' in change and 'added' in change:
-                            added = change['added']
-                            if added.startswith('review'):
-                                has_patch = True
-                    elif field_name == 'assigned_to':
-                        has_assignee = change.get('added', None) != 'nobody@mozilla.org'
-                    elif field_name in status_flags.values():
-                        if change.get('added', None) in ['unaffected', '---'] and change.get('removed', None) in ['affected', '?', '---']:
-                            for k, v in status_flags.items():
-                                if v == field_name:
-                                    chan_to_not_change.add(k)
-                                    break
-
-            if last_change_date == utils.get_guttenberg_death():
-                last_change_date = utils.get_date_ymd(history[-1]['when'])
-
-            data['bugs'][bugid] = {'resolved': resolved,
-                                   'incomplete': incomplete,
-                                   'fixed': is_fixed,
-                                   'patched': has_patch,
-                                   'assigned': has_assignee,
-                                   'last_change': last_change_date,
-                                   'fixed_dates': fixed_dates,
-                                   'no_change': chan_to_not_change}
+            data['summaries'][bugid] = fold_history(None, history)
         else:
             data['no_history'].append(bugid)
 
-    data = {'no_history': [], 'bugs': {}}
-    Bugzilla(bugids=bugids, historyhandler=history_handler, historydata=data).wait()
+    def new_history_handler(json, data):
+        for _history in json.get('bugs', []):
+            bugid = str(_history['id'])
+            history = _history['history']
+            if history:
+                data['summaries'][bugid] = fold_history(data['summaries'][bugid], history)
+
+    store = get_history_store()
+    bugids = [str(bugid) for bugid in bugids]
+    # the changes made during this run will be retrieved again by the next one
+    now = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    stored = store.get_many(bugids)
+
+    data = {'no_history': [], 'summaries': {}}
+    for bugid, info in stored.items():
+        data['summaries'][bugid] = info['summary']
+    new_bugids = [bugid for bugid in bugids if bugid not in stored]
+
+    if new_bugids:
+        Bugzilla(bugids=new_bugids, historyhandler=history_handler, historydata=data).wait()
+
+    if stored:
+        bugids_by_since = defaultdict(lambda: list())
+        for bugid, info in stored.items():
+            bugids_by_since[info['since']].append(bugid)
+
+        queries = []
+        url = Bugzilla.API_URL + '/%s/history'
+        for since, _bugids in bugids_by_since.items():
+            for chunk in Connection.chunks(sorted(_bugids, key=lambda k: int(k))):
+                queries.append(Query(url % chunk[0],
+                                     {'ids': chunk[1:], 'new_since': since},
+                                     handler=new_history_handler, handlerdata=data))
+        Bugzilla(queries=queries).wait()
+
+    store.put_many({bugid: {'summary': summary, 'since': now} for bugid, summary in data['summaries'].items()})
+
+    bugs = {bugid: get_bug_info(summary, status_flags) for bugid, summary in data['summaries'].items()}
 
     if data['no_history']:
         def bug_handler(bug, data):
@@ -143,40 +246,53 @@ def get_bugs_info(bugids, status_flags):
                                     'fixed_dates': [],
                                     'no_change': set()}
 
-        Bugzilla(bugids=data['no_history'], include_fields=['id', 'last_change_time'], bughandler=bug_handler, bugdata=data['bugs']).wait()
+        Bugzilla(bugids=data['no_history'], include_fields=['id', 'last_change_time'], bughandler=bug_handler, bugdata=bugs).wait()
 
-    return data['bugs']
+    return bugs
 
 
-def __foo_at_address(signature):
-    # Simplify foo.dll@0x1234 to foo.dll
-    m = dll_pattern.match(signature)
+def __simplify_frame(frame):
+    frame = frame.strip(' \t')
+    if frame in ignored_frames:
+        return ''
+
+    # Simplify foo.dll@0x1234 to foo.dll (without numbers, dots and dashes)
+    m = dll_pattern.match(frame)
     if m:
-        lib = m.group(1)
+        frame = extra_pattern.sub('', m.group(1)).lower()
 
-        # we remove numbers, dot, dash
-        lib = extra_pattern.sub('', lib)
-        lib = lib.lower()
+    # Simplify foo<A>(T, U) or foo or foo<B>(V) ... to foo
+    frame = args_pattern.sub('', frame)
+    frame = template_pattern.sub('', frame)
 
-        return lib
-    else:
-        return signature
+    return frame.replace('const ', '').replace(' const', '')
 
 
-def __foo_args(signature):
-    # Simplify foo<A>(T, U) or foo or foo<B>(V) ... to foo
-    signature = args_pattern.sub('', signature)
-    signature = template_pattern.sub('', signature)
+def simplify_signature(signature):
+    """Simplify a signature to be able to compare it with other ones:
+    the meaningless frames are removed and the dll addresses, the arguments,
+    the templates and the const qualifiers are removed from the other ones.
 
-    return signature
+    Args:
+        signature (str): the signature
 
+    Returns:
+        str: the simplified signature (can be empty)
+    """
+    with __simplified_lock:
+        simplified = __simplified_signatures.pop(signature, None)
+        if simplified is not None:
+            __simplified_signatures[signature] = simplified
+            return simplified
 
-def __name(names, signature):
-    return '' if signature in names else signature
+    simplified = '|'.join(filter(None, map(__simplify_frame, signature.split('|'))))
 
+    with __simplified_lock:
+        __simplified_signatures[signature] = simplified
+        if len(__simplified_signatures) > SIMPLIFIED_CACHE_SIZE:
+            __simplified_signatures.popitem(last=False)
 
-def __const(signature):
-    return signature.replace('const ', '').replace(' const', '')
+    return simplified
 
 
 def __namespace(signature):
@@ -186,16 +302,9 @@ def __namespace(signature):
     return signature
 
 
-def __is_same_signatures(signatures, simplifiers):
+def __is_same_signatures(signatures):
     # Check of the signatures are the same
-    s = set()
-    for signature in filter(None, signatures):
-        signature = map(lambda s: s.strip(' \t'), signature.split('|'))
-        for simplifier in simplifiers:
-            signature = map(simplifier, signature)
-        signature = '|'.join(filter(None, signature))
-        if signature:
-            s.add(signature)
+    s = set(filter(None, map(simplify_signature, filter(None, signatures))))
 
     n = len(s)
     if n in [0, 1]:
@@ -230,18 +339,7 @@ def filter_bugs(bugids, product):
                 signatures = map(lambda s: s.strip(' \t\r\n'), signatures.split('[@'))
                 signatures = map(lambda s: s[:-1].strip(' \t\r\n'), filter(None, signatures))
 
-                if __is_same_signatures(signatures, [functools.partial(__name, ['@0x0',
-                                                                                'F1398665248_____________________________',
-                                                                                'unknown',
-                                                                                'OOM',
-                                                                                'hang',
-                                                                                'small',
-                                                                                '_purecall',
-                                                                                'je_free',
-                                                                                'large']),
-                                                     __foo_at_address,
-                                                     __foo_args,
-                                                     __const]):
+                if __is_same_signatures(signatures):
                     data.add(bug['id'])
                 else:
                     bad.append(signatures)
@@ -419,13 +517,7 @@ def analyze(signatures, status_flags, base_versions):
 
 
 def get_all_versions(product='Firefox'):
-    global __all_versions
-    if __all_versions is None:
-        __all_versions = {}
-    if product not in __all_versions:
-        __all_versions[product] = socorro.ProductVersions.get_all_versions(product=product)
-
-    return __all_versions[product]
+    return versioncatalog.get_all_versions(product=product)
 
 
 def get_jsbugmon_regression(comment, product='Firefox'):
@@ -532,19 +624,18 @@ def get_signatures(limit, product, versions, channel, search_date, signatures, b
                 if ss:
                     set_sgns = set_sgns.union(set(ss))
             signatures = list(set_sgns)
-        queries = []
-        for sgns in Connection.chunks(signatures, 10):
-            queries.append(Query(socorro.SuperSearch.URL,
-                                 {'signature': ['=' + s for s in sgns],
-                                  'product': product,
-                                  'version': all_versions,
-                                  'release_channel': channel,
-                                  'date': search_date,
-                                  '_aggs.signature': ['release_channel', 'platform'],
-                                  '_facets_size': max(limit, 100),
-                                  '_results_number': 0},
-                                 handler=handler_ss, handlerdata=__signatures))
-        socorro.SuperSearch(queries=queries).wait()
+        planner = QueryPlanner()
+        planner.add(signatures,
+                    {'product': product,
+                     'version': all_versions,
+                     'release_channel': channel,
+                     'date': search_date,
+                     '_aggs.signature': ['release_channel', 'platform'],
+                     '_facets_size': max(limit, 100),
+                     '_results_number': 0},
+                    handler_ss, __signatures)
+        socorro.SuperSearch(queries=planner.get_queries()).wait()
+        __warn('Signatures: %d queries (%d saved)' % (planner.count, planner.get_saved()), verbose)
     else:
         socorro.SuperSearch(params={'product': product,
                                     'version': all_versions,
@@ -631,12 +722,12 @@ def __prettywarn(obj, verbose=True):
         pprint(obj)
 
 
-def get_versions_info(product, date='today', base_versions=libmozdata.versions.get(base=True)):
+def get_versions_info(product, date='today', base_versions=None):
     if not date:
         date = 'today'
     if base_versions is None:
-        base_versions = libmozdata.versions.get(base=True)
-    versions_by_channel = socorro.ProductVersions.get_info_from_major(base_versions, product=product, active=None)
+        base_versions = versioncatalog.get_base_versions()
+    versions_by_channel = versioncatalog.get_info_from_major(base_versions, product=product, active=None)
     channel_by_version = {}
     vbc = {}
     start_date_by_channel = {}
@@ -663,7 +754,9 @@ def get_versions_info(product, date='today', base_versions=libmozdata.versions.g
     return start_date, min_date, vbc, start_date_by_channel, base_versions
 
 
-def get_search_date(search_start_date, start_date, end_date=utils.get_date('today')):
+def get_search_date(search_start_date, start_date, end_date=None):
+    if end_date is None:
+        end_date = utils.get_date('today')
     if search_start_date:
         return socorro.SuperSearch.get_search_date(search_start_date, end_date)
     else:
@@ -677,24 +770,12 @@ def reduce_set_of_bugs(bugs_by_signature):
     for v in bugs_by_signature.values():
         bugs = bugs.union(v)
 
-    dups = Bugzilla.follow_dup(bugs, only_final=False)
+    graph = DupGraph()
+    graph.load(bugs)
     bugs_count = 0
     bugs.clear()
     for s, bugids in bugs_by_signature.items():
-        _bugids = set(bugids)
-        toremove = set()
-        for bugid in bugids:
-            chain = dups[str(bugid)]
-            if chain:
-                elems = []
-                for e in chain:
-                    e = int(e)
-                    if e in _bugids:
-                        elems.append(e)
-                if elems:
-                    elems[-1] = bugid  # we remove the final and put the initial
-                    toremove = toremove.union(elems)
-        diff = _bugids - toremove
+        diff = graph.reduce(bugids)
         bugs_by_signature[s] = list(diff)
         bugs_count += len(diff)
         bugs = bugs.union(diff)
@@ -702,11 +783,9 @@ def reduce_set_of_bugs(bugs_by_signature):
     return bugs, bugs_count
 
 
-def get_stats_for_past_weeks(product, channel, start_date_by_channel, versions_by_channel, analysis, search_start_date, end_date, check_for_fx=True):
-    queries = []
-    trends = {}
-    signatures_by_chan = {}
-    default_trend_by_chan = {}
+def get_stats_for_past_weeks(product, channel, start_date_by_channel, versions_by_channel, analysis, search_start_date, end_date, check_for_fx=True, verbose=False):
+    planner = QueryPlanner()
+    weeks_by_chan = {}
     ref_monday, _ = utils.get_monday_sunday(utils.get_date_ymd(end_date))
 
     def get_past_week(date):
@@ -714,51 +793,35 @@ def get_stats_for_past_weeks(product, channel, start_date_by_channel, versions_b
         return (ref_monday - monday).days // 7
 
     for chan in channel:
-        past_w = get_past_week(start_date_by_channel[chan])
-        default_trend_by_chan[chan] = {i: 0 for i in range(past_w + 1)}
-
-    for signature, info in analysis.items():
-        if not check_for_fx or info['firefox']:
-            data = {}
-            trends[signature] = data
-            # for chan, volume in info['affected']:
-            for chan in channel:
-                if chan in signatures_by_chan:
-                    signatures_by_chan[chan].append(signature)
-                else:
-                    signatures_by_chan[chan] = [signature]
-                data[chan] = default_trend_by_chan[chan].copy()
+        weeks_by_chan[chan] = get_past_week(start_date_by_channel[chan]) + 1
+
+    signatures = [signature for signature, info in analysis.items() if not check_for_fx or info['firefox']]
+    trends = Trends(signatures, weeks_by_chan)
 
     def handler_ss(chan, json, data):
-        sgns = []
         for facets in json['facets']['histogram_date']:
             d = utils.get_date_ymd(facets['term'])
             w = get_past_week(d)
-            s = facets['facets']['signature']
-            for signature in s:
-                count = signature['count']
-                sgn = signature['term']
-                sgns.append(sgn)
-                data[sgn][chan][w] += count
-
-    for chan, signatures in signatures_by_chan.items():
+            for signature in facets['facets']['signature']:
+                data.add(signature['term'], chan, w, signature['count'])
+
+    handlers = {chan: functools.partial(handler_ss, chan) for chan in channel}
+    for chan in channel:
         if search_start_date:
             search_date = socorro.SuperSearch.get_search_date(search_start_date, end_date)
         else:
             search_date = socorro.SuperSearch.get_search_date(utils.get_date_str(start_date_by_channel[chan]), end_date)
 
-        vers = versions_by_channel[chan]
-        for sgns in Connection.chunks(signatures, 10):
-            queries.append(Query(socorro.SuperSearch.URL,
-                                 {'signature': ['=' + s for s in sgns],
-                                  'product': product,
-                                  'version': vers,
-                                  'release_channel': chan,
-                                  'date': search_date,
-                                  '_histogram.date': 'signature',
-                                  '_results_number': 0},
-                           handler=functools.partial(handler_ss, chan), handlerdata=trends))
-    socorro.SuperSearch(queries=queries).wait()
+        planner.add(signatures,
+                    {'product': product,
+                     'version': versions_by_channel[chan],
+                     'release_channel': chan,
+                     'date': search_date,
+                     '_histogram.date': 'signature',
+                     '_results_number': 0},
+                    handlers[chan], trends)
+    socorro.SuperSearch(queries=planner.get_queries()).wait()
+    __warn('Trends: %d queries (%d saved)' % (planner.count, planner.get_saved()), verbose)
 
     return trends
 
@@ -767,11 +830,29 @@ def get_dict_from_list(l):
     return {l[i]: int(l[i + 1]) for i in range(0, len(l), 2)}
 
 
+def __get_noisy_from_array(trends, analysis, thresholds):
+    # a signature isn't noisy when mean + stddev is above the threshold on one of its affected channels
+    not_noisy = np.zeros(len(trends), dtype=bool)
+    for chan in trends.channels:
+        if chan == 'esr':
+            continue
+        affected = np.array([any(c == chan for c, _ in analysis[sgn]['affected']) for sgn in trends.signatures], dtype=bool)
+        if not affected.any():
+            continue
+        m, e = trends.get_stats(chan)
+        not_noisy |= affected & (m + e > thresholds[chan])
+
+    return {sgn for sgn, nn in zip(trends.signatures, not_noisy) if not nn}
+
+
 def get_noisy(trends, analysis, thresholds=None):
     if not thresholds:
         default = ['nightly', '7', 'aurora', '10', 'beta', '10', 'release', '10', 'esr', '50']
         thresholds = get_dict_from_list(config.get('StatusFlags', 'thresholds', default=default, type=list))
 
+    if isinstance(trends, Trends):
+        return __get_noisy_from_array(trends, analysis, thresholds)
+
     noisy = set()
     for sgn, data in trends.items():
         isnoisy = True
@@ -810,8 +891,13 @@ def get(product='Firefox', limit=1000, verbose=False, search_start_date='', end_
     if product == 'Firefox':
         channel.append('esr')
 
-    start_date, min_date, versions_by_channel, start_date_by_channel, base_versions = get_versions_info(product, date=end_date, base_versions=base_versions)
-    nv = Bugzilla.get_nightly_version()
+    scheduler = Scheduler(verbose=verbose)
+    scheduler.add('versions', lambda: get_versions_info(product, date=end_date, base_versions=base_versions))
+    scheduler.add('nightly_version', Bugzilla.get_nightly_version)
+    res = scheduler.run()
+
+    start_date, min_date, versions_by_channel, start_date_by_channel, base_versions = res['versions']
+    nv = res['nightly_version']
 
     if check_bz_version and nv != base_versions['nightly']:
         __warn('Mismatch between nightly version from Bugzilla (%d) and Socorro (%d)' % (nv, base_versions['nightly']), verbose)
@@ -829,95 +915,131 @@ def get(product='Firefox', limit=1000, verbose=False, search_start_date='', end_
 
     search_date = get_search_date(search_start_date, start_date, end_date)
 
-    signatures = get_signatures(limit, product, versions_by_channel, channel, search_date, signatures, bug_ids, verbose)
-    # signatures == { 'foo::bar': {'affected_channels': [('release', 1234), ...],
-    #                              'bugs': None,
-    #                              'platforms': ['Windows'],
-    #                              'selected_bug': None}, ... }
-
-    __warn('Collected signatures: %d' % len(signatures), verbose)
-
-    # get the bugs for each signatures
-    bugs_by_signature = socorro.Bugs.get_bugs(list(signatures.keys()))
-
-    # if we've some bugs in bug_ids then we must remove the other ones for a given signature
-    if bug_ids:
-        bids = set(bug_ids)
-        for s, bugids in bugs_by_signature.items():
-            inter = bids.intersection(bugids)
-            if inter:
-                bugs_by_signature[s] = inter
-
-    __warn('Collected bugs in Socorro: Ok', verbose)
-
-    bugs, bugs_count = reduce_set_of_bugs(bugs_by_signature)
-
-    __warn('Remove duplicates: Ok', verbose)
-    __warn('Bugs to analyze: %d' % bugs_count, verbose)
-
-    # we filter the bugs to remove meaningless ones
-    if not bug_ids:
-        bugs = filter_bugs(bugs, product)
-
-    status_flags = Bugzilla.get_status_flags(base_versions=base_versions)
-
-    # we get the "better" bug where to update the info
-    bugs_history_info = get_bugs_info(bugs, status_flags)
-
-    patched_bugs = []
-    for bugid, hinfo in bugs_history_info.items():
-        if hinfo['patched']:
-            patched_bugs.append(bugid)
-
-    if patched_bugs:
-        patch_info = dataanalysis.analyze_bugs(patched_bugs, min_date=min_date, base_versions=base_versions)
-    else:
-        patch_info = {}
-
-    crashes_to_reopen = []
-    bugs.clear()
-    for s, v in bugs_by_signature.items():
-        info = signatures[s]
-        no_change = set()
-        if v:
-            bug_to_touch = get_last_bug(v, s, signatures[s], patch_info, bugs_history_info, min_date)
-            if bug_to_touch:
-                no_change = bugs_history_info[bug_to_touch]['no_change']
+    # The phases below are run as soon as their inputs are available:
+    #   signatures -> socorro_bugs -> dups -> filtered_bugs -> history -> patches -> selected_bugs -> analysis
+    #   status_flags -> history, analysis
+    #   signatures -> trends
+    #   positions
+    # so the trends and the crash positions are retrieved while the bugs are analyzed.
+
+    def get_sgns():
+        sgns = get_signatures(limit, product, versions_by_channel, channel, search_date, signatures, bug_ids, verbose)
+        # sgns == { 'foo::bar': {'affected_channels': [('release', 1234), ...],
+        #                        'bugs': None,
+        #                        'platforms': ['Windows'],
+        #                        'selected_bug': None}, ... }
+        __warn('Collected signatures: %d' % len(sgns), verbose)
+        return sgns
+
+    def get_positions():
+        positions_result, positions = get_crash_positions(-1, product, versions_by_channel, channel, search_date=search_date, verbose=verbose)
+        positions_result.wait()
+        return positions
+
+    def get_status_flags():
+        return Bugzilla.get_status_flags(base_versions=base_versions)
+
+    def get_socorro_bugs(sgns):
+        # get the bugs for each signatures
+        bugs_by_signature = bugindex.get_bugs(list(sgns.keys()))
+
+        # if we've some bugs in bug_ids then we must remove the other ones for a given signature
+        if bug_ids:
+            bids = set(bug_ids)
+            for s, bugids in bugs_by_signature.items():
+                inter = bids.intersection(bugids)
+                if inter:
+                    bugs_by_signature[s] = inter
+
+        __warn('Collected bugs in Socorro: Ok', verbose)
+        return bugs_by_signature
+
+    def remove_dups(bugs_by_signature):
+        # the bugs of the signatures without their duplicates
+        bugs_by_signature = dict(bugs_by_signature)
+        _, bugs_count = reduce_set_of_bugs(bugs_by_signature)
+        __warn('Remove duplicates: Ok', verbose)
+        __warn('Bugs to analyze: %d' % bugs_count, verbose)
+        return bugs_by_signature
+
+    def filter_meaningless(bugs_by_signature):
+        # we filter the bugs to remove meaningless ones
+        bugs = set()
+        for v in bugs_by_signature.values():
+            bugs.update(v)
+        return bugs if bug_ids else filter_bugs(bugs, product)
+
+    def get_patch_info(bugs_history_info):
+        patched_bugs = [bugid for bugid, hinfo in bugs_history_info.items() if hinfo['patched']]
+        if patched_bugs:
+            return dataanalysis.analyze_bugs(patched_bugs, min_date=min_date, base_versions=base_versions)
+        return {}
+
+    def select_bugs(sgns, bugs_by_signature, bugs_history_info, patch_info):
+        bugs = set()
+        for s, v in bugs_by_signature.items():
+            info = sgns[s]
+            no_change = set()
+            if v:
+                bug_to_touch = get_last_bug(v, s, sgns[s], patch_info, bugs_history_info, min_date)
+                if bug_to_touch:
+                    no_change = bugs_history_info[bug_to_touch]['no_change']
             else:
-                crashes_to_reopen.append(s)
-        else:
-            bug_to_touch = None
-        info['selected_bug'] = bug_to_touch
-        info['bugs'] = v
-        info['no_change'] = no_change
-        if bug_to_touch:
-            bugs.add(bug_to_touch)
-
-    __warn('Collected last bugs: %d' % len(bugs), verbose)
-
-    # add bug info in signatures
-    add_bug_info(signatures, list(bugs), status_flags, product, verbose)
-
-    # analyze the signatures
-    analysis = analyze(signatures, status_flags, base_versions)
-
-    if max_bugs > 0:
-        __analysis = {}
-        count = 0
-        for signature, info in analysis.items():
-            if not check_for_fx or info['firefox']:
-                __analysis[signature] = info
-                count += 1
-                if count == max_bugs:
-                    analysis = __analysis
-                    break
-
-    __warn('Analysis: Ok', verbose)
-
-    positions_result, positions = get_crash_positions(-1, product, versions_by_channel, channel, search_date=search_date, verbose=verbose)
+                bug_to_touch = None
+            info['selected_bug'] = bug_to_touch
+            info['bugs'] = v
+            info['no_change'] = no_change
+            if bug_to_touch:
+                bugs.add(bug_to_touch)
+
+        __warn('Collected last bugs: %d' % len(bugs), verbose)
+        return bugs
+
+    def get_analysis(sgns, bugs, status_flags):
+        # add bug info in signatures
+        add_bug_info(sgns, list(bugs), status_flags, product, verbose)
+
+        # analyze the signatures
+        analysis = analyze(sgns, status_flags, base_versions)
+
+        if max_bugs > 0:
+            __analysis = {}
+            count = 0
+            for signature, info in analysis.items():
+                if not check_for_fx or info['firefox']:
+                    __analysis[signature] = info
+                    count += 1
+                    if count == max_bugs:
+                        analysis = __analysis
+                        break
 
-    # Now get the number of crashes for each signature
-    trends = get_stats_for_past_weeks(product, channel, start_date_by_channel, versions_by_channel, analysis, search_start_date, end_date, check_for_fx=check_for_fx)
+        __warn('Analysis: Ok', verbose)
+        return analysis
+
+    def get_trends(sgns):
+        # the analysis isn't known yet, so the trends of all the signatures are retrieved
+        # while the bugs are analyzed, and the ones of the analyzed signatures are kept
+        all_sgns = {s: {'firefox': True} for s in sgns}
+        return get_stats_for_past_weeks(product, channel, start_date_by_channel, versions_by_channel, all_sgns, search_start_date, end_date, check_for_fx=False, verbose=verbose)
+
+    scheduler = Scheduler(verbose=verbose)
+    scheduler.add('signatures', get_sgns)
+    scheduler.add('positions', get_positions)
+    scheduler.add('status_flags', get_status_flags)
+    scheduler.add('socorro_bugs', get_socorro_bugs, ['signatures'])
+    scheduler.add('trends', get_trends, ['signatures'])
+    scheduler.add('dups', remove_dups, ['socorro_bugs'])
+    scheduler.add('filtered_bugs', filter_meaningless, ['dups'])
+    scheduler.add('history', get_bugs_info, ['filtered_bugs', 'status_flags'])
+    scheduler.add('patches', get_patch_info, ['history'])
+    scheduler.add('selected_bugs', select_bugs, ['signatures', 'dups', 'history', 'patches'])
+    scheduler.add('analysis', get_analysis, ['signatures', 'selected_bugs', 'status_flags'])
+    res = scheduler.run()
+
+    status_flags = res['status_flags']
+    analysis = res['analysis']
+    positions = res['positions']
+    trends = res['trends'].select([s for s, info in analysis.items() if not check_for_fx or info['firefox']])
 
     if check_noisy:
         noisy = get_noisy(trends, analysis)
@@ -927,20 +1049,17 @@ def get(product='Firefox', limit=1000, verbose=False, search_start_date='', end_
 
     __warn('Collected trends: Ok\n', verbose)
 
-    positions_result.wait()
-
     # replace dictionary containing trends by a list
     empty_ranks = {'browser': -1, 'content': -1, 'plugin': -1, 'gpu': -1}
-    for signature, i in trends.items():
+    for signature in trends:
         if signature in noisy:
             del analysis[signature]
         else:
             signature_info = analysis[signature]
             ranks = signature_info['rank']
-            for chan, trend in i.items():
-                i[chan] = [trend[week] for week in sorted(trend.keys(), reverse=False)]
+            for chan in trends.channels:
                 ranks[chan] = positions[chan].get(signature, empty_ranks)
-            signature_info['trend'] = i
+            signature_info['trend'] = trends.get_trends(signature)
 
     __prettywarn(analysis, verbose)
 
@@ -1070,6 +1189,7 @@ def update_status_flags(info, update=False, verbose=False):
 
 
 if __name__ == "__main__":
+    transport.install()
     parser = argparse.ArgumentParser(description='Update status flags in Bugzilla')
     parser.add_argument('-p', '--product', action='store', default='Firefox', help='the product')
     parser.add_argument('-l', '--limit', action='store', default=1000, type=int, help='the max number of signatures to get')
@@ -1100,4 +1220,4 @@ if __name__ == "__main__":
         if args.nag_dev:
             with open(args.log, 'r') as f:
                 data = f.read()
-                libmozdata.gmail.send(args.nag_dev, 'Error in statusflags.py', data)
+                gmail.send(args.nag_dev, 'Error in statusflags.py', data)
@@ -0,0 +1,201 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from . import config
+
+
+def get_path(name):
+    """Get the path of the database used by a store
+
+    Args:
+        name (str): the store name
+
+    Returns:
+        str: the path or '' if no cache directory is configured
+    """
+    path = config.get('Cache', 'path', '')
+    if not path:
+        return ''
+
+    path = os.path.expanduser(os.path.expandvars(path))
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    return os.path.join(path, name + '.sqlite')
+
+
+class Store(object):
+    """A persistent key/value store backed by sqlite
+
+    The values are pickled and compressed. If max_size is positive then the least
+    recently used entries are evicted to keep the store under max_size bytes.
+    When there is no path, the store is disabled: nothing is found and nothing is put.
+    """
+
+    def __init__(self, name, path=None, max_size=0):
+        """Constructor
+
+        Args:
+            name (str): the store name
+            path (Optional[str]): the database path, by default it's computed from the config
+            max_size (Optional[int]): the max size in bytes of the store (0 means no limit)
+        """
+        self.name = name
+        self.path = get_path(name) if path is None else path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.conn = None
+        self.size = 0
+        if self.path:
+            self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS store (key TEXT PRIMARY KEY, value BLOB, size INTEGER, mtime REAL, atime REAL)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS store_atime ON store (atime)')
+            self.size = self.__get_size()
+
+    def is_enabled(self):
+        return self.conn is not None
+
+    def __get_size(self):
+        return self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM store').fetchone()[0]
+
+    @staticmethod
+    def __dumps(value):
+        return zlib.compress(pickle.dumps(value, protocol=2))
+
+    @staticmethod
+    def __loads(value):
+        return pickle.loads(zlib.decompress(value))
+
+    def get(self, key, default=None, max_age=0):
+        """Get a value
+
+        Args:
+            key (str): the key
+            default (Optional): the value to return when the key is not in the store
+            max_age (Optional[int]): if positive, the entries older than max_age seconds are ignored
+
+        Returns:
+            the value
+        """
+        return self.get_many([key], max_age=max_age).get(key, default)
+
+    def get_many(self, keys, max_age=0):
+        """Get several values
+
+        Args:
+            keys (List[str]): the keys
+            max_age (Optional[int]): if positive, the entries older than max_age seconds are ignored
+
+        Returns:
+            dict: key -> value for the keys in the store
+        """
+        return {key: value for key, (mtime, value) in self.get_entries(keys, max_age=max_age).items()}
+
+    def get_entries(self, keys, max_age=0):
+        """Get several values with the time when they were put
+
+        Args:
+            keys (List[str]): the keys
+            max_age (Optional[int]): if positive, the entries older than max_age seconds are ignored
+
+        Returns:
+            dict: key -> (mtime, value) for the keys in the store
+        """
+        res = {}
+        if not self.conn:
+            return res
+
+        now = time.time()
+        keys = list(keys)
+        with self.lock:
+            for chunk in [keys[i:(i + 500)] for i in range(0, len(keys), 500)]:
+                query = 'SELECT key, value, mtime FROM store WHERE key IN (%s)' % ','.join('?' * len(chunk))
+                for key, value, mtime in self.conn.execute(query, chunk):
+                    if max_age <= 0 or now - mtime <= max_age:
+                        res[key] = (mtime, Store.__loads(value))
+
+            if res and self.max_size > 0:
+                found = list(res.keys())
+                for chunk in [found[i:(i + 500)] for i in range(0, len(found), 500)]:
+                    self.conn.execute('UPDATE store SET atime = ? WHERE key IN (%s)' % ','.join('?' * len(chunk)), [now] + chunk)
+
+        return res
+
+    def put(self, key, value):
+        """Put a value
+
+        Args:
+            key (str): the key
+            value: the value (must be picklable)
+        """
+        self.put_many({key: value})
+
+    def put_many(self, items):
+        """Put several values
+
+        Args:
+            items (dict): key -> value
+        """
+        if not self.conn or not items:
+            return
+
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            value = Store.__dumps(value)
+            rows.append((key, sqlite3.Binary(value), len(value), now, now))
+
+        with self.lock:
+            self.conn.execute('BEGIN')
+            self.conn.executemany('INSERT OR REPLACE INTO store VALUES (?, ?, ?, ?, ?)', rows)
+            self.conn.execute('COMMIT')
+            self.size += sum(r[2] for r in rows)
+            if self.max_size > 0 and self.size > self.max_size:
+                self.__evict()
+
+    def delete(self, key):
+        """Delete a value
+
+        Args:
+            key (str): the key
+        """
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        """Delete several values
+
+        Args:
+            keys (List[str]): the keys
+        """
+        if self.conn and keys:
+            with self.lock:
+                self.conn.execute('BEGIN')
+                self.conn.executemany('DELETE FROM store WHERE key = ?', [(key, ) for key in keys])
+                self.conn.execute('COMMIT')
+                self.size = self.__get_size()
+
+    def __evict(self):
+        # the size is approximated between two evictions (replaced entries, other processes)
+        self.size = self.__get_size()
+        if self.size <= self.max_size:
+            return
+
+        to_free = self.size - self.max_size
+        to_delete = []
+        for key, size in self.conn.execute('SELECT key, size FROM store ORDER BY atime'):
+            to_delete.append((key, ))
+            to_free -= size
+            if to_free <= 0:
+                break
+
+        self.conn.execute('BEGIN')
+        self.conn.executemany('DELETE FROM store WHERE key = ?', to_delete)
+        self.conn.execute('COMMIT')
+        self.size = self.__get_size()
@@ -0,0 +1,337 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from collections import deque
+import logging
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+from . import config
+from .metrics import percentile
+
+
+# Too many requests, and the server errors which are often transient
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# the methods which can be sent again after a connection error
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+# number of latencies kept by host to compute the percentiles
+WINDOW = 4096
+__transport = None
+__transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Get the transport shared by all the tools
+
+    Returns:
+        Transport: the transport
+    """
+    global __transport
+    with __transport_lock:
+        if __transport is None:
+            __transport = Transport()
+        return __transport
+
+
+def set_transport(transport):
+    global __transport
+    with __transport_lock:
+        __transport = transport
+
+
+def install():
+    """Send the requests of the libmozdata connections through the shared transport
+
+    A libmozdata Connection mounts a new HTTPAdapter on its own session, so the
+    adapter class used by libmozdata is replaced by one delegating to the transport
+    (the retry policy given by libmozdata is kept).
+    It's called by the command line tools and by the server, unless libmozdata
+    is set to 0 in the section Transport of the config.
+
+    Returns:
+        bool: True if the adapter has been replaced
+    """
+    if not config.get('Transport', 'libmozdata', 1, type=int):
+        return False
+
+    import libmozdata.connection
+    libmozdata.connection.HTTPAdapter = TransportAdapter
+    return True
+
+
+def get_host(url):
+    return urlparse(url).netloc
+
+
+class TokenBucket(object):
+    """A token bucket to limit the number of requests by second
+
+    The bucket contains at most `capacity` tokens and is refilled at `rate` tokens
+    by second. Each request takes a token and waits until there's one.
+    """
+
+    def __init__(self, rate, capacity=1):
+        """Constructor
+
+        Args:
+            rate (float): the number of tokens by second, 0 means no limit
+            capacity (Optional[int]): the max number of tokens (the burst size)
+        """
+        self.rate = float(rate)
+        self.capacity = float(max(capacity, 1))
+        self.tokens = self.capacity
+        self.last = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, wait for it if needed
+
+        Returns:
+            float: the time waited in seconds
+        """
+        if self.rate <= 0:
+            return 0.
+
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            # the token is reserved now, so the waiting threads are served in order
+            self.tokens -= 1.
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+
+class HostStats(object):
+    """The counters of the requests sent to a host"""
+
+    def __init__(self, window=WINDOW):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.throttled = 0.
+        self.latency = 0.
+        self.latencies = deque(maxlen=window)
+
+    def add(self, latency, sent=0, received=0, error=False):
+        with self.lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.bytes_sent += sent
+            self.bytes_received += received
+            self.latency += latency
+            self.latencies.append(latency)
+
+    def add_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def add_throttled(self, wait):
+        with self.lock:
+            self.throttled += wait
+
+    def get(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            res = {'requests': self.requests,
+                   'errors': self.errors,
+                   'retries': self.retries,
+                   'bytes_sent': self.bytes_sent,
+                   'bytes_received': self.bytes_received,
+                   'throttled': round(self.throttled, 3),
+                   'latency': round(self.latency, 3)}
+        for p in [50, 90, 99]:
+            v = percentile(latencies, p)
+            res['p%d' % p] = round(1000. * v, 3) if v is not None else None
+
+        return res
+
+
+class TransportAdapter(HTTPAdapter):
+    """An adapter sending the requests through a transport"""
+
+    def __init__(self, transport=None, **kwargs):
+        # the retries are made by the transport according to the policy of the caller if any
+        self.retry = kwargs.pop('max_retries', None)
+        super(TransportAdapter, self).__init__(**kwargs)
+        self.transport = transport
+
+    def send(self, request, **kwargs):
+        transport = self.transport or get_transport()
+        return transport.send(request, retry=self.retry, **kwargs)
+
+
+class Transport(object):
+    """The http transport shared by the tools
+
+    By host, the connections are pooled and kept alive, the number of requests in
+    progress and the number of requests by second are limited, and the requests
+    failing with a 429 or a 5xx are retried after an exponential backoff with jitter.
+
+    The limits are set in the section Transport of the config: concurrency and rate
+    for all the hosts, concurrency_<host> and rate_<host> for a given host.
+    """
+
+    def __init__(self, concurrency=None, rate=None, burst=None, retries=None, backoff=None, max_backoff=None):
+        """Constructor
+
+        Args:
+            concurrency (Optional[int]): the default max number of requests in progress by host
+            rate (Optional[float]): the default max number of requests by second by host, 0 means no limit
+            burst (Optional[int]): the number of requests which can be sent at once before being limited by the rate
+            retries (Optional[int]): the max number of retries of a request
+            backoff (Optional[float]): the base delay in seconds before a retry
+            max_backoff (Optional[float]): the max delay in seconds before a retry
+        """
+        self.concurrency = concurrency if concurrency is not None else config.get('Transport', 'concurrency', 8, type=int)
+        self.rate = rate if rate is not None else config.get('Transport', 'rate', 0, type=float)
+        self.burst = burst if burst is not None else config.get('Transport', 'burst', 1, type=int)
+        self.retries = retries if retries is not None else config.get('Transport', 'retries', 8, type=int)
+        self.backoff = backoff if backoff is not None else config.get('Transport', 'backoff', 0.5, type=float)
+        self.max_backoff = max_backoff if max_backoff is not None else config.get('Transport', 'max_backoff', 60, type=float)
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.session = requests.Session()
+        adapter = TransportAdapter(self)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get_host_limits(self, host):
+        """Get the concurrency and the rate for a host
+
+        Args:
+            host (str): the host
+
+        Returns:
+            (int, float): the concurrency and the rate
+        """
+        concurrency = config.get('Transport', 'concurrency_' + host, self.concurrency, type=int)
+        rate = config.get('Transport', 'rate_' + host, self.rate, type=float)
+        return max(concurrency, 1), rate
+
+    def __get_host(self, host):
+        with self.lock:
+            h = self.hosts.get(host)
+            if h is None:
+                concurrency, rate = self.get_host_limits(host)
+                h = {'adapter': HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=0),
+                     'semaphore': threading.BoundedSemaphore(concurrency),
+                     'bucket': TokenBucket(rate, self.burst),
+                     'stats': HostStats()}
+                self.hosts[host] = h
+            return h
+
+    def get_policy(self, retry=None):
+        """Get the retry policy
+
+        Args:
+            retry (Optional[Retry]): the policy of the caller (e.g. the one of a libmozdata Connection)
+
+        Returns:
+            (int, set, float): the max number of retries, the statuses to retry and the base delay
+        """
+        if retry is None:
+            return self.retries, RETRY_STATUSES, self.backoff
+        if not isinstance(retry, Retry):
+            retry = Retry.from_int(retry)
+        total = retry.total if isinstance(retry.total, int) and not isinstance(retry.total, bool) else 0
+        return max(total, 0), set(retry.status_forcelist or ()), retry.backoff_factor
+
+    def get_delay(self, attempt, response=None, backoff=None):
+        """Get the delay before a retry: a random one in [0, backoff * 2^attempt] or the one asked by the server
+
+        Args:
+            attempt (int): the number of the attempt (from 0)
+            response (Optional[requests.Response]): the failed response
+            backoff (Optional[float]): the base delay, the one of the transport by default
+
+        Returns:
+            float: the delay in seconds
+        """
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+        backoff = self.backoff if backoff is None else backoff
+        return random.uniform(0, min(self.max_backoff, backoff * (2 ** attempt)))
+
+    def send(self, request, retry=None, **kwargs):
+        """Send a prepared request
+
+        Args:
+            request (requests.PreparedRequest): the request
+            retry (Optional[Retry]): the retry policy, the one of the transport by default
+
+        Returns:
+            requests.Response: the response
+        """
+        host = get_host(request.url)
+        h = self.__get_host(host)
+        stats = h['stats']
+        stream = kwargs.get('stream', False)
+        # the connections are kept alive in the pool
+        if request.headers.get('Connection', '').lower() == 'close':
+            del request.headers['Connection']
+        sent = len(request.body or b'')
+        retries, statuses, backoff = self.get_policy(retry)
+
+        for attempt in range(retries + 1):
+            last = attempt == retries
+            response = None
+            with h['semaphore']:
+                stats.add_throttled(h['bucket'].acquire())
+                start = time.time()
+                try:
+                    response = h['adapter'].send(request, **kwargs)
+                    if stream:
+                        received = int(response.headers.get('Content-Length', 0) or 0)
+                    else:
+                        received = len(response.content)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    stats.add(time.time() - start, sent=sent, error=True)
+                    if last or request.method not in IDEMPOTENT_METHODS:
+                        raise
+                    logging.debug('Connection error with %s: retry' % request.url)
+
+            if response is not None:
+                stats.add(time.time() - start, sent=sent, received=received, error=response.status_code in RETRY_STATUSES)
+                # a request which isn't idempotent is sent again only when the server didn't handle it
+                again = response.status_code in statuses and (request.method in IDEMPOTENT_METHODS or response.status_code == 429)
+                if not again or last:
+                    return response
+                logging.debug('Status %d for %s: retry' % (response.status_code, request.url))
+                response.close()
+
+            stats.add_retry()
+            time.sleep(self.get_delay(attempt, response, backoff))
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def get_stats(self):
+        """Get the counters by host
+
+        Returns:
+            dict: host -> {requests, errors, retries, bytes_sent, bytes_received, throttled (s), latency (s), p50, p90, p99 (ms)}
+        """
+        with self.lock:
+            hosts = list(self.hosts.items())
+        return {host: h['stats'].get() for host, h in hosts}
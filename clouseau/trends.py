@@ -0,0 +1,111 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import numpy as np
+
+
+class Trends(object):
+    """The weekly numbers of crashes for each signature and channel
+
+    The numbers are stored in an array signatures x channels x weeks where the
+    week 0 is the most recent one. The channels can have different numbers of
+    weeks, so the extra weeks are padded with zeros.
+    For compatibility, trends[signature][channel][week] works like with a dict.
+    """
+
+    def __init__(self, signatures, weeks_by_chan, data=None):
+        """Constructor
+
+        Args:
+            signatures (List[str]): the signatures
+            weeks_by_chan (dict): channel -> number of weeks
+            data (Optional[numpy.ndarray]): the numbers of crashes
+        """
+        self.signatures = list(signatures)
+        self.index = {s: i for i, s in enumerate(self.signatures)}
+        self.channels = list(weeks_by_chan.keys())
+        self.chan_index = {c: i for i, c in enumerate(self.channels)}
+        self.weeks_by_chan = dict(weeks_by_chan)
+        if data is None:
+            max_weeks = max(self.weeks_by_chan.values()) if self.weeks_by_chan else 0
+            data = np.zeros((len(self.signatures), len(self.channels), max_weeks), dtype=np.int64)
+        self.data = data
+
+    def add(self, signature, chan, week, count):
+        """Add crashes
+
+        Args:
+            signature (str): the signature
+            chan (str): the channel
+            week (int): the week number (0 is the most recent one)
+            count (int): the number of crashes
+        """
+        if signature in self.index and 0 <= week < self.weeks_by_chan[chan]:
+            self.data[self.index[signature], self.chan_index[chan], week] += count
+
+    def get_trend(self, signature, chan):
+        """Get the numbers of crashes for a signature on a channel
+
+        Args:
+            signature (str): the signature
+            chan (str): the channel
+
+        Returns:
+            List[int]: the numbers of crashes from the most recent week to the oldest
+        """
+        return self.data[self.index[signature], self.chan_index[chan], :self.weeks_by_chan[chan]].tolist()
+
+    def get_trends(self, signature):
+        """Get the numbers of crashes for a signature on each channel
+
+        Args:
+            signature (str): the signature
+
+        Returns:
+            dict: channel -> list of numbers of crashes (see get_trend)
+        """
+        return {chan: self.get_trend(signature, chan) for chan in self.channels}
+
+    def select(self, signatures):
+        """Get the trends for a subset of signatures
+
+        Args:
+            signatures (List[str]): the signatures
+
+        Returns:
+            Trends: the trends of the signatures
+        """
+        signatures = [s for s in signatures if s in self.index]
+        data = self.data[[self.index[s] for s in signatures]] if signatures else self.data[:0]
+        return Trends(signatures, self.weeks_by_chan, data=data)
+
+    def get_stats(self, chan):
+        """Get the mean and the standard deviation of the numbers of crashes for each signature
+
+        Args:
+            chan (str): the channel
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): the means and the standard deviations
+        """
+        x = self.data[:, self.chan_index[chan], :self.weeks_by_chan[chan]].astype(np.float64)
+        return x.mean(axis=1), x.std(axis=1)
+
+    def __getitem__(self, signature):
+        return {chan: dict(enumerate(trend)) for chan, trend in self.get_trends(signature).items()}
+
+    def __contains__(self, signature):
+        return signature in self.index
+
+    def __iter__(self):
+        return iter(self.signatures)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def keys(self):
+        return list(self.signatures)
+
+    def items(self):
+        return [(s, self[s]) for s in self.signatures]
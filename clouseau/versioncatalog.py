@@ -0,0 +1,144 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import copy
+import threading
+import time
+import libmozdata.socorro as socorro
+import libmozdata.versions
+from . import config
+from .store import Store
+
+
+__store = None
+__memo = {}
+__memo_lock = threading.Lock()
+
+
+def get_store():
+    """Get the store containing the versions
+
+    Returns:
+        Store: the store
+    """
+    global __store
+    if __store is None:
+        __store = Store('versions')
+    return __store
+
+
+def set_store(store):
+    global __store
+    __store = store
+
+
+def get_ttl():
+    return config.get('Cache', 'versions_ttl', 3600, type=int)
+
+
+def clear():
+    with __memo_lock:
+        __memo.clear()
+
+
+def __get(key, function):
+    """Get a value from the memory, the store or the function
+
+    The value is copied, so the callers can modify it.
+
+    Args:
+        key (str): the key
+        function (function): the function to get the value
+
+    Returns:
+        the value
+    """
+    ttl = get_ttl()
+    now = time.time()
+    with __memo_lock:
+        entry = __memo.get(key)
+    if entry is not None and now - entry[0] <= ttl:
+        return copy.deepcopy(entry[1])
+
+    # a stored value is kept in memory until its own ttl expires
+    store = get_store()
+    entry = store.get_entries([key], max_age=ttl).get(key)
+    if entry is None:
+        value = function()
+        store.put(key, value)
+        entry = (now, value)
+    else:
+        value = entry[1]
+
+    with __memo_lock:
+        __memo[key] = entry
+
+    return copy.deepcopy(value)
+
+
+def get_base_versions():
+    """Get the current major version by channel
+
+    Returns:
+        dict: channel -> major version
+    """
+    return __get('base', lambda: libmozdata.versions.get(base=True))
+
+
+def get_all_versions(product='Firefox'):
+    """Get all the versions of a product (see ProductVersions.get_all_versions)
+
+    Args:
+        product (Optional[str]): the product
+
+    Returns:
+        dict: channel -> major -> info
+    """
+    return __get('all|%s' % product, lambda: socorro.ProductVersions.get_all_versions(product=product))
+
+
+def get_info_from_major(major_numbers, product='Firefox', active=True):
+    """Get the versions for major versions (see ProductVersions.get_info_from_major)
+
+    Args:
+        major_numbers (dict): channel -> major version
+        product (Optional[str]): the product
+        active (Optional[bool]): True for the active versions, None for all
+
+    Returns:
+        dict: channel -> versions info
+    """
+    majors = ','.join('%s:%s' % (c, v) for c, v in sorted(major_numbers.items()))
+    key = 'major|%s|%s|%s' % (product, active, majors)
+    return __get(key, lambda: socorro.ProductVersions.get_info_from_major(major_numbers, product=product, active=active))
+
+
+def get_active(product='Firefox', vnumber=None):
+    """Get the active versions by channel (see ProductVersions.get_active)
+
+    Args:
+        product (Optional[str]): the product
+        vnumber (Optional[int]): the major version
+
+    Returns:
+        dict: channel -> versions
+    """
+    key = 'active|%s|%s' % (product, vnumber)
+    return __get(key, lambda: socorro.ProductVersions.get_active(vnumber=vnumber, product=product))
+
+
+def get_version_info(versions, channel='', product='Firefox'):
+    """Get the info (dates and throttle) of versions (see ProductVersions.get_version_info)
+
+    Args:
+        versions (List[str]): the versions (or major versions), all the active ones if empty
+            (a version or None is wrapped in a list as libmozdata does)
+        channel (Optional[str]): the channel
+        product (Optional[str]): the product
+
+    Returns:
+        dict: version -> info
+    """
+    key = 'info|%s|%s|%s' % (product, channel, str(versions))
+    return __get(key, lambda: socorro.ProductVersions.get_version_info(versions, channel=channel, product=product))
@@ -1,6 +1,101 @@
+import argparse
 import os
+import shutil
 import sys
+import tempfile
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from clouseau import config  # NOQA
+from clouseau import rest  # NOQA
+from clouseau import transport  # NOQA
 from clouseau.rest import app as application  # NOQA
+
+# the entry point of the WSGI servers (e.g. gunicorn clouseau.wsgi:application)
+transport.install()
+
+
+def get_workers():
+    return config.get('Rest', 'workers', 4, type=int)
+
+
+def get_bind():
+    return config.get('Rest', 'bind', '127.0.0.1:5000')
+
+
+def run_gunicorn(bind, workers, threads):
+    """Serve the app with gunicorn (workers are processes)
+
+    Args:
+        bind (str): host:port
+        workers (int): the number of worker processes
+        threads (int): the number of threads by worker
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+
+        def load_config(self):
+            self.cfg.set('bind', bind)
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread')
+
+        def load(self):
+            return application
+
+    Application().run()
+
+
+def run_werkzeug(bind):
+    """Serve the app with the werkzeug server (one process and a thread by request)
+
+    Args:
+        bind (str): host:port
+    """
+    from werkzeug.serving import run_simple
+
+    host, port = bind.rsplit(':', 1)
+    run_simple(host, int(port), application, threaded=True)
+
+
+def serve(bind, workers, threads=4, shared_cache=''):
+    """Serve the app with gunicorn if it's installed or with werkzeug
+
+    Args:
+        bind (str): host:port
+        workers (int): the number of worker processes
+        threads (Optional[int]): the number of threads by worker
+        shared_cache (Optional[str]): the directory of the responses shared by the workers
+    """
+    tmp = None
+    if not shared_cache and workers > 1:
+        # the workers are forked after, so they'll all use this directory
+        shared_cache = tmp = tempfile.mkdtemp(prefix='clouseau-responses-')
+    if shared_cache:
+        if not os.path.isdir(shared_cache):
+            os.makedirs(shared_cache)
+        rest.response_cache.path = shared_cache
+
+    try:
+        try:
+            import gunicorn  # NOQA
+        except ImportError:
+            run_werkzeug(bind)
+        else:
+            run_gunicorn(bind, workers, threads)
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the patches dashboard')
+    parser.add_argument('-b', '--bind', action='store', default=get_bind(), help='host:port')
+    parser.add_argument('-w', '--workers', action='store', type=int, default=get_workers(), help='the number of worker processes (with gunicorn)')
+    parser.add_argument('-t', '--threads', action='store', type=int, default=4, help='the number of threads by worker (with gunicorn)')
+    parser.add_argument('-s', '--shared-cache', action='store', default=os.path.expanduser(config.get('Rest', 'shared_cache', '')),
+                        help='the directory of the responses shared by the workers')
+    args = parser.parse_args()
+
+    serve(args.bind, args.workers, threads=args.threads, shared_cache=args.shared_cache)
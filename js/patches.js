@@ -3,7 +3,7 @@
 
 "use strict";
 
-var maindata = null;
+var bts_by_sgn = {};
 var product = "";
 var curchan = "";
 var curdate = "";
@@ -93,35 +93,34 @@ function make_tables(sgn, bts) {
 
 function show_signature(sgn) {
     $("#signaturestitle").text(sgn);
-    make_tables(sgn, maindata[sgn]);
+    if (sgn in bts_by_sgn) {
+        make_tables(sgn, bts_by_sgn[sgn]);
+        return;
+    }
+    $.get("rest/patches/signature",
+          {"channel": curchan, "product": product, "date": curdate, "signature": sgn},
+          function (bts) { bts_by_sgn[sgn] = bts; make_tables(sgn, bts); }, "json");
 }
 
-function populate_signatures(data) {
+function populate_signatures(sgns) {
     $("#sgnsbutton").empty();
-    var sgns = [],
-        cb = function (e) { show_signature(e.target.text); return true; };
-    for (let sgn in data) {
-        sgns.push([sgn, get_total(data[sgn])]);
-    }
-    sgns = sgns.sort(function (a, b) { var d = b[1] - a[1]; if (d != 0) { return d; } return a[0].localeCompare(b[0]); });
+    var cb = function (e) { show_signature(e.target.text); return true; };
+    // the signatures are sorted by decreasing count
     for (let sgn of sgns) {
         let li = $("<li></li>"),
             a = $("<a href=\'#\'></a>");
-        sgn = sgn[0];
-        a.text(sgn);
+        a.text(sgn.signature);
         a.click(cb);
         li.append(a);
         $("#sgnsbutton").append(li);
     }
-    return sgns.length != 0 ? sgns[0][0] : null;
+    return sgns.length != 0 ? sgns[0].signature : null;
 }
 
 function update(data) {
-    maindata = data;
-    var first = populate_signatures(data);
+    var first = populate_signatures(data.signatures);
     if (first != null) {
-        $("#signaturestitle").text(first);
-        make_tables(first, data[first]);
+        show_signature(first);
     } else {
         $("#signaturestitle").text("No signatures !");
         $("#main").empty();
@@ -172,7 +171,7 @@ function init_patches(prod, chan, date) {
     make_title();
     $("#datestitle").text(curdate);
     $.get("rest/patches",
-          {"channel": curchan, "product": product, "date": curdate},
+          {"channel": curchan, "product": product, "date": curdate, "fields": "summary"},
           update, "json");
 
 }
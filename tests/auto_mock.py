@@ -20,6 +20,8 @@ logger = logging.getLogger(__name__)
 
 
 MOCKS_DIR = os.path.join(os.path.dirname(__file__), 'mocks')
+# responses derived from the recorded ones when a request couldn't be recorded (see the README inside)
+DERIVED_MOCKS_DIR = os.path.join(os.path.dirname(__file__), 'derived_mocks')
 
 
 class MockTestCase(unittest.TestCase):
@@ -45,7 +47,7 @@ class MockTestCase(unittest.TestCase):
 
     def request_callback(self, request):
         logger.debug('Mock request {} {}'.format(request.method, request.url))
-        path = self.build_path(request.method, request.url)
+        path = self.get_path(request.method, request.url)
 
         if os.path.exists(path):
             # Load local file
@@ -69,6 +71,17 @@ class MockTestCase(unittest.TestCase):
             response['body'],
         )
 
+    def get_path(self, method, url):
+        """
+        Get the recorded response or else the derived one
+        """
+        path = self.build_path(method, url)
+        if not os.path.exists(path):
+            derived = os.path.join(DERIVED_MOCKS_DIR, os.path.relpath(path, MOCKS_DIR))
+            if os.path.exists(derived):
+                return derived
+        return path
+
     def build_path(self, method, url):
         """
         Build a unique filename from method & url
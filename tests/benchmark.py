@@ -0,0 +1,299 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Benchmark the daily jobs offline with the recorded responses in tests/mocks (and tests/derived_mocks)
+
+The import times of the entry points are measured too (in new interpreters
+where the network is disabled).
+
+Usage: python -m tests.benchmark [-m] [-i] [-o results.json] [-c previous.json] [benchmark ...]
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import gzip
+import pickle
+import responses
+from tests.auto_mock import MockTestCase
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class MissingMock(Exception):
+    pass
+
+
+class OfflineMocks(MockTestCase):
+    """Serve the recorded responses and fail when a response isn't recorded"""
+
+    def __init__(self):
+        super(OfflineMocks, self).__init__('run')
+        self.lock = threading.Lock()
+        self.count = 0
+        self.missing = []
+
+    def run(self):
+        pass
+
+    def request_callback(self, request):
+        path = self.get_path(request.method, request.url)
+        with self.lock:
+            self.count += 1
+            if not os.path.exists(path):
+                self.missing.append(request.url)
+                raise MissingMock('No recorded response for %s' % request.url)
+
+        with gzip.open(path, 'rb') as f:
+            response = pickle.load(f)
+
+        return (response['status'], response['headers'], response['body'])
+
+
+def __get_cpu_time():
+    if hasattr(time, 'process_time'):
+        return time.process_time()
+    return time.clock()
+
+
+def __get_max_rss():
+    # in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else -1
+
+
+def __record_phases(timings):
+    # collect the timings of the phases run by the schedulers
+    from clouseau.scheduler import Scheduler
+    run = Scheduler.run
+
+    def wrapper(self):
+        try:
+            return run(self)
+        finally:
+            for name, t in self.timings.items():
+                timings[name] = timings.get(name, 0) + t
+
+    Scheduler.run = wrapper
+    return run
+
+
+def bench_statusflags(tmpdir):
+    import libmozdata.config
+    from clouseau import config
+    from clouseau import statusflags
+
+    class MyConf(libmozdata.config.Config):
+        def get(self, section, option, default=None, type=str):
+            if section == 'StatusFlags' and option == 'ignored':
+                return '\'OOM | small\', \'EMPTY: no crashing thread identified; ERROR_NO_MINIDUMP_HEADER\', \'F1398665248_____________________________\''
+            return default
+
+    previous = getattr(config, '__config')
+    config.set_config(MyConf())
+    try:
+        base_versions = {'nightly': 51, 'aurora': 50, 'beta': 49, 'release': 48, 'esr': 45}
+        statusflags.get('Firefox', 2, end_date='2016-09-14', base_versions=base_versions, check_for_fx=False, check_bz_version=False, check_noisy=False, verbose=False)
+    finally:
+        config.set_config(previous)
+
+
+def bench_guiltypatches(tmpdir):
+    from clouseau import guiltypatches
+    guiltypatches.generate(channel='nightly', product='FennecAndroid', date='2016-08-15', threshold=1, output_dir=tmpdir, verbose=False)
+
+
+def bench_monitor_startup_crashes(tmpdir):
+    from clouseau import monitor_startup_crashes as msc
+    data = msc.convert(msc.get_crashanalysis_data())
+    for date in ['2016-08-11', '2016-07-31', '2016-09-01']:
+        msc.monitor(date=date, data=data, verbose=False)
+
+
+BENCHMARKS = [('statusflags', bench_statusflags),
+              ('guiltypatches', bench_guiltypatches),
+              ('monitor_startup_crashes', bench_monitor_startup_crashes)]
+
+# the modules run from the command line and the wsgi entry point
+IMPORTS = ['clouseau.wsgi', 'clouseau.rest', 'clouseau.statusflags', 'clouseau.guiltypatches',
+           'clouseau.monitor_startup_crashes', 'clouseau.stats', 'clouseau.gfx_critical_errors']
+
+# a connection made while importing a module makes it fail
+IMPORT_CODE = """
+import socket
+import sys
+import time
+
+def connect(*args, **kwargs):
+    raise RuntimeError('network access while importing')
+
+socket.socket.connect = connect
+socket.create_connection = connect
+t = time.time()
+import %s
+sys.stdout.write('%%f' %% (time.time() - t))
+"""
+
+
+def measure_import(module, repeat=3):
+    """Measure the time to import a module in a new interpreter
+
+    Args:
+        module (str): the module name
+        repeat (Optional[int]): the number of imports, the best time is kept
+
+    Returns:
+        dict: the measures
+    """
+    times = []
+    for _ in range(repeat):
+        p = subprocess.Popen([sys.executable, '-c', IMPORT_CODE % module], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = p.communicate()
+        if p.returncode:
+            lines = err.decode('utf-8').strip().split('\n')
+            return {'import_time': -1, 'error': lines[-1]}
+        times.append(float(out))
+
+    return {'import_time': min(times), 'error': None}
+
+
+def run_benchmark(name, function, memory=False):
+    """Run a benchmark with the recorded responses
+
+    Args:
+        name (str): the benchmark name
+        function (function): the function to run with a temporary directory
+        memory (Optional[bool]): if True the peak of allocated memory is traced (slower)
+
+    Returns:
+        dict: the measures
+    """
+    mocks = OfflineMocks()
+    phases = {}
+    tmpdir = tempfile.mkdtemp()
+    trace = memory and tracemalloc is not None
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+
+    error = None
+    wall = time.time()
+    cpu = __get_cpu_time()
+    run = __record_phases(phases)
+    try:
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+            rsps.add_callback(responses.GET, re.compile('.*'), callback=mocks.request_callback, content_type='application/json')
+            function(tmpdir)
+    except Exception as e:
+        error = '%s: %s' % (e.__class__.__name__, e)
+    finally:
+        from clouseau.scheduler import Scheduler
+        Scheduler.run = run
+        wall = time.time() - wall
+        cpu = __get_cpu_time() - cpu
+        peak = tracemalloc.get_traced_memory()[1] if trace else -1
+        if trace:
+            tracemalloc.stop()
+        shutil.rmtree(tmpdir)
+
+    if mocks.missing and not error:
+        error = 'Missing mocks: %s' % mocks.missing
+
+    return {'wall_time': wall,
+            'cpu_time': cpu,
+            'requests': mocks.count,
+            'missing_mocks': len(mocks.missing),
+            'peak_memory': peak,
+            'max_rss': __get_max_rss(),
+            'phases': phases,
+            'error': error}
+
+
+def get_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT).decode('utf-8').strip()
+    except Exception:
+        return ''
+
+
+def compare(results, previous):
+    """Print the changes between two results
+
+    Args:
+        results (dict): the current results
+        previous (dict): the previous results
+    """
+    for name, measures in sorted(results['benchmarks'].items()):
+        old = previous['benchmarks'].get(name)
+        if not old or measures['error'] or old['error']:
+            continue
+        for key in ['wall_time', 'cpu_time', 'requests', 'peak_memory']:
+            if old[key] > 0 and measures[key] >= 0:
+                print('%s %s: %s -> %s (%+.1f%%)' % (name, key, old[key], measures[key], 100. * (measures[key] - old[key]) / old[key]))
+
+    for module, measures in sorted(results.get('imports', {}).items()):
+        old = previous.get('imports', {}).get(module)
+        if not old or measures['error'] or old['error']:
+            continue
+        old, new = old['import_time'], measures['import_time']
+        print('import %s: %s -> %s (%+.1f%%)' % (module, old, new, 100. * (new - old) / old))
+
+
+def main(args):
+    names = args.benchmarks or [name for name, _ in BENCHMARKS]
+    results = {'revision': get_revision(),
+               'python': sys.version.split(' ')[0],
+               'date': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()),
+               'benchmarks': {}}
+    if args.imports or not args.benchmarks:
+        results['imports'] = {}
+        for module in IMPORTS:
+            results['imports'][module] = measures = measure_import(module)
+            print('import %s: %.3fs%s' % (module, measures['import_time'], (', error: ' + measures['error']) if measures['error'] else ''))
+
+    if not args.imports or args.benchmarks:
+        for name, function in BENCHMARKS:
+            if name in names:
+                results['benchmarks'][name] = measures = run_benchmark(name, function, memory=args.memory)
+                error = (', error: ' + measures['error']) if measures['error'] else ''
+                print('%s: %.2fs wall, %.2fs cpu, %d requests%s' % (name, measures['wall_time'], measures['cpu_time'], measures['requests'], error))
+
+    if args.output:
+        with open(args.output, 'w') as Out:
+            json.dump(results, Out, sort_keys=True, indent=2)
+    else:
+        print(json.dumps(results, sort_keys=True, indent=2))
+
+    if args.compare:
+        with open(args.compare, 'r') as In:
+            compare(results, json.load(In))
+
+    measures = list(results['benchmarks'].values()) + list(results.get('imports', {}).values())
+    return 1 if any(m['error'] for m in measures) else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the daily jobs with the recorded responses')
+    parser.add_argument('-o', '--output', action='store', help='output file (JSON)')
+    parser.add_argument('-m', '--memory', action='store_true', help='trace the peak of allocated memory (slower)')
+    parser.add_argument('-i', '--imports', action='store_true', help='only measure the import times (with the named benchmarks if any)')
+    parser.add_argument('-c', '--compare', action='store', help='previous results to compare with')
+    parser.add_argument('benchmarks', nargs='*', help='benchmarks to run: %s' % ', '.join(name for name, _ in BENCHMARKS))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main(args))
@@ -0,0 +1,89 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+import json
+import os
+import re
+import time
+import tempfile
+import shutil
+import responses
+import libmozdata.socorro as socorro
+from libmozdata.bugzilla import Bugzilla
+from tests.auto_mock import MockTestCase
+from clouseau import bugindex
+from clouseau.store import Store
+try:
+    from urllib.parse import urlparse, parse_qsl
+except ImportError:
+    from urlparse import urlparse, parse_qsl
+
+
+class BugIndexTest(MockTestCase):
+    mock_urls = [
+        socorro.Socorro.CRASH_STATS_URL
+    ]
+
+    def setUp(self):
+        super(BugIndexTest, self).setUp()
+        self.tmpdst = tempfile.mkdtemp()
+        bugindex.set_stores(Store('signature_bugs', path=os.path.join(self.tmpdst, 'signature_bugs.sqlite')),
+                            Store('bug_signatures', path=os.path.join(self.tmpdst, 'bug_signatures.sqlite')))
+
+    def tearDown(self):
+        bugindex.set_stores(None, None)
+        shutil.rmtree(self.tmpdst)
+
+    def test_parse_signatures(self):
+        self.assertEqual(bugindex.parse_signatures('[@ foo]\r\n[@ bar | baz ] '), ['foo', 'bar | baz'])
+        self.assertEqual(bugindex.parse_signatures(''), [])
+
+    @responses.activate
+    def test_get_bugs(self):
+        signature = 'js::GCMarker::processMarkStackTop'
+        expected = {792226, 789892, 719114, 730283, 1257309, 941491, 745334, 772441, 952381}
+        bugs = bugindex.get_bugs([signature])
+        self.assertEqual(set(bugs[signature]), expected)
+
+        signatures_store, bugs_store = bugindex.get_stores()
+        self.assertEqual(set(signatures_store.get(signature)), expected)
+        self.assertEqual(bugs_store.get('792226'), [signature])
+
+        # no sync and nothing to retrieve
+        bugs_store.delete(bugindex.LAST_SYNC)
+        responses.reset()
+        bugs = bugindex.get_bugs([signature])
+        self.assertEqual(set(bugs[signature]), expected)
+
+    @responses.activate
+    def test_sync(self):
+        queries = []
+
+        def callback(request):
+            queries.append(dict(parse_qsl(urlparse(request.url).query)))
+            return (200, {}, json.dumps({'bugs': [{'id': 123, 'cf_crash_signature': '[@ bar]'}]}))
+
+        responses.add_callback(responses.GET, re.compile(r'^' + Bugzilla.API_URL), callback=callback, content_type='application/json')
+        signatures_store, bugs_store = bugindex.get_stores()
+        signatures_store.put_many({'foo': [123], 'bar': [456], 'baz': [789]})
+        bugs_store.put_many({'123': ['foo'], '456': ['bar'], '789': ['baz']})
+
+        # the last sync is older than the ttl: the changes in the last ttl seconds are retrieved
+        bugs_store.put(bugindex.LAST_SYNC, time.time() - 3 * bugindex.get_ttl())
+        bugindex.get_bugs([])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(queries[0]['chfield'], 'cf_crash_signature')
+        self.assertEqual(queries[0]['chfieldfrom'], '-%dh' % (bugindex.get_ttl() // 3600 + 1))
+        # the old and the new signatures of the bug 123 are removed
+        self.assertEqual(set(signatures_store.get_many(['foo', 'bar', 'baz']).keys()), {'baz'})
+
+        # a recent sync
+        bugs_store.put(bugindex.LAST_SYNC, time.time() - 1800)
+        bugindex.get_bugs([])
+        self.assertEqual(queries[1]['chfieldfrom'], '-2h')
+
+
+if __name__ == '__main__':
+    unittest.main()
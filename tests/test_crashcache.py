@@ -0,0 +1,149 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+import gzip
+import json
+import os
+import pickle
+import tempfile
+import shutil
+import responses
+import libmozdata.socorro as socorro
+from libmozdata.connection import Query
+from tests.auto_mock import MockTestCase
+from clouseau import crashcache
+from clouseau.store import Store
+
+
+UUIDS = ['3ac31c5c-aeff-495b-a5ec-076c62160817', '01efd790-1f0e-4865-b5fe-249b62160816']
+
+
+class FakeProcessedCrash(object):
+    """Answer the queries without sending them and keep the size of the batches"""
+    batches = []
+
+    def __init__(self, queries):
+        FakeProcessedCrash.batches.append(len(queries))
+        for query in queries:
+            query.handler({'uuid': query.params['crash_id'], 'crashedThread': None})
+
+    def wait(self):
+        pass
+
+
+class FakeSocorro(object):
+    ProcessedCrash = FakeProcessedCrash
+
+
+class CrashCacheTest(MockTestCase):
+    mock_urls = [
+        socorro.Socorro.CRASH_STATS_URL
+    ]
+
+    def setUp(self):
+        super(CrashCacheTest, self).setUp()
+        self.tmpdst = tempfile.mkdtemp()
+        crashcache.set_store(Store('processed_crashes', path=os.path.join(self.tmpdst, 'processed_crashes.sqlite')))
+
+    def tearDown(self):
+        crashcache.set_store(None)
+        crashcache.socorro = socorro
+        shutil.rmtree(self.tmpdst)
+
+    def get_queries(self, uuids, data):
+        def handler(json, data):
+            data.append(json)
+
+        return [Query(socorro.ProcessedCrash.URL, params={'crash_id': uuid}, handler=handler, handlerdata=data) for uuid in uuids]
+
+    def get_recorded(self, uuid):
+        path = self.get_path('GET', '%s?crash_id=%s' % (socorro.ProcessedCrash.URL, uuid))
+        with gzip.open(path, 'rb') as f:
+            return json.loads(pickle.load(f)['body'])
+
+    def test_project(self):
+        raw = self.get_recorded(UUIDS[0])
+        crash = crashcache.project(raw)
+        self.assertEqual(crash['uuid'], UUIDS[0])
+
+        # the frames of the crashed thread
+        frames = raw['json_dump']['threads'][raw['crashedThread']]['frames']
+        self.assertEqual(len(crash['frames']), len(frames))
+        self.assertEqual(crash['frames'][0], {'function': 'jemalloc_crash',
+                                              'file': 'hg:hg.mozilla.org/mozilla-unified:memory/mozjemalloc/jemalloc.c:6e191a55c3d2',
+                                              'line': 1625,
+                                              'module': 'libmozglue.so'})
+
+        raw = self.get_recorded('07c56e06-9acb-42c8-a71d-728102160815')
+        crash = crashcache.project(raw)
+        # a frame without symbols
+        self.assertEqual(crash['frames'][0], {'module': 'libc.so'})
+
+        # the modules of the frames of the crashing thread
+        self.assertEqual(len(crash['crashing_thread']), 10)
+        self.assertEqual(crash['crashing_thread'][:4], ['libc.so', 'libc.so', 'libskia.so', 'libhwui.so'])
+
+        # the modules with their filename, version and debug_id only
+        self.assertEqual(len(crash['modules']), len(raw['json_dump']['modules']))
+        self.assertEqual(crash['modules'][0], {'filename': 'ashmem (deleted)', 'version': '', 'debug_id': '000000000000000000000000000000000'})
+
+        self.assertEqual(crash['addons'], [['{d10d0bf8-f5b5-c8b4-a8b2-2b9879e08c5d}', '2.7.3'], ['uBlock0@raymondhill.net', '1.8.4'],
+                                           ['firefox@ghostery.com', '6.3.2'], ['flyweb@mozilla.org', '1.0.0']])
+
+        # a projected crash (e.g. read from the store) is kept as is
+        self.assertIs(crashcache.project(crash), crash)
+        self.assertEqual(crashcache.project(json.loads(json.dumps(crash))), crash)
+
+    @responses.activate
+    def test_get_processed_crashes(self):
+        # the crashes are retrieved and stored
+        data = []
+        crashcache.get_processed_crashes(self.get_queries(UUIDS[:1], data))
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual([d['uuid'] for d in data], UUIDS[:1])
+        self.assertTrue(data[0]['projected'])
+        self.assertEqual(crashcache.get_store().get(UUIDS[0]), data[0])
+
+        # the stored one is handled without request and the other one is retrieved
+        data = []
+        crashcache.get_processed_crashes(self.get_queries(UUIDS, data))
+        self.assertEqual(len(responses.calls), 2)
+        self.assertIn(UUIDS[1], responses.calls[1].request.url)
+        self.assertEqual(sorted(d['uuid'] for d in data), sorted(UUIDS))
+
+        # all the crashes are stored
+        data = []
+        crashcache.get_processed_crashes(self.get_queries(UUIDS, data))
+        self.assertEqual(len(responses.calls), 2)
+        self.assertEqual([d['uuid'] for d in data], UUIDS)
+
+    def test_batches(self):
+        crashcache.socorro = FakeSocorro
+        FakeProcessedCrash.batches = []
+        uuids = ['%08d-0000-0000-0000-000000000000' % i for i in range(300)]
+        data = []
+        crashcache.get_processed_crashes(self.get_queries(uuids, data))
+        self.assertEqual(FakeProcessedCrash.batches, [128, 128, 44])
+        self.assertEqual(len(data), 300)
+
+    def test_error(self):
+        # an error payload is neither stored nor handled
+        class ErrorProcessedCrash(FakeProcessedCrash):
+            def __init__(self, queries):
+                for query in queries:
+                    query.handler({'error': 'not found'})
+
+        class ErrorSocorro(object):
+            ProcessedCrash = ErrorProcessedCrash
+
+        crashcache.socorro = ErrorSocorro
+        data = []
+        crashcache.get_processed_crashes(self.get_queries(UUIDS, data))
+        self.assertEqual(data, [])
+        self.assertEqual(crashcache.get_store().get_many(UUIDS), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+from clouseau.dupgraph import DupGraph
+from clouseau.store import Store
+
+
+class DupGraphTest(unittest.TestCase):
+
+    def get_graph(self):
+        # 1 -> 2 -> 3, 4 -> 3, 5 -> 6 -> 5 (cycle)
+        graph = DupGraph(store=Store('dup_graph', path=''))
+        graph.dupe_of = {1: 2, 2: 3, 3: None, 4: 3, 5: 6, 6: 5, 7: None}
+        return graph
+
+    def test_find(self):
+        graph = self.get_graph()
+        self.assertEqual(graph.find(1), 3)
+        self.assertEqual(graph.finals, {1: 3, 2: 3, 3: 3})
+        self.assertEqual(graph.find(4), 3)
+        self.assertEqual(graph.find(7), 7)
+        self.assertIn(graph.find(5), {5, 6})
+
+    def test_get_chain(self):
+        graph = self.get_graph()
+        self.assertEqual(graph.get_chain(1), [2, 3])
+        self.assertEqual(graph.get_chain(3), [])
+        self.assertEqual(graph.get_chain(5), [6])
+
+    def test_reduce(self):
+        graph = self.get_graph()
+        self.assertEqual(graph.reduce([1, 2, 3, 7]), {3, 7})
+        self.assertEqual(graph.reduce([1, 2]), {2})
+        self.assertEqual(graph.reduce([1, 4]), {1, 4})
+        self.assertEqual(graph.reduce([1, 2, 4]), {2, 4})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,13 +3,20 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import unittest
+import os
 import tempfile
 import shutil
+import threading
+import time
+from collections import OrderedDict
+import libmozdata.config
 from libmozdata.hgmozilla import Mercurial
 import libmozdata.socorro as socorro
 import responses
 from tests.auto_mock import MockTestCase
+from clouseau import config
 from clouseau import guiltypatches
+from clouseau.store import Store
 
 
 class GuiltyPatchesTest(MockTestCase):
@@ -35,5 +42,99 @@ class GuiltyPatchesTest(MockTestCase):
         self.assertEqual(data, {'jemalloc_crash | arena_dalloc | nsTArray_base<T>::ShrinkCapacity | nsTArray_Impl<T>::RemoveElementsAt | nsUrlClassifierPrefixSet::MakePrefixSet': [{'bt': [['jemalloc_crash', {'node': '6e191a55c3d2', 'line': 1625, 'patches': [], 'filename': 'memory/mozjemalloc/jemalloc.c'}], ['arena_dalloc', {'node': '6e191a55c3d2', 'line': 1625, 'patches': [], 'filename': 'memory/mozjemalloc/jemalloc.c'}], ['nsTArray_base<nsTArrayFallibleAllocator, nsTArray_CopyWithMemutils>::ShrinkCapacity', {'patches': [], 'filename': ''}], ['nsTArray_Impl<nsTArray<short unsigned int>, nsTArrayInfallibleAllocator>::RemoveElementsAt', {'node': '6e191a55c3d2', 'line': 1899, 'patches': [{'node': '2c42c82251d63cd38a0a59c3f1ed82d4019ec7a1', 'pushdate': '2016-08-12 16:45:27+00:00'}], 'filename': 'xpcom/glue/nsTArray.h'}], ['nsUrlClassifierPrefixSet::MakePrefixSet', {'node': '6e191a55c3d2', 'line': 105, 'patches': [], 'filename': 'toolkit/components/url-classifier/nsUrlClassifierPrefixSet.cpp'}], ['nsUrlClassifierPrefixSet::SetPrefixes', {'node': '6e191a55c3d2', 'line': 105, 'patches': [], 'filename': 'toolkit/components/url-classifier/nsUrlClassifierPrefixSet.cpp'}], ['mozilla::safebrowsing::LookupCache::ConstructPrefixSet', {'node': '6e191a55c3d2', 'line': 582, 'patches': [], 'filename': 'toolkit/components/url-classifier/LookupCache.cpp'}], ['mozilla::safebrowsing::LookupCache::Build', {'node': '6e191a55c3d2', 'line': 582, 'patches': [], 'filename': 'toolkit/components/url-classifier/LookupCache.cpp'}], ['mozilla::safebrowsing::Classifier::ApplyTableUpdates', {'node': '6e191a55c3d2', 'line': 664, 'patches': [], 'filename': 'toolkit/components/url-classifier/Classifier.cpp'}], ['mozilla::safebrowsing::Classifier::ApplyUpdates', {'node': '6e191a55c3d2', 'line': 664, 'patches': [], 'filename': 'toolkit/components/url-classifier/Classifier.cpp'}], ['nsUrlClassifierDBServiceWorker::FinishUpdate', {'node': '6e191a55c3d2', 'line': 579, 'patches': [], 'filename': 'toolkit/components/url-classifier/nsUrlClassifierDBService.cpp'}], ['mozilla::detail::RunnableMethodImpl<nsresult (nsIUrlClassifierDBService::*)(), true, false>::Run', {'node': '6e191a55c3d2', 'line': 729, 'patches': [], 'filename': 'xpcom/glue/nsThreadUtils.h'}], ['nsThread::ProcessNextEvent', {'node': '6e191a55c3d2', 'line': 1058, 'patches': [], 'filename': 'xpcom/threads/nsThread.cpp'}], ['NS_ProcessNextEvent', {'node': '6e191a55c3d2', 'line': 290, 'patches': [], 'filename': 'xpcom/glue/nsThreadUtils.cpp'}], ['mozilla::ipc::MessagePumpForNonMainThreads::Run', {'node': '6e191a55c3d2', 'line': 368, 'patches': [], 'filename': 'ipc/glue/MessagePump.cpp'}], ['MessageLoop::Run', {'node': '6e191a55c3d2', 'line': 225, 'patches': [], 'filename': 'ipc/chromium/src/base/message_loop.cc'}], ['nsThread::ThreadFunc', {'node': '6e191a55c3d2', 'line': 1058, 'patches': [], 'filename': 'xpcom/threads/nsThread.cpp'}], ['_pt_root', {'node': 'fe895421dfbe', 'line': 216, 'patches': [], 'filename': 'nsprpub/pr/src/pthreads/ptthread.c'}]], 'count': 1, 'uuids': ['3ac31c5c-aeff-495b-a5ec-076c62160817']}], 'mozilla::safebrowsing::HashStore::ApplyUpdate': [{'bt': [['mozilla::safebrowsing::HashStore::ApplyUpdate', {'node': '6e191a55c3d2', 'line': 515, 'patches': [{'node': '2c42c82251d63cd38a0a59c3f1ed82d4019ec7a1', 'pushdate': '2016-08-12 16:45:27+00:00'}], 'filename': 'xpcom/glue/nsTArray.h'}], ['mozilla::safebrowsing::Classifier::ApplyTableUpdates', {'node': '6e191a55c3d2', 'line': 611, 'patches': [], 'filename': 'toolkit/components/url-classifier/Classifier.cpp'}], ['mozilla::safebrowsing::Classifier::ApplyUpdates', {'node': '6e191a55c3d2', 'line': 611, 'patches': [], 'filename': 'toolkit/components/url-classifier/Classifier.cpp'}], ['nsUrlClassifierDBServiceWorker::FinishUpdate', {'node': '6e191a55c3d2', 'line': 579, 'patches': [], 'filename': 'toolkit/components/url-classifier/nsUrlClassifierDBService.cpp'}], ['mozilla::detail::RunnableMethodImpl<nsresult (nsIUrlClassifierDBService::*)(), true, false>::Run', {'node': '6e191a55c3d2', 'line': 729, 'patches': [], 'filename': 'xpcom/glue/nsThreadUtils.h'}], ['nsThread::ProcessNextEvent', {'node': '6e191a55c3d2', 'line': 1058, 'patches': [], 'filename': 'xpcom/threads/nsThread.cpp'}], ['NS_ProcessNextEvent', {'node': '6e191a55c3d2', 'line': 290, 'patches': [], 'filename': 'xpcom/glue/nsThreadUtils.cpp'}], ['mozilla::ipc::MessagePumpForNonMainThreads::Run', {'node': '6e191a55c3d2', 'line': 338, 'patches': [], 'filename': 'ipc/glue/MessagePump.cpp'}], ['MessageLoop::Run', {'node': '6e191a55c3d2', 'line': 225, 'patches': [], 'filename': 'ipc/chromium/src/base/message_loop.cc'}], ['nsThread::ThreadFunc', {'node': '6e191a55c3d2', 'line': 1058, 'patches': [], 'filename': 'xpcom/threads/nsThread.cpp'}], ['_pt_root', {'node': '97a52326b06a', 'line': 216, 'patches': [], 'filename': 'nsprpub/pr/src/pthreads/ptthread.c'}]], 'count': 1, 'uuids': ['b21495b6-121b-4073-a06a-4059e2160818']}], 'nsUrlClassifierPrefixSet::MakePrefixSet': [{'bt': [['nsUrlClassifierPrefixSet::MakePrefixSet', {'node': '6e191a55c3d2', 'line': 2028, 'patches': [{'node': '2c42c82251d63cd38a0a59c3f1ed82d4019ec7a1', 'pushdate': '2016-08-12 16:45:27+00:00'}], 'filename': 'xpcom/glue/nsTArray.h'}], ['nsUrlClassifierPrefixSet::SetPrefixes', {'node': '6e191a55c3d2', 'line': 83, 'patches': [], 'filename': 'toolkit/components/url-classifier/nsUrlClassifierPrefixSet.cpp'}], ['mozilla::safebrowsing::LookupCache::ConstructPrefixSet', {'node': '6e191a55c3d2', 'line': 582, 'patches': [], 'filename': 'toolkit/components/url-classifier/LookupCache.cpp'}], ['mozilla::safebrowsing::LookupCache::Build', {'node': '6e191a55c3d2', 'line': 582, 'patches': [], 'filename': 'toolkit/components/url-classifier/LookupCache.cpp'}], ['mozilla::safebrowsing::Classifier::ApplyTableUpdates', {'node': '6e191a55c3d2', 'line': 664, 'patches': [], 'filename': 'toolkit/components/url-classifier/Classifier.cpp'}], ['mozilla::safebrowsing::Classifier::ApplyUpdates', {'node': '6e191a55c3d2', 'line': 664, 'patches': [], 'filename': 'toolkit/components/url-classifier/Classifier.cpp'}], ['nsUrlClassifierDBServiceWorker::FinishUpdate', {'node': '6e191a55c3d2', 'line': 579, 'patches': [], 'filename': 'toolkit/components/url-classifier/nsUrlClassifierDBService.cpp'}], ['mozilla::detail::RunnableMethodImpl<nsresult (nsIUrlClassifierDBService::*)(), true, false>::Run', {'node': '6e191a55c3d2', 'line': 729, 'patches': [], 'filename': 'xpcom/glue/nsThreadUtils.h'}], ['nsThread::ProcessNextEvent', {'node': '6e191a55c3d2', 'line': 1058, 'patches': [], 'filename': 'xpcom/threads/nsThread.cpp'}], ['NS_ProcessNextEvent', {'node': '6e191a55c3d2', 'line': 290, 'patches': [], 'filename': 'xpcom/glue/nsThreadUtils.cpp'}], ['mozilla::ipc::MessagePumpForNonMainThreads::Run', {'node': '6e191a55c3d2', 'line': 368, 'patches': [], 'filename': 'ipc/glue/MessagePump.cpp'}], ['MessageLoop::Run', {'node': '6e191a55c3d2', 'line': 225, 'patches': [], 'filename': 'ipc/chromium/src/base/message_loop.cc'}], ['nsThread::ThreadFunc', {'node': '6e191a55c3d2', 'line': 1058, 'patches': [], 'filename': 'xpcom/threads/nsThread.cpp'}], ['_pt_root', {'node': '054d4856cea6', 'line': 216, 'patches': [], 'filename': 'nsprpub/pr/src/pthreads/ptthread.c'}]], 'count': 1, 'uuids': ['01efd790-1f0e-4865-b5fe-249b62160816']}]})
 
 
+class PatchesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdst = tempfile.mkdtemp()
+        self.conf = {'patches_ttl': 3600, 'workers': 8}
+        conf = self.conf
+
+        class MyConf(libmozdata.config.Config):
+            def get(self, section, option, default=None, type=str):
+                return conf.get(option, default)
+
+        self.previous = getattr(config, '__config')
+        config.set_config(MyConf())
+        guiltypatches.set_patches_store(Store('file_patches', path=os.path.join(self.tmpdst, 'file_patches.sqlite')))
+
+        self.lookups = []
+        self.get_last_patches = guiltypatches.get_last_patches
+
+        def get_last_patches(channel, ts, max_days, filename, node):
+            self.lookups.append(filename)
+            return [{'node': node, 'pushdate': filename}]
+
+        guiltypatches.get_last_patches = get_last_patches
+
+    def tearDown(self):
+        guiltypatches.get_last_patches = self.get_last_patches
+        guiltypatches.set_patches_store(None)
+        config.set_config(self.previous)
+        shutil.rmtree(self.tmpdst)
+
+    def test_closed_window(self):
+        files = [('foo.cpp', 'abc'), ('bar.h', 'def')]
+        ts = int(time.time()) - 2 * guiltypatches.PUSH_DELAY
+        expected = {f: [{'node': f[1], 'pushdate': f[0]}] for f in files}
+        self.assertEqual(guiltypatches.get_all_patches('nightly', ts, 3, files), expected)
+        self.assertEqual(sorted(self.lookups), ['bar.h', 'foo.cpp'])
+
+        # the window is closed: the patches are kept even after the ttl
+        self.conf['patches_ttl'] = 0
+        self.assertEqual(guiltypatches.get_all_patches('nightly', ts, 3, files), expected)
+        self.assertEqual(len(self.lookups), 2)
+
+        # another window
+        self.assertEqual(guiltypatches.get_all_patches('nightly', ts, 2, files[:1]), {files[0]: expected[files[0]]})
+        self.assertEqual(len(self.lookups), 3)
+
+    def test_open_window(self):
+        files = [('foo.cpp', 'abc')]
+        ts = int(time.time()) - guiltypatches.PUSH_DELAY // 2
+        guiltypatches.get_all_patches('nightly', ts, 3, files)
+        self.assertEqual(self.lookups, ['foo.cpp'])
+
+        # some pushes can still be in the window: the patches are kept for the ttl only
+        guiltypatches.get_all_patches('nightly', ts, 3, files)
+        self.assertEqual(self.lookups, ['foo.cpp'])
+        self.conf['patches_ttl'] = 0
+        guiltypatches.get_all_patches('nightly', ts, 3, files)
+        self.assertEqual(self.lookups, ['foo.cpp', 'foo.cpp'])
+
+    def test_parallel(self):
+        bt_info = {('f1', 'f2'): {'processed': False, 'files': ('hg:hg.mozilla.org/mozilla-central:a.cpp:abc', None,
+                                                                'hg:hg.mozilla.org/mozilla-central:b.cpp:abc',
+                                                                'hg:hg.mozilla.org/mozilla-central:obj-firefox/c.h:abc')},
+                   ('f3', ): {'processed': True, 'files': ('hg:hg.mozilla.org/mozilla-central:d.cpp:abc', )},
+                   ('f4', 'f5'): {'processed': False, 'files': ('hg:hg.mozilla.org/mozilla-central:b.cpp:abc',
+                                                                'hg:hg.mozilla.org/mozilla-central:e.cpp:def')}}
+        files = guiltypatches.get_files(OrderedDict(sorted(bt_info.items())))
+        # in frame order, without the duplicates, the processed backtraces and the forbidden dirs
+        self.assertEqual(files, [('a.cpp', 'abc'), ('b.cpp', 'abc'), ('e.cpp', 'def')])
+
+        running = []
+        max_running = []
+        lock = threading.Lock()
+
+        def get_last_patches(channel, ts, max_days, filename, node):
+            with lock:
+                running.append(1)
+                max_running.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+            return [{'node': node, 'pushdate': filename}]
+
+        guiltypatches.get_last_patches = get_last_patches
+        self.conf['workers'] = 2
+        files = [('f%d.cpp' % i, 'abc') for i in range(8)]
+        ts = int(time.time()) - 2 * guiltypatches.PUSH_DELAY
+        patches = guiltypatches.get_all_patches('nightly', ts, 3, files + files[:2])
+
+        # the same results as the sequential lookups
+        self.assertEqual(patches, {f: get_last_patches('nightly', ts, 3, f[0], f[1]) for f in files})
+        self.assertEqual(max(max_running), 2)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,45 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import subprocess
+import sys
+import unittest
+from clouseau import lazy
+
+
+class LazyTest(unittest.TestCase):
+
+    def test_load(self):
+        # run in a new interpreter to be sure that the module isn't already imported
+        code = ('import sys\n'
+                'from clouseau import lazy\n'
+                'colorsys = lazy.load("colorsys")\n'
+                'assert "colorsys" not in sys.modules\n'
+                'assert colorsys.rgb_to_hsv(1, 0, 0) == (0, 1, 1)\n'
+                'assert "colorsys" in sys.modules\n')
+        subprocess.check_call([sys.executable, '-c', code])
+
+    def test_attributes(self):
+        m = lazy.load('json')
+        self.assertEqual(m.dumps([1]), '[1]')
+        self.assertIn('json', repr(m))
+        with self.assertRaises(AttributeError):
+            m.foo
+
+        with self.assertRaises(ImportError):
+            lazy.load('clouseau.foo').bar
+
+    def test_heavy_modules(self):
+        # the entry points mustn't import scipy, matplotlib or inflect
+        code = ('import sys\n'
+                'import clouseau.statusflags\n'
+                'import clouseau.monitor_startup_crashes\n'
+                'import clouseau.rest\n'
+                'heavy = [m for m in ["scipy", "matplotlib", "inflect", "libmozdata.gmail"] if m in sys.modules]\n'
+                'assert not heavy, heavy\n')
+        subprocess.check_call([sys.executable, '-c', code])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+from clouseau import metrics
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(101))
+        self.assertIsNone(metrics.percentile([], 50))
+        self.assertEqual(metrics.percentile(values, 50), 50)
+        self.assertEqual(metrics.percentile(values, 99), 99)
+        self.assertEqual(metrics.percentile(values, 100), 100)
+        self.assertEqual(metrics.percentile([3], 90), 3)
+
+    def test_metrics(self):
+        m = metrics.Metrics(window=10)
+        for i in range(20):
+            m.add_request('foo', i / 1000.)
+        m.add_request('bar', 0.5, status=500)
+        m.add_cache('hit')
+        m.add_cache('shared')
+        m.add_cache('miss')
+        m.add_cache('miss')
+
+        data = m.get()
+        # only the last 10 latencies are kept
+        self.assertEqual(data['endpoints']['foo'], {'requests': 20, 'errors': 0, 'p50': 14., 'p90': 18., 'p99': 19., 'max': 19.})
+        self.assertEqual(data['endpoints']['bar']['errors'], 1)
+        self.assertEqual(data['cache']['hit_rate'], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
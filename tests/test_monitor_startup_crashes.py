@@ -3,11 +3,26 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import unittest
+import datetime
+import json
+import os
+import re
+import shutil
+import tempfile
 import libmozdata.socorro as socorro
 import libmozdata.bugzilla as bugzilla
+import libmozdata.spikeanalysis as spikeanalysis
 import responses
 from tests.auto_mock import MockTestCase
 from clouseau import monitor_startup_crashes as msc
+from clouseau import startuphistory
+from clouseau import transport
+from clouseau import versioncatalog
+from clouseau.store import Store
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from urlparse import urlparse, parse_qs
 
 
 class MonitorStartupCrashesTest(MockTestCase):
@@ -26,6 +41,15 @@ class MonitorStartupCrashesTest(MockTestCase):
         self.assertEqual(mail['title'], 'Spikes in startup crashes in nightly')
         self.assertEqual(mail['body'], '<!doctype html>\n<html lang="en-us">\n<head>\n  <meta charset="utf-8">\n  <title>Spikes</title>\n</head>\n<body>\n<p>Hi all,</p>\n<p>We\'ve two spikes in startup crashes.<br>\n<ul style="padding: 0">\n<li>FennecAndroid\n<ul>\n<li>nightly (<b>125</b> crashes reported):<br>\nMost significant increases from 2016-08-10 to 2016-08-11 (<a href="https://crash-stats.mozilla.com/search/?date=%3E%3D2016-08-11&date=%3C2016-08-12&product=FennecAndroid&release_channel=nightly&uptime=%3C60&version=51.0a1">top startup crashers from Socorro</a>):\n<ul>\n<li>nsPrefetchNode::OnStartRequest: <b>increased from 0 to 56 (+inf%)</b>.\n<ul>\n<li><a href="https://bugzil.la/1294159"><s style="color:red">Bug 1294159</s></a></li>\n</ul>\n</li>\n<li>java.lang.NoClassDefFoundError: android.support.v7.internal.view.menu.MenuBuilder at android.support.v7.app.AppCompatDelegateImplV7.preparePanel(Unknown Source): <b>increased from 0 to 3 (+inf%)</b>.\n<ul>\n</ul>\n</li>\n</ul>\n</li>\n</ul>\n</li>\n<li>Firefox\n<ul>\n<li>nightly (<b>6306</b> crashes reported):<br>\nMost significant increases from 2016-08-10 to 2016-08-11 (<a href="https://crash-stats.mozilla.com/search/?date=%3E%3D2016-08-11&date=%3C2016-08-12&product=Firefox&release_channel=nightly&uptime=%3C60&version=51.0a1">top startup crashers from Socorro</a>):\n<ul>\n<li>nsIChannel::GetLoadInfo: <b>increased from 0 to 1641 (+inf%)</b>.\n<ul>\n<li><a href="https://bugzil.la/1294159"><s style="color:red">Bug 1294159</s></a></li>\n</ul>\n</li>\n<li>nsPrefetchNode::OnStartRequest: <b>increased from 0 to 84 (+inf%)</b>.\n<ul>\n<li><a href="https://bugzil.la/1294159"><s style="color:red">Bug 1294159</s></a></li>\n</ul>\n</li>\n<li>F1398665248_____________________________: <b>increased from 208 to 253 (+22%)</b>.\n<ul>\n<li><a href="https://bugzil.la/1330610"><s style="color:red">Bug 1330610</s></a></li>\n<li><a href="https://bugzil.la/1226960">Bug 1226960</a></li>\n</ul>\n</li>\n</ul>\n</li>\n</ul>\n</li>\n</ul>\n</p>\n<p>Sincerely,<br>\nRelease Management Bot\n</p>\n</body>\n</html>')
 
+        # the same with the history in a database
+        tmpdst = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdst, 'history.sqlite')
+            startuphistory.StartupHistory(path).put(data)
+            self.assertEqual(msc.monitor(date='2016-08-11', path=path, verbose=False), mail)
+        finally:
+            shutil.rmtree(tmpdst)
+
         mail = msc.monitor(date='2016-07-31', data=data, verbose=False)
         self.assertIsNotNone(mail)
         self.assertEqual(mail['title'], 'Spikes in startup crashes in aurora')
@@ -34,6 +58,118 @@ class MonitorStartupCrashesTest(MockTestCase):
         mail = msc.monitor(date='2016-09-01', data=data, verbose=False)
         self.assertIsNone(mail)
 
+    @responses.activate
+    def test_backfill(self):
+        data = msc.convert(msc.get_crashanalysis_data())
+        alerts = msc.backfill('2016-07-30', '2016-08-11', data=data, fetch=False)
+        spiking = [(a['date'], a['product'], a['channel']) for a in alerts]
+        self.assertIn(('2016-07-31', 'Firefox', 'aurora'), spiking)
+        self.assertIn(('2016-08-11', 'Firefox', 'nightly'), spiking)
+        self.assertIn(('2016-08-11', 'FennecAndroid', 'nightly'), spiking)
+
+        # the same alerts as the spike detection day by day
+        expected = []
+        for product, i1 in data.items():
+            for chan, i2 in i1.items():
+                dates = sorted(i2.keys())
+                for i, date in enumerate(dates):
+                    if '2016-07-30' <= date <= '2016-08-11':
+                        totals = [float(i2[d]['total']) for d in dates[:i + 1]]
+                        if spikeanalysis.is_spiking_ma(totals, alpha=2.5, win=7, method='mean') == 'up':
+                            expected.append({'date': date, 'product': product, 'channel': chan, 'total': int(totals[-1])})
+        self.assertEqual(alerts, sorted(expected, key=lambda a: (a['date'], a['product'], a['channel'])))
+
+
+class CrashAnalysisTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdst = tempfile.mkdtemp()
+        msc.set_crashanalysis_store(Store('crash_analysis', path=os.path.join(self.tmpdst, 'crash_analysis.sqlite')))
+
+    def tearDown(self):
+        msc.set_crashanalysis_store(None)
+        shutil.rmtree(self.tmpdst)
+
+    @responses.activate
+    def test_conditional_requests(self):
+        jsonfile = 'Firefox-nightly-crashes-categories.json'
+        url = msc.CRASH_ANALYSIS_URL + '/' + jsonfile
+        requests = []
+
+        def callback(request):
+            requests.append(request.headers.get('If-None-Match'))
+            if request.headers.get('If-None-Match') == '"foo"':
+                return (304, {}, '')
+            return (200, {'ETag': '"foo"'}, json.dumps({'2016-08-11': {}}))
+
+        responses.add_callback(responses.GET, url, callback=callback)
+        store = msc.get_crashanalysis_store()
+        tr = transport.Transport(retries=0)
+        self.assertEqual(msc.get_crashanalysis_file(tr, jsonfile, store), {'2016-08-11': {}})
+        self.assertEqual(msc.get_crashanalysis_file(tr, jsonfile, store), {'2016-08-11': {}})
+        self.assertEqual(requests, [None, '"foo"'])
+
+        # the local copy is used when the server fails
+        responses.reset()
+        responses.add(responses.GET, url, status=503)
+        self.assertEqual(msc.get_crashanalysis_file(tr, jsonfile, store), {'2016-08-11': {}})
+
+
+class StartupHistogramsTest(unittest.TestCase):
+
+    def setUp(self):
+        def get_all_versions(product):
+            d = datetime.datetime
+            versions = {'release': {43: {'43.0': d(2015, 12, 15)}, 44: {'44.0': d(2016, 1, 26)},
+                                    45: {'45.0': d(2016, 3, 8)}, 46: {'46.0': d(2016, 4, 26)}},
+                        'beta': {43: {'43.0b9': d(2015, 12, 8)}, 44: {'44.0b9': d(2016, 1, 19)},
+                                 45: {'45.0b10': d(2016, 3, 1)}, 46: {'46.0b9': d(2016, 4, 8), '46.0b': d(2016, 4, 8)}},
+                        'aurora': {44: {'44.0a2': d(2015, 11, 3)}, 45: {'45.0a2': d(2015, 12, 15)},
+                                   46: {'46.0a2': d(2016, 1, 26)}, 47: {'47.0a2': d(2016, 3, 8)}},
+                        'nightly': {45: {'45.0a1': d(2015, 11, 3)}, 46: {'46.0a1': d(2015, 12, 15)},
+                                    47: {'47.0a1': d(2016, 1, 26)}, 48: {'48.0a1': d(2016, 3, 8)}}}
+            return {chan: {major: {'versions': v} for major, v in info.items()} for chan, info in versions.items()}
+
+        self.get_all_versions = versioncatalog.get_all_versions
+        versioncatalog.get_all_versions = get_all_versions
+
+    def tearDown(self):
+        versioncatalog.get_all_versions = self.get_all_versions
+
+    @responses.activate
+    def test_get_startup_histograms(self):
+        queries = []
+
+        def callback(request):
+            query = parse_qs(urlparse(request.url).query)
+            queries.append(query)
+            histogram = [{'term': '2016-04-10T00:00:00+00:00',
+                          'facets': {'release_channel': [{'term': 'release', 'count': 5},
+                                                         {'term': 'beta', 'count': 7},
+                                                         {'term': 'esr', 'count': 1}]}},
+                         {'term': '2016-04-11T00:00:00+00:00',
+                          'facets': {'release_channel': [{'term': 'release', 'count': 6}]}}]
+            return (200, {}, json.dumps({'errors': [], 'facets': {'histogram_date': histogram}}))
+
+        responses.add_callback(responses.GET, re.compile(r'^' + socorro.SuperSearch.URL), callback=callback, content_type='application/json')
+        data = msc.get_startup_histograms(datetime.datetime(2016, 4, 10), datetime.datetime(2016, 4, 11))
+
+        # one query by product
+        self.assertEqual(sorted(q['product'][0] for q in queries), ['FennecAndroid', 'Firefox'])
+        for q in queries:
+            self.assertEqual(q['_histogram.date'], ['release_channel'])
+            self.assertEqual(q['uptime'], ['<60'])
+            self.assertEqual(q['date'], ['>=2016-04-10', '<2016-04-12'])
+            # the versions released in the delays of the channels before the range (not the beta builds)
+            self.assertEqual(q['version'], ['44.0', '45.0', '46.0b9', '47.0a2', '48.0a1'])
+
+        # only the Firefox release is throttled
+        self.assertEqual(data['Firefox']['release'], {'2016-04-10': {'total': 50}, '2016-04-11': {'total': 60}})
+        self.assertEqual(data['FennecAndroid']['release'], {'2016-04-10': {'total': 5}, '2016-04-11': {'total': 6}})
+        self.assertEqual(data['Firefox']['beta'], {'2016-04-10': {'total': 7}})
+        self.assertEqual(data['Firefox']['nightly'], {})
+        self.assertNotIn('esr', data['Firefox'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,75 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+import json
+import os
+import tempfile
+import shutil
+import sqlite3
+from clouseau import patchesstore
+
+
+class PatchesStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdst = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdst)
+
+    def test_store(self):
+        with open(os.path.join(self.tmpdst, '2016-08-15.json'), 'w') as Out:
+            json.dump({'Firefox': {'nightly': {'foo': [{'count': 1}]}}, 'FennecAndroid': {'nightly': {}}}, Out)
+
+        store = patchesstore.get_store(self.tmpdst)
+        self.assertEqual(store.get_dates(), ['2016-08-15'])
+        self.assertEqual(store.get('2016-08-15', 'Firefox', 'nightly'), {'foo': [{'count': 1}]})
+        self.assertTrue(store.has_run('2016-08-15', 'FennecAndroid', 'nightly'))
+        self.assertFalse(store.has_run('2016-08-16', 'Firefox', 'nightly'))
+
+        generation = store.get_generation()
+        store.put('2016-08-16', 'Firefox', 'nightly', {'foo': [{'count': 2}], 'bar': [{'count': 3}]})
+        store.put('2016-08-16', 'Firefox', 'nightly', {'foo': [{'count': 4}]})
+        self.assertEqual(store.get_dates(), ['2016-08-15', '2016-08-16'])
+        self.assertEqual(store.get_generation(), generation + 2)
+        self.assertEqual(store.get('2016-08-16', 'Firefox', 'nightly'), {'foo': [{'count': 4}], 'bar': [{'count': 3}]})
+        self.assertEqual(store.get('2016-08-16', 'Firefox', 'nightly', signatures=['bar', 'baz']), {'bar': [{'count': 3}]})
+
+        self.assertEqual(store.get_summaries('2016-08-16', 'Firefox', 'nightly'),
+                         (2, [{'signature': 'foo', 'count': 4, 'backtraces': 1}, {'signature': 'bar', 'count': 3, 'backtraces': 1}]))
+        self.assertEqual(store.get_summaries('2016-08-16', 'Firefox', 'nightly', offset=1, limit=1),
+                         (2, [{'signature': 'bar', 'count': 3, 'backtraces': 1}]))
+        self.assertEqual(store.get_summaries('2016-08-16', 'Firefox', 'nightly', min_count=4),
+                         (1, [{'signature': 'foo', 'count': 4, 'backtraces': 1}]))
+
+        # the json files are imported once
+        store.import_json(self.tmpdst)
+        self.assertEqual(store.get('2016-08-15', 'Firefox', 'nightly'), {'foo': [{'count': 1}]})
+
+    def test_summary_columns(self):
+        # a database without the summary columns
+        path = os.path.join(self.tmpdst, 'patches.sqlite')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE results (date TEXT, product TEXT, channel TEXT, signature TEXT, data TEXT, '
+                     'PRIMARY KEY (date, product, channel, signature))')
+        conn.execute('INSERT INTO results VALUES (?, ?, ?, ?, ?)', ('2016-08-15', 'Firefox', 'nightly', 'foo', '[{"count": 2}, {"count": 3}]'))
+        conn.commit()
+        conn.close()
+
+        store = patchesstore.PatchesStore(path)
+        self.assertEqual(store.get_summaries('2016-08-15', 'Firefox', 'nightly'),
+                         (1, [{'signature': 'foo', 'count': 5, 'backtraces': 2}]))
+
+        # the pages are read from the index without sorting
+        plan = store.conn.execute('EXPLAIN QUERY PLAN SELECT signature, count, backtraces FROM results '
+                                  'WHERE date = ? AND product = ? AND channel = ? ORDER BY count DESC, signature',
+                                  ('2016-08-15', 'Firefox', 'nightly')).fetchall()
+        plan = ' '.join(r[-1] for r in plan)
+        self.assertIn('results_count', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
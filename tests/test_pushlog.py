@@ -0,0 +1,66 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+import os
+import sqlite3
+import tempfile
+import shutil
+from clouseau.pushlog import PushlogIndex
+
+
+class MyIndex(PushlogIndex):
+    # files touched by the revisions (instead of hg log)
+    FILES = {0: ['a.cpp', 'b.cpp'], 1: ['a.cpp'], 2: ['b.cpp'], 3: ['a.cpp', 'c.h']}
+
+    def get_files(self, first_rev, last_rev):
+        return [(f, rev) for rev in range(first_rev, last_rev + 1) for f in MyIndex.FILES[rev]]
+
+
+class PushlogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.repo, '.hg'))
+        self.pushlog = sqlite3.connect(os.path.join(self.repo, '.hg', 'pushlog2.db'))
+        self.pushlog.execute('CREATE TABLE pushlog (id INTEGER PRIMARY KEY AUTOINCREMENT, user TEXT, date INTEGER)')
+        self.pushlog.execute('CREATE TABLE changesets (pushid INTEGER, rev INTEGER, node TEXT)')
+
+    def tearDown(self):
+        self.pushlog.close()
+        shutil.rmtree(self.repo)
+
+    def push(self, pushid, date, changesets):
+        self.pushlog.execute('INSERT INTO pushlog VALUES (?, ?, ?)', (pushid, 'foo@bar.com', date))
+        self.pushlog.executemany('INSERT INTO changesets VALUES (?, ?, ?)', [(pushid, rev, node) for rev, node in changesets])
+        self.pushlog.commit()
+
+    def test_index(self):
+        day = 86400
+        self.push(1, 10 * day, [(0, 'aa' * 20), (1, 'bb' * 20)])
+        self.push(2, 12 * day, [(2, 'cc' * 20)])
+
+        index = MyIndex(self.repo)
+        self.assertEqual(index.update(), 2)
+        self.assertEqual(index.update(), 0)
+
+        self.push(3, 13 * day, [(3, 'dd' * 20)])
+        self.assertEqual(index.update(), 1)
+
+        # unknown node
+        self.assertIsNone(index.get_last_patches('a.cpp', 'ee' * 6, 13 * day, 3))
+
+        self.assertEqual(index.get_last_patches('a.cpp', 'dd' * 6, 13 * day, 3), [{'node': 'dd' * 20, 'pushdate': [13 * day, 0]},
+                                                                                  {'node': 'bb' * 20, 'pushdate': [10 * day, 0]},
+                                                                                  {'node': 'aa' * 20, 'pushdate': [10 * day, 0]}])
+        # the push of the node is the last one
+        self.assertEqual(index.get_last_patches('a.cpp', 'cc' * 6, 13 * day, 3), [{'node': 'bb' * 20, 'pushdate': [10 * day, 0]},
+                                                                                  {'node': 'aa' * 20, 'pushdate': [10 * day, 0]}])
+        # the window
+        self.assertEqual(index.get_last_patches('b.cpp', 'dd' * 6, 13 * day, 2), [{'node': 'cc' * 20, 'pushdate': [12 * day, 0]}])
+        self.assertEqual(index.get_last_patches('c.h', 'dd' * 6, 12 * day, 2), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import unittest
+import libmozdata.socorro as socorro
+import requests
+import responses
+from tests.auto_mock import MockTestCase
+from clouseau.queryplanner import QueryPlanner
+
+
+class QueryPlannerTest(unittest.TestCase):
+
+    def handler(self, json, data):
+        pass
+
+    def test_merge(self):
+        data = {}
+        params = {'product': 'Firefox', 'version': ['50.0', '50.0.1']}
+        planner = QueryPlanner()
+        planner.add(['a', 'b'], params, self.handler, data)
+        planner.add(['b', 'c'], dict(params), self.handler, data)
+        planner.add(['d'], {'product': 'Firefox', 'version': ['49.0']}, self.handler, data)
+        queries = planner.get_queries()
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(queries[0].params['signature'], ['=a', '=b', '=c'])
+        self.assertEqual(queries[1].params['signature'], ['=d'])
+        self.assertEqual(planner.get_saved(), 1)
+
+    def test_chunks(self):
+        signatures = ['signature%d' % i for i in range(1000)]
+        planner = QueryPlanner(max_url_length=2000, max_signatures=100)
+        planner.add(signatures, {'product': 'Firefox'}, self.handler)
+        queries = planner.get_queries()
+        self.assertEqual(sum(len(q.params['signature']) for q in queries), 1000)
+        for q in queries:
+            self.assertTrue(len(q.params['signature']) <= 100)
+            self.assertTrue(q.params.get('_facets_size', 50) >= len(q.params['signature']))
+
+        planner = QueryPlanner(max_url_length=100000, max_signatures=300)
+        planner.add(signatures, {'product': 'Firefox'}, self.handler)
+        self.assertEqual([len(q.params['signature']) for q in planner.get_queries()], [300, 300, 300, 100])
+        self.assertEqual(planner.get_saved(), 96)
+
+
+class QueryPlannerMockTest(MockTestCase):
+    mock_urls = [socorro.Socorro.CRASH_STATS_URL]
+
+    def handler(self, json, data):
+        for bucket in json['facets']['signature']:
+            data[bucket['term']] = bucket['count']
+
+    @responses.activate
+    def test_recorded_query(self):
+        # the query built by get_signatures in statusflags
+        signatures = ['hang | ntdll.dll@0x6e1bc', 'RtlpLowFragHeapFree | RtlFreeHeap | HeapFree | operator delete']
+        params = {'product': 'Firefox',
+                  'version': ['48.0', '48.0.1', '48.0.2'],
+                  'release_channel': ['release'],
+                  'date': ['>=2016-09-09', '<2016-09-10'],
+                  '_aggs.signature': ['release_channel', 'platform'],
+                  '_facets_size': 100,
+                  '_results_number': 0}
+        data = {}
+        planner = QueryPlanner()
+        planner.add(signatures[:1], params, self.handler, data)
+        planner.add(signatures, dict(params), self.handler, data)
+        queries = planner.get_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(planner.get_saved(), 1)
+
+        # the merged query is the recorded one
+        query = queries[0]
+        url = requests.Request('GET', query.url, params=query.params).prepare().url
+        self.assertTrue(os.path.exists(self.build_path('GET', url)))
+
+        socorro.SuperSearch(queries=queries).wait()
+        self.assertEqual(data, {'hang | ntdll.dll@0x6e1bc': 171,
+                                'RtlpLowFragHeapFree | RtlFreeHeap | HeapFree | operator delete': 153})
+
+
+if __name__ == '__main__':
+    unittest.main()
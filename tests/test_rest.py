@@ -0,0 +1,191 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+import gzip
+import io
+import json
+import os
+import tempfile
+import shutil
+import libmozdata.config
+import libmozdata.connection
+from clouseau import config
+from clouseau import guiltypatches
+from clouseau import patchesstore
+from clouseau import rest
+from clouseau import transport
+
+
+class RestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdst = tempfile.mkdtemp()
+        tmpdst = self.tmpdst
+
+        class MyConf(libmozdata.config.Config):
+            def get(self, section, option, default=None, type=str):
+                if section == 'GuiltyPatches' and option == 'output':
+                    return tmpdst
+                return default
+
+        self.previous = getattr(config, '__config')
+        config.set_config(MyConf())
+        self.store = patchesstore.get_store(self.tmpdst)
+        self.store.put('2016-08-15', 'Firefox', 'nightly', {'foo': [{'count': 2, 'uuids': ['a'], 'bt': []}],
+                                                            'bar': [{'count': 5, 'uuids': ['b'], 'bt': []}]})
+        self.client = rest.app.test_client()
+
+    def tearDown(self):
+        config.set_config(self.previous)
+        shutil.rmtree(self.tmpdst)
+
+    def get_json(self, url):
+        return json.loads(self.client.get(url).get_data(as_text=True))
+
+    def test_patches(self):
+        infos = self.get_json('/rest/patches')
+        self.assertEqual(infos['dates'], ['2016-08-15'])
+
+        url = '/rest/patches?channel=nightly&product=Firefox&date=2016-08-15'
+        self.assertEqual(set(self.get_json(url).keys()), {'foo', 'bar'})
+
+        # new results invalidate the cached responses
+        self.store.put('2016-08-15', 'Firefox', 'nightly', {'baz': [{'count': 1, 'uuids': ['c'], 'bt': []}]})
+        self.assertEqual(set(self.get_json(url).keys()), {'foo', 'bar', 'baz'})
+        # without a valid date, the last one is used
+        self.assertEqual(set(self.get_json('/rest/patches?channel=nightly&product=Firefox&date=foo').keys()), {'foo', 'bar', 'baz'})
+        self.assertEqual(guiltypatches.get('nightly', 'Firefox', '', self.tmpdst), self.get_json(url))
+        self.assertEqual(guiltypatches.get_page('nightly', 'Firefox', '', output_dir=self.tmpdst)['total'], 3)
+        self.assertEqual(guiltypatches.get_signature('nightly', 'Firefox', '', 'bar', output_dir=self.tmpdst),
+                         [{'count': 5, 'uuids': ['b'], 'bt': []}])
+
+        self.store.put('2016-08-16', 'Firefox', 'nightly', {})
+        self.assertEqual(self.get_json('/rest/patches')['dates'], ['2016-08-16', '2016-08-15'])
+        self.assertEqual(guiltypatches.get('nightly', 'Firefox', '', self.tmpdst), {})
+
+    def test_pages(self):
+        url = '/rest/patches?channel=nightly&product=Firefox&date=2016-08-15'
+        page = self.get_json(url + '&fields=summary&limit=1')
+        self.assertEqual(page, {'total': 2, 'signatures': [{'signature': 'bar', 'count': 5, 'backtraces': 1}]})
+
+        page = self.get_json(url + '&offset=1&limit=1')
+        self.assertEqual(page['signatures'], [{'signature': 'foo', 'count': 2, 'backtraces': 1,
+                                               'bts': [{'count': 2, 'uuids': ['a'], 'bt': []}]}])
+
+        page = self.get_json(url + '&fields=summary&min_count=3')
+        self.assertEqual(page, {'total': 1, 'signatures': [{'signature': 'bar', 'count': 5, 'backtraces': 1}]})
+
+        self.assertEqual(self.get_json('/rest/patches/signature?channel=nightly&product=Firefox&date=2016-08-15&signature=bar'),
+                         [{'count': 5, 'uuids': ['b'], 'bt': []}])
+        self.assertEqual(self.get_json('/rest/patches/signature?channel=nightly&product=Firefox&date=2016-08-15&signature=baz'), [])
+
+    def test_conditional_get(self):
+        url = '/rest/patches?channel=nightly&product=Firefox&date=2016-08-15'
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        etag = res.headers['ETag']
+        self.assertEqual(res.headers['Vary'], 'Accept-Encoding')
+
+        res = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.headers['ETag'], etag)
+        self.assertEqual(res.get_data(), b'')
+
+        # the etag changes with the data
+        self.store.put('2016-08-15', 'Firefox', 'nightly', {'baz': [{'count': 1, 'uuids': ['c'], 'bt': []}]})
+        res = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+    def test_gzip(self):
+        url = '/rest/patches?channel=nightly&product=Firefox&date=2016-08-15'
+        plain = self.client.get(url)
+        res = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertNotEqual(res.headers['ETag'], plain.headers['ETag'])
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(res.get_data())).read(), plain.get_data())
+
+        res = self.client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+
+    def test_cache_size(self):
+        cache = rest.ResponseCache(size=2)
+        for i in range(10):
+            cache.get(('foo', i), lambda: {'foo': i})
+        self.assertEqual(list(cache.responses.keys()), [('foo', 8), ('foo', 9)])
+
+        # the least recently used one is removed
+        cache.get(('foo', 8), lambda: {})
+        cache.get(('foo', 10), lambda: {})
+        self.assertEqual(list(cache.responses.keys()), [('foo', 8), ('foo', 10)])
+
+    def test_shared_cache(self):
+        path = tempfile.mkdtemp(dir=self.tmpdst)
+        calls = []
+
+        def function():
+            calls.append(1)
+            return {'foo': 1}
+
+        # two workers
+        cache1 = rest.ResponseCache(path)
+        cache2 = rest.ResponseCache(path)
+        response = cache1.get(('foo', ), function, shared=True)
+        shared = cache2.get(('foo', ), function, shared=True)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(shared['etag'], response['etag'])
+        for encoding, (start, stop) in response['parts'].items():
+            a, b = shared['parts'][encoding]
+            self.assertEqual(shared['data'][a:b], response['data'][start:stop])
+
+        # the files of the previous generations are removed
+        self.store.put('2016-08-16', 'Firefox', 'nightly', {})
+        cache2.get(('foo', ), function, shared=True)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(os.listdir(path)), 1)
+
+        # the responses for the other keys aren't written
+        cache1.get(('bar', ), function)
+        cache2.get(('bar', ), function)
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(len(os.listdir(path)), 1)
+
+    def test_serve(self):
+        adapter = libmozdata.connection.HTTPAdapter
+        from clouseau import wsgi
+        # the transport is installed by the entry point
+        self.assertIs(libmozdata.connection.HTTPAdapter, transport.TransportAdapter)
+        libmozdata.connection.HTTPAdapter = adapter
+        paths = []
+
+        def run(*args):
+            paths.append(rest.response_cache.path)
+
+        previous = wsgi.run_werkzeug, wsgi.run_gunicorn, rest.response_cache.path
+        wsgi.run_werkzeug = wsgi.run_gunicorn = run
+        try:
+            wsgi.serve('127.0.0.1:5000', 2)
+        finally:
+            wsgi.run_werkzeug, wsgi.run_gunicorn, rest.response_cache.path = previous
+
+        # the temporary directory is removed when the server exits
+        self.assertEqual(len(paths), 1)
+        self.assertTrue(paths[0])
+        self.assertFalse(os.path.exists(paths[0]))
+
+    def test_health(self):
+        self.client.get('/rest/patches')
+        self.client.get('/rest/patches')
+        health = self.get_json('/rest/health')
+        self.assertEqual(health['status'], 'ok')
+        self.assertIn('patches', health['endpoints'])
+        self.assertIn('p99', health['endpoints']['patches'])
+        self.assertGreater(health['cache']['hit'], 0)
+        self.assertIn('transport', health)
+
+
+if __name__ == '__main__':
+    unittest.main()
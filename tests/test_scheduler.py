@@ -0,0 +1,53 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+import threading
+from clouseau.scheduler import Scheduler
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def test_run(self):
+        order = []
+        b_started = threading.Event()
+
+        def a():
+            # b must run while a is running
+            self.assertTrue(b_started.wait(10))
+            order.append('a')
+            return 1
+
+        def b():
+            b_started.set()
+            order.append('b')
+            return 2
+
+        def c(x, y):
+            order.append('c')
+            return x + y
+
+        scheduler = Scheduler()
+        scheduler.add('a', a)
+        scheduler.add('b', b)
+        scheduler.add('c', c, ['a', 'b'])
+        res = scheduler.run()
+
+        self.assertEqual(res, {'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(order, ['b', 'a', 'c'])
+        self.assertEqual(set(scheduler.timings.keys()), {'a', 'b', 'c'})
+
+    def test_errors(self):
+        def fail():
+            raise ValueError('foo')
+
+        scheduler = Scheduler()
+        self.assertRaises(Exception, scheduler.add, 'a', fail, ['b'])
+        scheduler.add('a', fail)
+        scheduler.add('b', lambda x: x, ['a'])
+        self.assertRaises(ValueError, scheduler.run)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+import random
+import libmozdata.spikeanalysis as spikeanalysis
+from clouseau import spikes
+
+
+class SpikesTest(unittest.TestCase):
+
+    def test_align(self):
+        data, lengths = spikes.align([[1., 2.], [], [3.]])
+        self.assertEqual(data.shape, (3, 2))
+        self.assertEqual(list(lengths), [2, 0, 1])
+        self.assertEqual(data[2, 0], 3.)
+
+    def test_is_spiking_ma(self):
+        random.seed(42)
+        series = []
+        for n in [3, 10, 50, 100, 200]:
+            for base in [10, 1000]:
+                s = [float(int(random.gauss(base, base * 0.1))) for _ in range(n)]
+                series.append(s)
+                # with a spike at the end
+                series.append(s[:-1] + [s[-1] * 4.])
+                # with a drop at the end
+                series.append(s[:-1] + [s[-1] / 4.])
+        series.append([])
+
+        for method in ['mean', 'median']:
+            res = spikes.is_spiking_ma(series, alpha=2.5, win=7, method=method)
+            expected = [spikeanalysis.is_spiking_ma(s, alpha=2.5, win=7, method=method) if len(s) >= 7 else 'none' for s in series]
+            self.assertEqual(res, expected)
+            self.assertIn('up', res)
+            self.assertIn('down', res)
+
+    def test_get_increases(self):
+        inf = float('+Inf')
+        self.assertEqual(spikes.get_increases({}), {})
+        self.assertEqual(spikes.get_increases({'2016-08-11': {'foo': 3, 'bar': 2}}), {'foo': (3, 3, 0, inf), 'bar': (2, 2, 0, inf)})
+        self.assertEqual(spikes.get_increases({'2016-08-10': {'foo': 2, 'bar': 4, 'baz': 1},
+                                               '2016-08-11': {'foo': 3, 'bar': 2, 'oof': 5}}),
+                         {'foo': (1, 3, 2, 50), 'oof': (5, 5, 0, inf)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+import json
+import os
+import tempfile
+import shutil
+from clouseau import startuphistory
+
+
+class StartupHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdst = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdst)
+
+    def test_history(self):
+        path = os.path.join(self.tmpdst, 'history')
+        data = {'Firefox': {'nightly': {'2016-08-10': {'browser': 1, 'content': 2, 'plugin': 0, 'total': 3},
+                                        '2016-08-11': {'browser': 2, 'content': 2, 'plugin': 1, 'total': 5}}},
+                'FennecAndroid': {'nightly': {'2016-08-11': {'total': 7}}}}
+
+        # an old json history must be imported explicitly
+        with open(path, 'w') as Out:
+            json.dump(data, Out)
+        with self.assertRaises(Exception):
+            startuphistory.get_history(path)
+        self.assertFalse(startuphistory.is_sqlite(path))
+        self.assertTrue(startuphistory.migrate(path))
+        self.assertFalse(startuphistory.migrate(path))
+        history = startuphistory.get_history(path)
+        self.assertTrue(os.path.exists(path + '.bak'))
+        self.assertTrue(startuphistory.is_sqlite(path))
+        self.assertEqual(history.get('Firefox', 'nightly'), data['Firefox']['nightly'])
+
+        history.put({'Firefox': {'nightly': {'2016-08-12': {'browser': 4, 'content': 0, 'plugin': 0, 'total': 4}}}})
+        history = startuphistory.get_history(path)
+        self.assertEqual(history.get_totals('Firefox', 'nightly', '2016-08-12'), [('2016-08-10', 3), ('2016-08-11', 5), ('2016-08-12', 4)])
+        self.assertEqual(history.get_totals('Firefox', 'nightly', '2016-08-11'), [('2016-08-10', 3), ('2016-08-11', 5)])
+        self.assertEqual(history.get_totals('Firefox', 'nightly', '2016-08-12', days=2), [('2016-08-11', 5), ('2016-08-12', 4)])
+        self.assertEqual(history.get_totals('FennecAndroid', 'nightly', '2016-08-12'), [('2016-08-11', 7)])
+        self.assertEqual(history.get_totals('FennecAndroid', 'beta', '2016-08-12'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,6 +10,7 @@ import libmozdata.utils as utils
 import responses
 from tests.auto_mock import MockTestCase
 from clouseau import statusflags
+from clouseau.trends import Trends
 from clouseau import config
 import libmozdata.config
 
@@ -34,6 +35,14 @@ class StatusFlagTest(MockTestCase):
         analysis = {'bar': {'affected': [('nightly', 0)]}}
         self.assertEqual(statusflags.get_noisy(trends, analysis), set())
 
+        trends = Trends(['foo', 'bar'], {'release': 10, 'nightly': 12})
+        for i in range(10):
+            trends.add('foo', 'release', i, i)
+        for i in range(12):
+            trends.add('bar', 'nightly', i, i + 3)
+        analysis = {'foo': {'affected': [('release', 0)]}, 'bar': {'affected': [('nightly', 0)]}}
+        self.assertEqual(statusflags.get_noisy(trends, analysis), {'foo'})
+
     def test_get_ignored_signatures(self):
         self.assertEqual(statusflags.get_ignored_signatures("'a','b','c'"), {'a', 'b', 'c'})
         self.assertEqual(statusflags.get_ignored_signatures("'a' ,'b','c'"), {'a', 'b', 'c'})
@@ -44,6 +53,33 @@ class StatusFlagTest(MockTestCase):
         self.assertEqual(statusflags.get_ignored_signatures(" 'a'  "), {'a'})
         self.assertEqual(statusflags.get_ignored_signatures("      "), set())
 
+    def test_fold_history(self):
+        history = [{'who': 'foo@bar.com', 'when': '2016-09-01T10:00:00Z', 'changes': [{'field_name': 'assigned_to', 'added': 'foo@bar.com', 'removed': 'nobody@mozilla.org'}]},
+                   {'who': 'foo@bar.com', 'when': '2016-09-02T10:00:00Z', 'changes': [{'field_name': 'flagtypes.name', 'attachment_id': 123, 'added': 'review?(bar@foo.com)', 'removed': ''}]},
+                   {'who': 'bar@foo.com', 'when': '2016-09-03T10:00:00Z', 'changes': [{'field_name': 'cf_status_firefox50', 'added': 'unaffected', 'removed': 'affected'}]},
+                   {'who': 'foo@bar.com', 'when': '2016-09-04T10:00:00Z', 'changes': [{'field_name': 'status', 'added': 'RESOLVED', 'removed': 'NEW'},
+                                                                                      {'field_name': 'resolution', 'added': 'FIXED', 'removed': ''}]},
+                   {'who': 'automation@bmo.tld', 'when': '2016-09-05T10:00:00Z', 'changes': []}]
+        status_flags = {'nightly': 'cf_status_firefox51', 'aurora': 'cf_status_firefox50'}
+
+        summary = statusflags.fold_history(None, history)
+        incremental = statusflags.fold_history(statusflags.fold_history(None, history[:2]), history[2:])
+        self.assertEqual(summary, incremental)
+
+        info = statusflags.get_bug_info(incremental, status_flags)
+        self.assertEqual(info, {'resolved': True,
+                                'incomplete': False,
+                                'fixed': True,
+                                'patched': True,
+                                'assigned': True,
+                                'last_change': utils.get_date_ymd('2016-09-04T10:00:00Z'),
+                                'fixed_dates': [utils.get_date_ymd('2016-09-04T10:00:00Z')],
+                                'no_change': {'aurora'}})
+
+        # only bot changes
+        info = statusflags.get_bug_info(statusflags.fold_history(None, history[-1:]), status_flags)
+        self.assertEqual(info['last_change'], utils.get_date_ymd('2016-09-05T10:00:00Z'))
+
     @responses.activate
     def test_get_jsbugmon_regression(self):
         bugs = {'1236541', '1236530', '1236522', '1183448', '1166993'}
@@ -100,6 +136,12 @@ class StatusFlagTest(MockTestCase):
         self.assertEqual(info3['fixed_dates'][0], utils.get_date_ymd('2013-08-06 21:12:03'))
         self.assertEqual(info3['last_change'], utils.get_date_ymd('2013-08-20 19:26:07'))
 
+    def test_simplify_signature(self):
+        self.assertEqual(statusflags.simplify_signature('OOM | small'), '')
+        self.assertEqual(statusflags.simplify_signature('hang | xul-2.3.dll@0x12ab | foo'), 'xuldll|foo')
+        self.assertEqual(statusflags.simplify_signature('A::b<int>(char const*) | const bar'), 'A::b|bar')
+        self.assertEqual(statusflags.simplify_signature('mozilla::Foo::Bar'), 'mozilla::Foo::Bar')
+
     @responses.activate
     def test_filter_bugs(self):
         must_stay = ['633447', '633452']
@@ -0,0 +1,56 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+import os
+import tempfile
+import shutil
+from clouseau.store import Store
+
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdst = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdst)
+
+    def test_get_put(self):
+        store = Store('test', path=os.path.join(self.tmpdst, 'test.sqlite'))
+        self.assertTrue(store.is_enabled())
+        self.assertIsNone(store.get('foo'))
+        store.put('foo', {'bar': [1, 2, 3]})
+        self.assertEqual(store.get('foo'), {'bar': [1, 2, 3]})
+        store.put_many({'a': 1, 'b': 2})
+        self.assertEqual(store.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        store.delete('a')
+        self.assertEqual(store.get('a', default=0), 0)
+
+        # the data are persistent
+        store = Store('test', path=os.path.join(self.tmpdst, 'test.sqlite'))
+        self.assertEqual(store.get('foo'), {'bar': [1, 2, 3]})
+
+    def test_disabled(self):
+        store = Store('test', path='')
+        self.assertFalse(store.is_enabled())
+        store.put('foo', 'bar')
+        self.assertIsNone(store.get('foo'))
+
+    def test_eviction(self):
+        value = os.urandom(1000)
+        store = Store('test', path=os.path.join(self.tmpdst, 'test.sqlite'))
+        store.put('a', value)
+        # room for three values
+        store.max_size = 3 * store.size + store.size // 2
+        store.put('b', value)
+        store.put('c', value)
+        # 'a' becomes the most recently used
+        self.assertEqual(store.get('a'), value)
+        store.put('d', value)
+        self.assertEqual(set(store.get_many(['a', 'b', 'c', 'd']).keys()), {'a', 'c', 'd'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import threading
+import time
+import unittest
+import libmozdata.connection
+from libmozdata.connection import (Connection, Query)
+import requests
+from requests.packages.urllib3.util.retry import Retry
+import responses
+from clouseau import transport
+
+
+URL = 'https://example.com/foo'
+
+
+class TransportTest(unittest.TestCase):
+
+    def test_token_bucket(self):
+        bucket = transport.TokenBucket(0)
+        self.assertEqual(bucket.acquire(), 0)
+
+        bucket = transport.TokenBucket(20, capacity=2)
+        start = time.time()
+        for _ in range(6):
+            bucket.acquire()
+        # 2 tokens at once and then 4 at 20 by second
+        self.assertGreaterEqual(time.time() - start, 0.18)
+
+    @responses.activate
+    def test_retry(self):
+        statuses = [503, 429, 200]
+
+        def callback(request):
+            return (statuses.pop(0), {}, 'foobar')
+
+        responses.add_callback(responses.GET, URL, callback=callback)
+        tr = transport.Transport(retries=2, backoff=0.01)
+        r = tr.get(URL)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.text, 'foobar')
+
+        stats = tr.get_stats()['example.com']
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['errors'], 2)
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['bytes_received'], 18)
+        self.assertIsNotNone(stats['p99'])
+
+        # the last response is returned when there are no more retries
+        responses.reset()
+        responses.add(responses.GET, URL, status=500)
+        tr = transport.Transport(retries=1, backoff=0.01)
+        self.assertEqual(tr.get(URL).status_code, 500)
+        self.assertEqual(tr.get_stats()['example.com']['requests'], 2)
+
+        # a post is sent again only after a 429
+        responses.reset()
+        responses.add(responses.POST, URL, status=500)
+        self.assertEqual(tr.request('POST', URL, data='foo').status_code, 500)
+        stats = tr.get_stats()['example.com']
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['bytes_sent'], 3)
+
+    @responses.activate
+    def test_connection_error(self):
+        responses.add(responses.GET, URL, body=requests.exceptions.ConnectionError('foo'))
+        tr = transport.Transport(retries=2, backoff=0.01)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            tr.get(URL)
+        stats = tr.get_stats()['example.com']
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['errors'], 3)
+
+    def test_delay(self):
+        tr = transport.Transport(backoff=1, max_backoff=10)
+        for attempt in range(6):
+            self.assertLessEqual(tr.get_delay(attempt), min(10, 2 ** attempt))
+
+        r = requests.Response()
+        r.headers['Retry-After'] = '3'
+        self.assertEqual(tr.get_delay(0, r), 3)
+        r.headers['Retry-After'] = '3600'
+        self.assertEqual(tr.get_delay(0, r), 10)
+
+    @responses.activate
+    def test_concurrency(self):
+        running = []
+        max_running = []
+        lock = threading.Lock()
+
+        def callback(request):
+            with lock:
+                running.append(1)
+                max_running.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+            return (200, {}, '')
+
+        responses.add_callback(responses.GET, URL, callback=callback)
+        tr = transport.Transport(concurrency=2)
+        threads = [threading.Thread(target=tr.get, args=(URL, )) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertLessEqual(max(max_running), 2)
+        self.assertEqual(tr.get_stats()['example.com']['requests'], 8)
+
+    @responses.activate
+    def test_libmozdata(self):
+        # importing clouseau doesn't change libmozdata
+        adapter = libmozdata.connection.HTTPAdapter
+        self.assertIsNot(adapter, transport.TransportAdapter)
+
+        # the libmozdata connections use the shared transport once it's installed
+        self.assertTrue(transport.install())
+        self.assertIs(libmozdata.connection.HTTPAdapter, transport.TransportAdapter)
+        statuses = [429, 503]
+        responses.add_callback(responses.GET, URL, callback=lambda r: (statuses.pop(0) if statuses else 200, {}, '{"foo": "bar"}'))
+        tr = transport.Transport(backoff=0.01)
+        transport.set_transport(tr)
+        try:
+            data = {}
+            Connection.MAX_RETRIES, max_retries = 1, Connection.MAX_RETRIES
+            Connection('https://example.com', queries=Query(URL, handler=lambda j: data.update(j))).wait()
+            # the policy of libmozdata is kept: only one retry and only on 429
+            self.assertEqual(data, {})
+            stats = tr.get_stats()['example.com']
+            self.assertEqual(stats['requests'], 2)
+            self.assertEqual(stats['retries'], 1)
+        finally:
+            Connection.MAX_RETRIES = max_retries
+            libmozdata.connection.HTTPAdapter = adapter
+            transport.set_transport(None)
+
+    def test_policy(self):
+        tr = transport.Transport(retries=3, backoff=0.5)
+        self.assertEqual(tr.get_policy(), (3, transport.RETRY_STATUSES, 0.5))
+        self.assertEqual(tr.get_policy(Retry(total=256, backoff_factor=1, status_forcelist=[429])), (256, {429}, 1))
+        self.assertEqual(tr.get_policy(0)[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+from clouseau.trends import Trends
+
+
+class TrendsTest(unittest.TestCase):
+
+    def test_trends(self):
+        trends = Trends(['foo', 'bar'], {'release': 3, 'beta': 2})
+        trends.add('foo', 'release', 0, 4)
+        trends.add('foo', 'release', 0, 1)
+        trends.add('foo', 'beta', 1, 2)
+        trends.add('bar', 'release', 2, 7)
+        # unknown signature or week out of range
+        trends.add('baz', 'release', 0, 1)
+        trends.add('bar', 'beta', 2, 1)
+
+        self.assertEqual(trends.get_trend('foo', 'release'), [5, 0, 0])
+        self.assertEqual(trends.get_trends('bar'), {'release': [0, 0, 7], 'beta': [0, 0]})
+        self.assertEqual(trends['foo'], {'release': {0: 5, 1: 0, 2: 0}, 'beta': {0: 0, 1: 2}})
+        self.assertIn('bar', trends)
+        self.assertNotIn('baz', trends)
+
+        selected = trends.select(['bar', 'baz'])
+        self.assertEqual(selected.keys(), ['bar'])
+        self.assertEqual(selected.get_trends('bar'), trends.get_trends('bar'))
+
+        m, e = trends.get_stats('release')
+        self.assertEqual(m.tolist(), [5. / 3., 7. / 3.])
+        self.assertAlmostEqual(e[1], (2 * (7. / 3.) ** 2 + (14. / 3.) ** 2) ** 0.5 / 3 ** 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+import os
+import tempfile
+import time
+import shutil
+import libmozdata.socorro as socorro
+import responses
+from tests.auto_mock import MockTestCase
+from clouseau import store
+from clouseau import versioncatalog
+from clouseau.store import Store
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000000.
+
+    def time(self):
+        return self.now
+
+
+class FakeProductVersions(object):
+    calls = []
+
+    @staticmethod
+    def get_version_info(versions, channel='', product='Firefox'):
+        FakeProductVersions.calls.append(versions)
+        return {'versions': versions}
+
+
+class FakeSocorro(object):
+    ProductVersions = FakeProductVersions
+
+
+class VersionCatalogTest(MockTestCase):
+    mock_urls = [
+        socorro.Socorro.CRASH_STATS_URL
+    ]
+
+    def setUp(self):
+        super(VersionCatalogTest, self).setUp()
+        self.tmpdst = tempfile.mkdtemp()
+        versioncatalog.set_store(Store('versions', path=os.path.join(self.tmpdst, 'versions.sqlite')))
+        versioncatalog.clear()
+
+    def tearDown(self):
+        versioncatalog.set_store(None)
+        versioncatalog.clear()
+        shutil.rmtree(self.tmpdst)
+
+    @responses.activate
+    def test_all_versions(self):
+        versions = versioncatalog.get_all_versions('Firefox')
+        n = len(responses.calls)
+        self.assertGreater(n, 0)
+        self.assertIn('nightly', versions)
+
+        # the callers can modify the versions
+        del versions['nightly']
+        self.assertIn('nightly', versioncatalog.get_all_versions('Firefox'))
+        self.assertEqual(len(responses.calls), n)
+
+        # from the store
+        versioncatalog.clear()
+        self.assertEqual(versioncatalog.get_all_versions('Firefox'), socorro.ProductVersions.get_all_versions('Firefox'))
+        self.assertEqual(len(responses.calls), 2 * n)
+
+    def test_ttl(self):
+        clock = Clock()
+        FakeProductVersions.calls = []
+        versioncatalog.time = store.time = clock
+        versioncatalog.socorro = FakeSocorro
+        try:
+            ttl = versioncatalog.get_ttl()
+            self.assertEqual(versioncatalog.get_version_info(['50.0']), {'versions': ['50.0']})
+            self.assertEqual(len(FakeProductVersions.calls), 1)
+
+            # read from the store, the value keeps the time when it was stored
+            clock.now += ttl // 2
+            versioncatalog.clear()
+            self.assertEqual(versioncatalog.get_version_info(['50.0']), {'versions': ['50.0']})
+            self.assertEqual(len(FakeProductVersions.calls), 1)
+
+            # so it expires in memory and in the store at the same time
+            clock.now += ttl // 2 + 1
+            versioncatalog.get_version_info(['50.0'])
+            self.assertEqual(len(FakeProductVersions.calls), 2)
+
+            # the versions are passed as is
+            versioncatalog.get_version_info(None)
+            versioncatalog.get_version_info([])
+            versioncatalog.get_version_info(None)
+            self.assertEqual(FakeProductVersions.calls[2:], [None, []])
+        finally:
+            versioncatalog.time = store.time = time
+            versioncatalog.socorro = socorro
+
+
+if __name__ == '__main__':
+    unittest.main()